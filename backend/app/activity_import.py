@@ -0,0 +1,194 @@
+"""Importación masiva de actividades desde CSV.
+
+Lee el archivo fila a fila (sin cargarlo entero), resuelve los indicadores por
+nombre con un diccionario cargado una sola vez, valida cada fila y guarda las
+válidas con INSERT en lotes (executemany) dentro de una única transacción. Los
+rollups se ajustan al final con un delta por grupo y cada lote se agrega al
+índice de búsqueda. Las filas con errores no se insertan y se reportan con su
+número de línea.
+"""
+import csv
+import datetime
+import os
+import unicodedata
+from collections import Counter
+from typing import Iterable, Optional
+
+from sqlalchemy import insert
+from sqlalchemy.orm import Session
+
+from . import models, rollups, search
+
+IMPORT_BATCH_SIZE = int(os.getenv("IMPORT_BATCH_SIZE", "1000"))
+IMPORT_MAX_REPORTED_ERRORS = int(os.getenv("IMPORT_MAX_REPORTED_ERRORS", "200"))
+
+# Encabezados aceptados (normalizados: minúsculas, sin tildes, "_" por espacios)
+COLUMN_ALIASES = {
+    "title": ("title", "titulo", "actividad", "accion", "nombre"),
+    "description": ("description", "descripcion", "detalle"),
+    "injected_by": ("injected_by", "inyectado_por", "area", "dependencia"),
+    "status": ("status", "estado"),
+    "indicator": ("indicator", "indicador"),
+    "indicator_id": ("indicator_id", "id_indicador"),
+    "due_date": ("due_date", "fecha_limite", "fecha_de_entrega", "vencimiento"),
+    "assigned_to": ("assigned_to", "responsable", "asignado_a"),
+}
+
+DATE_FORMATS = ("%Y-%m-%d %H:%M:%S", "%Y-%m-%d %H:%M", "%Y-%m-%d", "%d/%m/%Y %H:%M", "%d/%m/%Y")
+
+
+class CSVImportError(ValueError):
+    """El archivo no se puede importar (p. ej. faltan columnas obligatorias)."""
+
+
+def _normalize(value: str) -> str:
+    value = unicodedata.normalize("NFKD", value.strip().lower())
+    value = "".join(c for c in value if not unicodedata.combining(c))
+    return "_".join(value.split())
+
+
+def _map_columns(fieldnames) -> dict:
+    """Nombre de campo -> encabezado real del CSV."""
+    by_normalized = {_normalize(name): name for name in fieldnames or [] if name}
+    mapping = {}
+    for field, aliases in COLUMN_ALIASES.items():
+        for alias in aliases:
+            if alias in by_normalized:
+                mapping[field] = by_normalized[alias]
+                break
+    if "title" not in mapping:
+        raise CSVImportError("El CSV debe tener una columna de título (title / titulo / actividad)")
+    if "indicator" not in mapping and "indicator_id" not in mapping:
+        raise CSVImportError("El CSV debe tener una columna de indicador (indicator / indicador / indicator_id)")
+    return mapping
+
+
+def _parse_date(value: str) -> datetime.datetime:
+    for fmt in DATE_FORMATS:
+        try:
+            parsed = datetime.datetime.strptime(value, fmt)
+        except ValueError:
+            continue
+        # Solo fecha: vence al final del día, como en el script SQL anterior
+        if fmt in ("%Y-%m-%d", "%d/%m/%Y"):
+            parsed = parsed.replace(hour=23, minute=59, second=59)
+        return parsed
+    try:
+        return datetime.datetime.fromisoformat(value)
+    except ValueError:
+        raise ValueError(f"Fecha no válida: {value!r}")
+
+
+def _indicator_lookup(db: Session):
+    """Índices por nombre normalizado y por id, cargados una vez por importación."""
+    rows = db.query(models.Indicator.id, models.Indicator.name).all()
+    return {_normalize(name): id_ for id_, name in rows if name}, {id_ for id_, _ in rows}
+
+
+def _row_to_values(row: dict, columns: dict, by_name: dict, ids: set, owner_id: int, now: datetime.datetime) -> dict:
+    def cell(field):
+        header = columns.get(field)
+        value = row.get(header) if header else None
+        return value.strip() if isinstance(value, str) and value.strip() else None
+
+    title = cell("title")
+    if not title:
+        raise ValueError("Falta el título")
+
+    indicator_id = None
+    if cell("indicator_id"):
+        try:
+            indicator_id = int(cell("indicator_id"))
+        except ValueError:
+            raise ValueError(f"indicator_id no válido: {cell('indicator_id')!r}")
+        if indicator_id not in ids:
+            raise ValueError(f"Indicador {indicator_id} no existe")
+    elif cell("indicator"):
+        indicator_id = by_name.get(_normalize(cell("indicator")))
+        if indicator_id is None:
+            raise ValueError(f"Indicador no encontrado: {cell('indicator')!r}")
+    else:
+        raise ValueError("Falta el indicador")
+
+    due_date = _parse_date(cell("due_date")) if cell("due_date") else None
+    return {
+        "title": title,
+        "description": cell("description"),
+        "injected_by": cell("injected_by"),
+        "status": cell("status") or "En Curso",
+        "assigned_to": cell("assigned_to"),
+        "due_date": due_date,
+        "indicator_id": indicator_id,
+        "owner_id": owner_id,
+        "timestamp": now,
+        "updated_at": now,
+    }
+
+
+def import_activities(db: Session, lines: Iterable[str], owner_id: int, dry_run: bool = False,
+                      batch_size: Optional[int] = None, delimiter: Optional[str] = None) -> dict:
+    """Importa actividades desde un iterable de líneas CSV (archivo abierto en modo texto).
+
+    Todo va en una transacción: si algo falla a nivel de base de datos no queda
+    nada a medias. Con `dry_run` solo valida.
+    """
+    batch_size = batch_size or IMPORT_BATCH_SIZE
+    lines = iter(lines)
+    if delimiter is None:
+        # Detecta ";" (Excel en español) o "," mirando solo la primera línea
+        first = next(lines, "")
+        delimiter = ";" if first.count(";") > first.count(",") else ","
+        lines = _chain_first(first, lines)
+    reader = csv.DictReader(lines, delimiter=delimiter)
+    columns = _map_columns(reader.fieldnames)
+    by_name, ids = _indicator_lookup(db)
+
+    now = datetime.datetime.utcnow()
+    stmt = insert(models.Activity).returning(models.Activity.id)
+    batch = []
+    rollup_deltas = Counter()
+    errors = []
+    error_count = 0
+    imported = 0
+    try:
+        for row in reader:
+            try:
+                values = _row_to_values(row, columns, by_name, ids, owner_id, now)
+            except ValueError as e:
+                error_count += 1
+                if len(errors) < IMPORT_MAX_REPORTED_ERRORS:
+                    errors.append({"line": reader.line_num, "error": str(e)})
+                continue
+            batch.append(values)
+            rollup_deltas[(values["indicator_id"], values["status"], owner_id,
+                           values["assigned_to"] or "", now.date())] += 1
+            if len(batch) >= batch_size:
+                if not dry_run:
+                    search.index_activities(db, db.execute(stmt, batch).scalars().all())
+                imported += len(batch)
+                batch = []
+        if batch:
+            if not dry_run:
+                search.index_activities(db, db.execute(stmt, batch).scalars().all())
+            imported += len(batch)
+        if dry_run:
+            db.rollback()
+        else:
+            for key, delta in rollup_deltas.items():
+                rollups.apply_delta(db, key, delta)
+            db.commit()
+    except Exception:
+        db.rollback()
+        raise
+    return {
+        "imported": imported,
+        "error_count": error_count,
+        "errors": errors,
+        "dry_run": dry_run,
+    }
+
+
+def _chain_first(first: str, rest):
+    if first:
+        yield first
+    yield from rest
@@ -1,25 +1,44 @@
 from datetime import datetime, timedelta
 from jose import JWTError, jwt
-from passlib.context import CryptContext
 from fastapi import Depends, HTTPException, status
 from fastapi.security import OAuth2PasswordBearer
-from sqlalchemy.orm import Session
-from . import crud, models
+from sqlalchemy import inspect as sa_inspect
+from sqlalchemy.orm import Session, make_transient_to_detached
+from . import models
+from .catalog import USERS_CACHE, bump_cache_version, cache_version_statement
 from .database import get_db
+from .cache import TTLCache
+from . import hashing
 import os
+import threading
+import time
 
 SECRET_KEY = os.getenv("SECRET_KEY", "dev-secret-change-in-production")
 ALGORITHM = "HS256"
 ACCESS_TOKEN_EXPIRE_MINUTES = int(os.getenv("ACCESS_TOKEN_EXPIRE_MINUTES", 60 * 24))
 
-pwd_context = CryptContext(schemes=["pbkdf2_sha256"], deprecated="auto")
+# Caché de usuarios autenticados por `sub` del token. Cada worker tiene el suyo:
+# los cambios de rol y borrados suben el contador `users` de `cache_versions`, que
+# cada worker consulta como mucho cada PRINCIPAL_CACHE_CHECK_SECONDS (vacía su
+# caché si cambió). El TTL acota el resto (p. ej. cambios hechos a mano en la base).
+PRINCIPAL_CACHE_TTL_SECONDS = float(os.getenv("PRINCIPAL_CACHE_TTL_SECONDS", "60"))
+PRINCIPAL_CACHE_MAX_SIZE = int(os.getenv("PRINCIPAL_CACHE_MAX_SIZE", "10000"))
+PRINCIPAL_CACHE_CHECK_SECONDS = float(os.getenv("PRINCIPAL_CACHE_CHECK_SECONDS", "1"))
+_principal_cache = TTLCache(maxsize=PRINCIPAL_CACHE_MAX_SIZE, ttl=PRINCIPAL_CACHE_TTL_SECONDS)
+_principal_state = {"version": None, "checked_at": None}
+_principal_lock = threading.Lock()
+
 oauth2_scheme = OAuth2PasswordBearer(tokenUrl="/token")
 
 def verify_password(plain_password, hashed_password):
-    return pwd_context.verify(plain_password, hashed_password)
+    return hashing.verify_password(plain_password, hashed_password)
+
+def verify_and_update_password(plain_password, hashed_password):
+    """Devuelve (valida, nuevo_hash) si el hash usa parámetros anteriores."""
+    return hashing.verify_and_update(plain_password, hashed_password)
 
 def get_password_hash(password):
-    return pwd_context.hash(password)
+    return hashing.hash_password(password)
 
 def create_access_token(data: dict, expires_delta: timedelta = None):
     to_encode = data.copy()
@@ -31,7 +50,10 @@ def create_access_token(data: dict, expires_delta: timedelta = None):
     encoded_jwt = jwt.encode(to_encode, SECRET_KEY, algorithm=ALGORITHM)
     return encoded_jwt
 
-async def get_current_user(token: str = Depends(oauth2_scheme), db: Session = Depends(get_db)):
+def get_current_user(token: str = Depends(oauth2_scheme), db: Session = Depends(get_db)):
+    """Usuario del token. Es `def` a propósito: usa la sesión síncrona (chequeo de versión,
+    búsqueda si no está en caché), así que FastAPI la corre en el threadpool y no bloquea
+    el event loop de los handlers async."""
     credentials_exception = HTTPException(
         status_code=status.HTTP_401_UNAUTHORIZED,
         detail="Could not validate credentials",
@@ -44,7 +66,57 @@ async def get_current_user(token: str = Depends(oauth2_scheme), db: Session = De
             raise credentials_exception
     except JWTError:
         raise credentials_exception
+    _sync_principal_cache(db)
+    cached = _principal_cache.get(username)
+    if cached is not None:
+        # Adjunta una copia a la sesión de la request sin consultar la base
+        return db.merge(cached, load=False)
+    # crud importa este módulo: importarlo aquí deja usar storage/auth sin pasar por main
+    from . import crud
     user = crud.get_user_by_username(db, username=username)
     if user is None:
         raise credentials_exception
+    _principal_cache.set(username, _detached_copy(user))
     return user
+
+def _detached_copy(user: models.User) -> models.User:
+    copy = models.User(**{
+        column.key: getattr(user, column.key)
+        for column in sa_inspect(models.User).column_attrs
+    })
+    make_transient_to_detached(copy)
+    return copy
+
+def _principal_check_due() -> bool:
+    checked_at = _principal_state["checked_at"]
+    return checked_at is None or time.monotonic() - checked_at >= PRINCIPAL_CACHE_CHECK_SECONDS
+
+def _sync_principal_cache(db: Session):
+    """Vacía la caché si otro worker cambió roles o borró usuarios (un chequeo por intervalo).
+
+    Corre en el threadpool (get_current_user es síncrona): si otro hilo ya está
+    consultando la versión, este no repite la consulta.
+    """
+    if not _principal_check_due() or not _principal_lock.acquire(blocking=False):
+        return
+    try:
+        if not _principal_check_due():
+            return
+        version = db.execute(cache_version_statement(USERS_CACHE)).scalar() or 0
+        if version != _principal_state["version"]:
+            _principal_cache.clear()
+            _principal_state["version"] = version
+        _principal_state["checked_at"] = time.monotonic()
+    finally:
+        _principal_lock.release()
+
+def invalidate_cached_user(username: str):
+    """Quitar un usuario del caché de principales de este worker (cambio de rol, borrado, login)."""
+    _principal_cache.delete(username)
+
+def bump_users_version(db: Session):
+    """Cambio de rol o borrado: hace que todos los workers vacíen su caché de principales.
+
+    Va en la transacción del cambio; quien llama hace el commit.
+    """
+    bump_cache_version(db, USERS_CACHE)
@@ -0,0 +1,189 @@
+"""Caché en memoria del catálogo de indicadores.
+
+El catálogo son pocas filas y casi nunca cambia, así que cada proceso lo guarda
+completo y lo sirve sin consultas (`/indicators`, el indicador embebido en cada
+actividad). Para enterarse de cambios hechos por otro worker o directamente en
+la base, triggers sobre `indicators` suben un contador en `cache_versions`; el
+proceso lo consulta como mucho cada INDICATOR_CACHE_CHECK_SECONDS y recarga
+solo si cambió. Si los triggers no se pudieron crear, recarga en cada chequeo.
+
+Los mismos triggers llevan el contador `activities` (actividades, subtareas,
+archivos y accesos compartidos): la versión para los ETag es una lectura por
+clave primaria en lugar de un agregado sobre todas las actividades.
+"""
+import datetime
+import hashlib
+import os
+import threading
+import time
+
+from sqlalchemy import select, text
+from sqlalchemy.ext.asyncio import AsyncSession
+from sqlalchemy.orm import Session
+
+from . import models, schemas
+from .database import IS_SQLITE, engine
+from .logging_config import logger
+
+INDICATOR_CACHE_CHECK_SECONDS = float(os.getenv("INDICATOR_CACHE_CHECK_SECONDS", "5"))
+
+INDICATORS_CACHE = "indicators"
+# Contador global de actividades: lo usan los ETag de /activities y /dashboard/weekly
+ACTIVITIES_CACHE = "activities"
+# Cambios de rol y borrados de usuarios (sin trigger: lo suben esos endpoints y manage_users.py)
+USERS_CACHE = "users"
+
+# Tablas cuyos cambios suben cada contador
+CACHE_TABLES = {
+    INDICATORS_CACHE: ("indicators",),
+    ACTIVITIES_CACHE: ("activities", "sub_activities", "activity_files", "activity_access"),
+}
+
+_state = {"triggers": None}
+
+_SQLITE_TRIGGERS = tuple(
+    f"""CREATE TRIGGER IF NOT EXISTS trg_{table}_cache_version_{op.lower()}
+        AFTER {op} ON {table}
+        BEGIN
+            INSERT INTO cache_versions (name, version, updated_at)
+            VALUES ('{name}', 1, CURRENT_TIMESTAMP)
+            ON CONFLICT (name) DO UPDATE SET version = cache_versions.version + 1, updated_at = CURRENT_TIMESTAMP;
+        END"""
+    for name, tables in CACHE_TABLES.items()
+    for table in tables
+    for op in ("INSERT", "UPDATE", "DELETE")
+)
+
+_POSTGRES_TRIGGERS = (
+    """CREATE OR REPLACE FUNCTION bump_cache_version() RETURNS trigger AS $$
+    BEGIN
+        INSERT INTO cache_versions (name, version, updated_at)
+        VALUES (TG_ARGV[0], 1, NOW() AT TIME ZONE 'utc')
+        ON CONFLICT (name) DO UPDATE SET version = cache_versions.version + 1, updated_at = NOW() AT TIME ZONE 'utc';
+        RETURN NULL;
+    END;
+    $$ LANGUAGE plpgsql""",
+) + tuple(
+    f"""DO $$
+    BEGIN
+        IF NOT EXISTS (SELECT 1 FROM pg_trigger WHERE tgname = 'trg_{table}_cache_version') THEN
+            CREATE TRIGGER trg_{table}_cache_version
+            AFTER INSERT OR UPDATE OR DELETE OR TRUNCATE ON {table}
+            FOR EACH STATEMENT EXECUTE FUNCTION bump_cache_version('{name}');
+        END IF;
+    END
+    $$"""
+    for name, tables in CACHE_TABLES.items()
+    for table in tables
+)
+
+
+def triggers_available() -> bool:
+    return bool(_state["triggers"])
+
+
+def bump_cache_version(db: Session, name: str):
+    """Sube un contador de `cache_versions` dentro de la transacción de quien llama."""
+    db.execute(text(
+        "INSERT INTO cache_versions (name, version, updated_at) VALUES (:name, 1, :now) "
+        "ON CONFLICT (name) DO UPDATE SET version = cache_versions.version + 1, updated_at = :now"
+    ), {"name": name, "now": datetime.datetime.utcnow()})
+
+
+def cache_version_statement(name: str):
+    return select(models.CacheVersion.version).where(models.CacheVersion.name == name)
+
+
+def ensure_cache_triggers() -> bool:
+    """Crea los triggers que versionan el catálogo y las actividades. Devuelve si quedaron disponibles."""
+    try:
+        with engine.begin() as conn:
+            for ddl in (_SQLITE_TRIGGERS if IS_SQLITE else _POSTGRES_TRIGGERS):
+                conn.execute(text(ddl))
+    except Exception as e:
+        logger.error(f"Triggers de cache_versions no disponibles, se recargará en cada chequeo: {e}")
+        _state["triggers"] = False
+        return False
+    _state["triggers"] = True
+    return True
+
+
+def _version_statement():
+    return cache_version_statement(INDICATORS_CACHE)
+
+
+def _rows_statement():
+    return select(
+        models.Indicator.id, models.Indicator.name, models.Indicator.description, models.Indicator.created_at
+    ).order_by(models.Indicator.id)
+
+
+class IndicatorCatalog:
+    def __init__(self, check_seconds: float = INDICATOR_CACHE_CHECK_SECONDS):
+        self.check_seconds = check_seconds
+        self.version = None  # huella del contenido, igual en todos los workers
+        self._db_version = None
+        self._by_id = {}
+        self._items = []
+        self._checked_at = None
+        self._lock = threading.Lock()
+
+    def cached(self, indicator_id):
+        return self._by_id.get(indicator_id)
+
+    def _needs_check(self, ids) -> bool:
+        if any(i is not None and i not in self._by_id for i in ids):
+            return True
+        return self._checked_at is None or time.monotonic() - self._checked_at >= self.check_seconds
+
+    def _is_current(self, db_version, ids) -> bool:
+        if not _state["triggers"] or db_version != self._db_version:
+            return False
+        return all(i is None or i in self._by_id for i in ids)
+
+    def _mark_checked(self):
+        with self._lock:
+            self._checked_at = time.monotonic()
+
+    def _load(self, db_version, rows):
+        items = [
+            schemas.IndicatorOut(id=id_, name=name, description=description, created_at=created_at)
+            for id_, name, description, created_at in rows
+        ]
+        fingerprint = hashlib.sha1(repr([tuple(r) for r in rows]).encode()).hexdigest()
+        with self._lock:
+            self._items = items
+            self._by_id = {item.id: item for item in items}
+            self._db_version = db_version
+            self.version = fingerprint
+            self._checked_at = time.monotonic()
+
+    def ensure(self, db: Session, ids=()):
+        """Deja el catálogo al día (como mucho un chequeo por intervalo) y asegura los `ids` pedidos."""
+        if not self._needs_check(ids):
+            return
+        db_version = db.execute(_version_statement()).scalar() or 0
+        if self._is_current(db_version, ids):
+            self._mark_checked()
+            return
+        self._load(db_version, db.execute(_rows_statement()).all())
+
+    async def ensure_async(self, db: AsyncSession, ids=()):
+        if not self._needs_check(ids):
+            return
+        db_version = (await db.execute(_version_statement())).scalar() or 0
+        if self._is_current(db_version, ids):
+            self._mark_checked()
+            return
+        self._load(db_version, (await db.execute(_rows_statement())).all())
+
+    def all(self, db: Session) -> list:
+        self.ensure(db)
+        return list(self._items)
+
+    def get(self, db: Session, indicator_id: int):
+        self.ensure(db, [indicator_id])
+        return self._by_id.get(indicator_id)
+
+
+indicator_catalog = IndicatorCatalog()
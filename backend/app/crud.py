@@ -1,9 +1,14 @@
-from sqlalchemy.orm import Session
-from . import models, schemas
-from .auth import get_password_hash, verify_password
-import requests
-import json
-from sqlalchemy import or_
+from sqlalchemy.orm import Session, selectinload
+from . import models, schemas, rollups, history, search
+from .catalog import ACTIVITIES_CACHE, indicator_catalog, triggers_available
+from .auth import get_password_hash, verify_and_update_password
+from .logging_config import logger
+from .webhooks import dispatcher
+from .cache import TTLCache
+from sqlalchemy import or_, and_, exists, func, select, insert, update
+import base64
+from collections import Counter
+import datetime
 
 def get_user_by_username(db: Session, username: str):
     return db.query(models.User).filter(models.User.username == username).first()
@@ -28,8 +33,12 @@ def authenticate_user(db: Session, username: str, password: str):
     user = get_user_by_username(db, username)
     if not user:
         return False
-    if not verify_password(password, user.hashed_password):
+    valid, new_hash = verify_and_update_password(password, user.hashed_password)
+    if not valid:
         return False
+    if new_hash:
+        # Parámetros del KDF cambiaron: se guarda con el commit del login
+        user.hashed_password = new_hash
     return user
 
 def create_activity(db: Session, owner_id: int, activity: schemas.ActivityCreate):
@@ -42,178 +51,401 @@ def create_activity(db: Session, owner_id: int, activity: schemas.ActivityCreate
         owner_id=owner_id,
     )
     db.add(db_act)
+    db.flush()
+    rollups.apply_delta(db, rollups.activity_key(db_act), 1)
+    search.index_activities(db, [db_act.id])
     db.commit()
     db.refresh(db_act)
     return db_act
 
 def has_activity_access(db: Session, activity_id: int, user_id: int):
-    act = db.query(models.Activity).filter(models.Activity.id == activity_id).first()
-    if not act:
-        return False
-    
-    # Verificar si el usuario es Admin
-    user = db.query(models.User).filter(models.User.id == user_id).first()
-    if user and user.role == "Admin":
-        return True
-    
-    # Verificar si es el dueño
-    if act.owner_id == user_id:
-        return True
-    
-    # Verificar si tiene acceso compartido
-    shared = db.query(models.ActivityAccess).filter(
-        models.ActivityAccess.activity_id == activity_id,
+    """Verifica el acceso de un usuario por id en una sola consulta (Admin, dueño o acceso compartido)."""
+    is_admin = exists().where(
+        models.User.id == user_id,
+        models.User.role == "Admin"
+    )
+    shared = exists().where(
+        models.ActivityAccess.activity_id == models.Activity.id,
         models.ActivityAccess.user_id == user_id
+    )
+    found = db.query(models.Activity.id).filter(
+        models.Activity.id == activity_id,
+        or_(models.Activity.owner_id == user_id, shared, is_admin)
     ).first()
-    return shared is not None
+    return found is not None
+
+def _activity_scope_clause(current_user: models.User):
+    """Condición de alcance para un usuario no Admin (None si ve todo)."""
+    if current_user.role == "Admin":
+        return None
+    # EXISTS en lugar de OUTER JOIN + DISTINCT: cada actividad sale una sola vez
+    # y el conteo / orden no necesitan deduplicar filas.
+    shared = exists().where(
+        models.ActivityAccess.activity_id == models.Activity.id,
+        models.ActivityAccess.user_id == current_user.id
+    )
+    return or_(models.Activity.owner_id == current_user.id, shared)
+
+def _accessible_activity_statement(activity_id: int, current_user: models.User):
+    stmt = select(models.Activity).where(models.Activity.id == activity_id)
+    scope = _activity_scope_clause(current_user)
+    if scope is not None:
+        stmt = stmt.where(scope)
+    return stmt
+
+def get_accessible_activity(db: Session, activity_id: int, current_user: models.User):
+    """Devuelve la actividad si `current_user` puede verla, o None.
+
+    Usa el usuario ya cargado por `auth.get_current_user`, resuelve el acceso en
+    una sola consulta y cachea el resultado en la sesión (una por request).
+    """
+    cache = db.info.setdefault('activity_access', {})
+    key = (activity_id, current_user.id)
+    if key in cache:
+        return cache[key]
+
+    act = db.execute(_accessible_activity_statement(activity_id, current_user)).scalars().first()
+    cache[key] = act
+    return act
+
+def _forget_activity_access(db: Session, activity_id: int):
+    cache = db.info.get('activity_access')
+    if cache:
+        for key in [k for k in cache if k[0] == activity_id]:
+            del cache[key]
 
 def _activity_scope_query(db: Session, current_user: models.User):
     query = db.query(models.Activity)
-    if current_user.role != "Admin":
-        query = query.outerjoin(
-            models.ActivityAccess,
-            models.ActivityAccess.activity_id == models.Activity.id
-        ).filter(
-            or_(
-                models.Activity.owner_id == current_user.id,
-                models.ActivityAccess.user_id == current_user.id
-            )
-        ).distinct()
+    scope = _activity_scope_clause(current_user)
+    if scope is not None:
+        query = query.filter(scope)
     return query
 
-def list_activities(db: Session, current_user: models.User, status: str = None, assigned_to: str = None, page: int = 1, per_page: int = 10):
-    query = _activity_scope_query(db, current_user)
-    
+def _activity_list_loaders():
+    """Carga subtareas y archivos de la página en consultas fijas (sin N+1); el indicador sale del catálogo en memoria."""
+    return (
+        selectinload(models.Activity.subtasks),
+        selectinload(models.Activity.files),
+    )
+
+def encode_activity_cursor(activity: models.Activity) -> str:
+    """Cursor (timestamp, id); sirve para actividades y changesets de historial."""
+    raw = f"{activity.timestamp.isoformat()}|{activity.id}"
+    return base64.urlsafe_b64encode(raw.encode()).decode()
+
+def decode_activity_cursor(cursor: str):
+    """Devuelve (timestamp, id) o None si el cursor no es válido."""
+    try:
+        raw = base64.urlsafe_b64decode(cursor.encode()).decode()
+        ts, act_id = raw.rsplit("|", 1)
+        return datetime.datetime.fromisoformat(ts), int(act_id)
+    except (ValueError, UnicodeDecodeError):
+        return None
+
+def _list_activities_filters(current_user: models.User, status: str = None, assigned_to: str = None):
+    filters = []
+    scope = _activity_scope_clause(current_user)
+    if scope is not None:
+        filters.append(scope)
     if status:
-        query = query.filter(models.Activity.status == status)
+        filters.append(models.Activity.status == status)
     if assigned_to:
-        query = query.filter(models.Activity.assigned_to == assigned_to)
-    
-    # Paginado
-    total = query.count()
-    offset = (page - 1) * per_page
-    items = query.order_by(models.Activity.timestamp.desc()).offset(offset).limit(per_page).all()
-    
-    return {"total": total, "page": page, "per_page": per_page, "items": items}
+        filters.append(models.Activity.assigned_to == assigned_to)
+    return filters
+
+def _activities_version_statement(current_user: models.User, status: str = None, assigned_to: str = None):
+    """Versión para ETag: (última modificación, contador).
+
+    Con triggers es el contador `activities` de `cache_versions` (lectura por clave
+    primaria; cualquier cambio en actividades, subtareas, archivos o accesos lo
+    sube). Sin triggers se cae al agregado sobre el alcance, que cuesta un recorrido.
+    """
+    if triggers_available():
+        return select(models.CacheVersion.updated_at, models.CacheVersion.version).where(
+            models.CacheVersion.name == ACTIVITIES_CACHE
+        )
+    return select(
+        func.max(models.Activity.updated_at),
+        func.count(models.Activity.id),
+        func.max(models.Activity.id),
+    ).where(*_list_activities_filters(current_user, status, assigned_to))
+
+def activities_version(db: Session, current_user: models.User, status: str = None, assigned_to: str = None):
+    row = db.execute(_activities_version_statement(current_user, status, assigned_to)).first()
+    return tuple(row) if row else (None, 0)
+
+def indicators_version(db: Session) -> str:
+    indicator_catalog.ensure(db)
+    return indicator_catalog.version
+
+def _touch_activity(db: Session, activity_id: int):
+    """Marca la actividad como modificada (subtareas/archivos): `updated_at` y Last-Modified."""
+    db.execute(
+        update(models.Activity)
+        .where(models.Activity.id == activity_id)
+        .values(updated_at=datetime.datetime.utcnow())
+        .execution_options(synchronize_session=False)
+    )
+
+def _list_activities_statements(current_user: models.User, status: str = None, assigned_to: str = None, page: int = 1, per_page: int = 10, cursor: str = None, include_total: bool = None):
+    """Arma (consulta de conteo o None, consulta de la página) para list_activities."""
+    filters = _list_activities_filters(current_user, status, assigned_to)
 
-def update_activity(db: Session, activity_id: int, owner_id: int, activity_update: schemas.ActivityUpdate, username: str):
-    if not has_activity_access(db, activity_id, owner_id):
+    if include_total is None:
+        include_total = cursor is None
+    count_stmt = select(func.count(models.Activity.id)).where(*filters) if include_total else None
+
+    # Paginado
+    page_stmt = select(models.Activity).where(*filters).options(*_activity_list_loaders()).order_by(
+        models.Activity.timestamp.desc(), models.Activity.id.desc()
+    )
+    if cursor is not None:
+        position = decode_activity_cursor(cursor)
+        if position is None:
+            raise ValueError("Cursor inválido")
+        ts, act_id = position
+        page_stmt = page_stmt.where(
+            or_(
+                models.Activity.timestamp < ts,
+                and_(models.Activity.timestamp == ts, models.Activity.id < act_id)
+            )
+        )
+    else:
+        page_stmt = page_stmt.offset((page - 1) * per_page)
+    return count_stmt, page_stmt.limit(per_page + 1)
+
+def _list_activities_page(items: list, total, page: int, per_page: int):
+    next_cursor = None
+    if len(items) > per_page:
+        items = items[:per_page]
+        next_cursor = encode_activity_cursor(items[-1])
+    return {"total": total, "page": page, "per_page": per_page, "items": items, "next_cursor": next_cursor}
+
+def list_activities(db: Session, current_user: models.User, status: str = None, assigned_to: str = None, page: int = 1, per_page: int = 10, cursor: str = None, include_total: bool = None):
+    """Lista actividades paginadas.
+
+    Sin `cursor` usa OFFSET por página. Con `cursor` (el `next_cursor` de la
+    respuesta anterior) pagina por (timestamp, id), en tiempo constante por página.
+    El total se omite por defecto en modo cursor.
+    """
+    count_stmt, page_stmt = _list_activities_statements(current_user, status, assigned_to, page, per_page, cursor, include_total)
+    total = db.execute(count_stmt).scalar() if count_stmt is not None else None
+    items = db.execute(page_stmt).scalars().all()
+    indicator_catalog.ensure(db, {a.indicator_id for a in items})
+    return _list_activities_page(items, total, page, per_page)
+
+SEARCH_MAX_PER_PAGE = 100
+
+def _search_activities_statement(current_user: models.User, q: str, page: int = 1, per_page: int = 20):
+    """Búsqueda de texto ordenada por relevancia, con el mismo alcance que list_activities (o None si no hay términos)."""
+    q = (q or '').strip()
+    if not q:
+        raise ValueError("La búsqueda no puede estar vacía")
+    if page < 1 or not 1 <= per_page <= SEARCH_MAX_PER_PAGE:
+        raise ValueError(f"page debe ser >= 1 y per_page entre 1 y {SEARCH_MAX_PER_PAGE}")
+    match = search.search_match(q)
+    if match is None:
         return None
-    db_act = db.query(models.Activity).filter(models.Activity.id == activity_id).first()
+    search_table, join_on, condition, rank = match
+    stmt = select(models.Activity)
+    if search_table is not None:
+        stmt = stmt.join(search_table, join_on)
+    stmt = stmt.where(condition)
+    scope = _activity_scope_clause(current_user)
+    if scope is not None:
+        stmt = stmt.where(scope)
+    return stmt.options(*_activity_list_loaders()).order_by(
+        rank, models.Activity.id.desc()
+    ).offset((page - 1) * per_page).limit(per_page + 1)
+
+def _search_activities_page(items: list, page: int, per_page: int):
+    return {"page": page, "per_page": per_page, "has_more": len(items) > per_page, "items": items[:per_page]}
+
+def search_activities(db: Session, current_user: models.User, q: str, page: int = 1, per_page: int = 20):
+    stmt = _search_activities_statement(current_user, q, page, per_page)
+    items = db.execute(stmt).scalars().all() if stmt is not None else []
+    indicator_catalog.ensure(db, {a.indicator_id for a in items})
+    return _search_activities_page(items, page, per_page)
+
+ACTIVITY_TRACKED_FIELDS = ('status', 'assigned_to', 'description', 'due_date', 'indicator_id')
+
+def _activity_changes(db_act: models.Activity, activity_update: schemas.ActivityUpdate):
+    """Campos de `activity_update` que cambian la actividad: campo -> (anterior, nuevo)."""
+    changes = {}
+    for field in ACTIVITY_TRACKED_FIELDS:
+        new_value = getattr(activity_update, field)
+        old_value = getattr(db_act, field)
+        if new_value is not None and new_value != old_value:
+            changes[field] = (old_value, new_value)
+    return changes
+
+def _webhook_activity_data(db_act: models.Activity, **changes):
+    data = {'id': db_act.id, 'title': db_act.title, 'status': db_act.status, 'assigned_to': db_act.assigned_to}
+    data.update((k, v) for k, v in changes.items() if k in data)
+    return data
+
+def update_activity(db: Session, activity_id: int, current_user: models.User, activity_update: schemas.ActivityUpdate):
+    db_act = get_accessible_activity(db, activity_id, current_user)
     if not db_act:
         return None
-    
-    changed = False
+    rollup_before = rollups.activity_key(db_act)
+
     # Registrar cambios en historial
-    if activity_update.status is not None and activity_update.status != db_act.status:
-        history = models.ActivityHistory(
-            activity_id=activity_id,
-            changed_by=username,
-            changed_field='status',
-            old_value=db_act.status,
-            new_value=activity_update.status
-        )
-        db.add(history)
-        db_act.status = activity_update.status
-        changed = True
-    
-    if activity_update.assigned_to is not None and activity_update.assigned_to != db_act.assigned_to:
-        history = models.ActivityHistory(
-            activity_id=activity_id,
-            changed_by=username,
-            changed_field='assigned_to',
-            old_value=db_act.assigned_to,
-            new_value=activity_update.assigned_to
-        )
-        db.add(history)
-        db_act.assigned_to = activity_update.assigned_to
-        changed = True
-    
-    if activity_update.description is not None and activity_update.description != db_act.description:
-        history = models.ActivityHistory(
-            activity_id=activity_id,
-            changed_by=username,
-            changed_field='description',
-            old_value=db_act.description,
-            new_value=activity_update.description
-        )
-        db.add(history)
-        db_act.description = activity_update.description
-        changed = True
-    
-    if activity_update.due_date is not None and activity_update.due_date != db_act.due_date:
-        old_val = db_act.due_date.isoformat() if db_act.due_date else None
-        new_val = activity_update.due_date.isoformat() if activity_update.due_date else None
-        history = models.ActivityHistory(
-            activity_id=activity_id,
-            changed_by=username,
-            changed_field='due_date',
-            old_value=old_val,
-            new_value=new_val
-        )
-        db.add(history)
-        db_act.due_date = activity_update.due_date
-        changed = True
-    
-    if activity_update.indicator_id is not None and activity_update.indicator_id != db_act.indicator_id:
-        history = models.ActivityHistory(
-            activity_id=activity_id,
-            changed_by=username,
-            changed_field='indicator_id',
-            old_value=str(db_act.indicator_id),
-            new_value=str(activity_update.indicator_id)
-        )
-        db.add(history)
-        db_act.indicator_id = activity_update.indicator_id
-        changed = True
-    
+    changes = _activity_changes(db_act, activity_update)
+    if changes:
+        now = datetime.datetime.utcnow()
+        db.execute(insert(models.ActivityChangeset), [history.changeset_row(activity_id, current_user.username, changes, now)])
+        for field, (_, new_value) in changes.items():
+            setattr(db_act, field, new_value)
+
+    rollups.move(db, rollup_before, rollups.activity_key(db_act))
+    if 'description' in changes:
+        search.index_activities(db, [activity_id])
     db.commit()
     db.refresh(db_act)
     
     # Enviar webhooks si hubo cambio (sin romper si falla)
-    if changed:
+    if changes:
         try:
-            send_webhooks(db, owner_id, 'activity_updated', {
-                'id': db_act.id,
-                'title': db_act.title,
-                'status': db_act.status,
-                'assigned_to': db_act.assigned_to
-            })
+            send_webhooks(db, current_user.id, 'activity_updated', _webhook_activity_data(db_act))
         except Exception as e:
             logger.error(f"Error enviando webhooks: {str(e)}")
     
     return db_act
 
+def bulk_update_activities(db: Session, activity_ids: list, current_user: models.User, activity_update: schemas.ActivityUpdate):
+    """Aplica el mismo cambio a varias actividades en un solo UPDATE y un commit.
+
+    Los changesets de historial se insertan en lote, los rollups se ajustan con un delta por
+    grupo y sale un único webhook `activities_bulk_updated`.
+    """
+    activities = _activity_scope_query(db, current_user).filter(models.Activity.id.in_(activity_ids)).all()
+    found_ids = {a.id for a in activities}
+    now = datetime.datetime.utcnow()
+    changesets = []
+    rollup_deltas = Counter()
+    updated = []
+    for act in activities:
+        changes = _activity_changes(act, activity_update)
+        if not changes:
+            continue
+        new_values = {field: new_value for field, (_, new_value) in changes.items()}
+        rollup_deltas[rollups.activity_key(act)] -= 1
+        rollup_deltas[rollups.activity_key(act, **new_values)] += 1
+        changesets.append(history.changeset_row(act.id, current_user.username, changes, now))
+        updated.append(_webhook_activity_data(act, **new_values))
+
+    if updated:
+        values = {field: getattr(activity_update, field) for field in ACTIVITY_TRACKED_FIELDS
+                  if getattr(activity_update, field) is not None}
+        db.execute(
+            update(models.Activity)
+            .where(models.Activity.id.in_([a['id'] for a in updated]))
+            .values(**values, updated_at=now)
+            .execution_options(synchronize_session=False)
+        )
+        db.execute(insert(models.ActivityChangeset), changesets)
+        for key, delta in rollup_deltas.items():
+            if key is not None and delta:
+                rollups.apply_delta(db, key, delta)
+        if activity_update.description is not None:
+            search.index_activities(db, [a['id'] for a in updated])
+    db.commit()
+
+    if updated:
+        try:
+            send_bulk_webhooks(db, current_user.id, 'activities_bulk_updated', updated)
+        except Exception as e:
+            logger.error(f"Error enviando webhooks: {str(e)}")
+    updated_ids = [a['id'] for a in updated]
+    return {
+        'updated': updated_ids,
+        'unchanged': sorted(found_ids - set(updated_ids)),
+        'not_found': sorted(set(activity_ids) - found_ids),
+    }
+
 def delete_activity(db: Session, activity_id: int):
     db_act = db.query(models.Activity).filter(models.Activity.id == activity_id).first()
     if not db_act:
         return None
+    rollups.apply_delta(db, rollups.activity_key(db_act), -1)
     # Remove related records that do not cascade automatically
     db.query(models.ActivityHistory).filter(models.ActivityHistory.activity_id == activity_id).delete()
+    db.query(models.ActivityChangeset).filter(models.ActivityChangeset.activity_id == activity_id).delete()
     db.query(models.Invitation).filter(models.Invitation.activity_id == activity_id).delete()
+    search.remove_activities(db, [activity_id])
     db.delete(db_act)
     db.commit()
+    _forget_activity_access(db, activity_id)
     return db_act
 
-def get_activity_history(db: Session, activity_id: int, owner_id: int):
-    if not has_activity_access(db, activity_id, owner_id):
+HISTORY_MAX_PER_PAGE = 200
+
+def _activity_history_statement(activity_id: int = None, field: str = None, page: int = 1, per_page: int = 50, cursor: str = None, since: datetime.datetime = None):
+    """Página de changesets (más recientes primero); trae una fila extra para saber si hay más.
+
+    Con `activity_id=None` es el feed global (índice por timestamp, id). Con
+    `cursor` se pagina por (timestamp, id) en vez de offset.
+    """
+    if field is not None and field not in ACTIVITY_TRACKED_FIELDS:
+        raise ValueError(f"Campo no válido: {field}")
+    if page < 1 or not 1 <= per_page <= HISTORY_MAX_PER_PAGE:
+        raise ValueError(f"page debe ser >= 1 y per_page entre 1 y {HISTORY_MAX_PER_PAGE}")
+    changeset = models.ActivityChangeset
+    stmt = select(changeset)
+    if activity_id is not None:
+        stmt = stmt.where(changeset.activity_id == activity_id)
+    if field is not None:
+        stmt = stmt.where(changeset.fields.like(history.field_pattern(field)))
+    if since is not None:
+        stmt = stmt.where(changeset.timestamp >= since)
+    stmt = stmt.order_by(changeset.timestamp.desc(), changeset.id.desc())
+    if cursor is not None:
+        position = decode_activity_cursor(cursor)
+        if position is None:
+            raise ValueError("Cursor inválido")
+        ts, changeset_id = position
+        stmt = stmt.where(
+            or_(
+                changeset.timestamp < ts,
+                and_(changeset.timestamp == ts, changeset.id < changeset_id)
+            )
+        )
+    else:
+        stmt = stmt.offset((page - 1) * per_page)
+    return stmt.limit(per_page + 1)
+
+def _activity_history_page(rows, field: str, page: int, per_page: int):
+    has_more = len(rows) > per_page
+    rows = rows[:per_page]
+    return {
+        'page': page,
+        'per_page': per_page,
+        'has_more': has_more,
+        'next_cursor': encode_activity_cursor(rows[-1]) if has_more else None,
+        'items': [history.changeset_out(row, field) for row in rows],
+    }
+
+def get_activity_history(db: Session, activity_id: int, current_user: models.User, field: str = None, page: int = 1, per_page: int = 50, cursor: str = None, since: datetime.datetime = None):
+    """Historial paginado de una actividad; con `field` solo los cambios de ese campo."""
+    if not get_accessible_activity(db, activity_id, current_user):
         return None
-    return db.query(models.ActivityHistory).filter(
-        models.ActivityHistory.activity_id == activity_id
-    ).order_by(models.ActivityHistory.timestamp.desc()).all()
+    rows = db.execute(_activity_history_statement(activity_id, field, page, per_page, cursor, since)).scalars().all()
+    return _activity_history_page(rows, field, page, per_page)
 
-def get_activities_for_export(db: Session, current_user: models.User, status: str = None):
+def get_activities_for_export(db: Session, current_user: models.User, status: str = None, batch_size: int = 500):
+    """Iterador de actividades para exportar, leído en lotes con cursor de servidor."""
     query = _activity_scope_query(db, current_user)
     if status:
         query = query.filter(models.Activity.status == status)
-    return query.order_by(models.Activity.timestamp.desc()).all()
+    return query.order_by(models.Activity.timestamp.desc()).yield_per(batch_size)
 
-def get_activities_for_week(db: Session, current_user: models.User, days: int = 7):
+def get_activities_for_week(db: Session, current_user: models.User, days: int = 7, batch_size: int = 500):
     from datetime import datetime, timedelta
     start_date = datetime.utcnow() - timedelta(days=days)
     query = _activity_scope_query(db, current_user)
     query = query.filter(models.Activity.timestamp >= start_date)
-    return query.order_by(models.Activity.timestamp.desc()).all()
+    return query.order_by(models.Activity.timestamp.desc()).yield_per(batch_size)
 
 def create_webhook(db: Session, owner_id: int, webhook: schemas.WebhookCreate):
     db_webhook = models.Webhook(owner_id=owner_id, url=webhook.url, event=webhook.event)
@@ -235,6 +467,13 @@ def delete_webhook(db: Session, webhook_id: int, owner_id: int):
         db.commit()
     return db_webhook
 
+# Los eventos por lote también se entregan a quien se suscribió al evento individual
+# equivalente; su payload trae `count` y `activities` (lista) en lugar de `activity`
+WEBHOOK_EVENT_ALIASES = {
+    'activities_bulk_updated': ('activity_updated',),
+    'activities_bulk_assigned': ('activity_updated',),
+}
+
 def get_webhooks_for_event(db: Session, owner_id: int, event: str):
     from sqlalchemy import or_, cast, Boolean
     return db.query(models.Webhook).filter(
@@ -243,27 +482,38 @@ def get_webhooks_for_event(db: Session, owner_id: int, event: str):
             models.Webhook.active == True,
             models.Webhook.active.in_(['true', '1', 'True'])
         ),
-        or_(models.Webhook.event == "*", models.Webhook.event == event)
+        models.Webhook.event.in_(("*", event, *WEBHOOK_EVENT_ALIASES.get(event, ())))
     ).all()
 
+def send_bulk_webhooks(db: Session, owner_id: int, event: str, activities: list):
+    """Un solo webhook con todas las actividades de una operación por lote.
+
+    También llega a los suscriptores de `activity_updated` (ver WEBHOOK_EVENT_ALIASES).
+    """
+    webhooks = get_webhooks_for_event(db, owner_id, event)
+    payload = {
+        'event': event,
+        'count': len(activities),
+        'activities': activities,
+        'timestamp': str(datetime.datetime.utcnow())
+    }
+    for webhook in webhooks:
+        dispatcher.enqueue(webhook.id, webhook.url, payload)
+
 def send_webhooks(db: Session, owner_id: int, event: str, activity_data: dict):
-    """Enviar webhooks para un evento específico"""
+    """Encolar los webhooks de un evento; la entrega ocurre en segundo plano."""
     webhooks = get_webhooks_for_event(db, owner_id, event)
+    payload = {
+        'event': event,
+        'activity': activity_data,
+        'timestamp': str(datetime.datetime.utcnow())
+    }
     for webhook in webhooks:
-        try:
-            requests.post(webhook.url, json={
-                'event': event,
-                'activity': activity_data,
-                'timestamp': str(__import__('datetime').datetime.utcnow())
-            }, timeout=5)
-        except Exception as e:
-            # Log error pero no falla la aplicación
-            print(f"Error enviando webhook {webhook.url}: {str(e)}")
+        dispatcher.enqueue(webhook.id, webhook.url, payload)
 
-def create_subtask(db: Session, activity_id: int, owner_id: int, subtask: schemas.SubActivityCreate):
+def create_subtask(db: Session, activity_id: int, current_user: models.User, subtask: schemas.SubActivityCreate):
     """Crear una subtarea para una actividad"""
-    db_act = db.query(models.Activity).filter(models.Activity.id == activity_id).first()
-    if not db_act or not has_activity_access(db, activity_id, owner_id):
+    if not get_accessible_activity(db, activity_id, current_user):
         return None
     
     # Obtener el orden máximo
@@ -279,22 +529,27 @@ def create_subtask(db: Session, activity_id: int, owner_id: int, subtask: schema
         order=next_order
     )
     db.add(db_subtask)
+    search.index_activities(db, [activity_id])
+    _touch_activity(db, activity_id)
     db.commit()
     db.refresh(db_subtask)
     return db_subtask
 
-def list_subtasks(db: Session, activity_id: int, owner_id: int):
+def _subtasks_statement(activity_id: int):
+    return select(models.SubActivity).where(
+        models.SubActivity.activity_id == activity_id
+    ).order_by(models.SubActivity.order)
+
+def list_subtasks(db: Session, activity_id: int, current_user: models.User):
     """Listar todas las subtareas de una actividad"""
-    if not has_activity_access(db, activity_id, owner_id):
+    if not get_accessible_activity(db, activity_id, current_user):
         return None
     
-    return db.query(models.SubActivity).filter(
-        models.SubActivity.activity_id == activity_id
-    ).order_by(models.SubActivity.order).all()
+    return db.execute(_subtasks_statement(activity_id)).scalars().all()
 
-def update_subtask(db: Session, subtask_id: int, activity_id: int, owner_id: int, subtask_update: schemas.SubActivityUpdate, username: str):
+def update_subtask(db: Session, subtask_id: int, activity_id: int, current_user: models.User, subtask_update: schemas.SubActivityUpdate):
     """Actualizar una subtarea"""
-    if not has_activity_access(db, activity_id, owner_id):
+    if not get_accessible_activity(db, activity_id, current_user):
         return None
     
     db_subtask = db.query(models.SubActivity).filter(
@@ -322,14 +577,16 @@ def update_subtask(db: Session, subtask_id: int, activity_id: int, owner_id: int
         db_subtask.description = subtask_update.description
         changed = True
     
+    if changed:
+        _touch_activity(db, activity_id)
     db.commit()
     db.refresh(db_subtask)
     
     return db_subtask
 
-def delete_subtask(db: Session, subtask_id: int, activity_id: int, owner_id: int):
+def delete_subtask(db: Session, subtask_id: int, activity_id: int, current_user: models.User):
     """Eliminar una subtarea"""
-    if not has_activity_access(db, activity_id, owner_id):
+    if not get_accessible_activity(db, activity_id, current_user):
         return None
     
     db_subtask = db.query(models.SubActivity).filter(
@@ -340,106 +597,211 @@ def delete_subtask(db: Session, subtask_id: int, activity_id: int, owner_id: int
         return None
     
     db.delete(db_subtask)
+    search.index_activities(db, [activity_id])
+    _touch_activity(db, activity_id)
     db.commit()
     return db_subtask
 
-def create_activity_file(db: Session, activity_id: int, owner_id: int, fileinfo: dict):
-    if not has_activity_access(db, activity_id, owner_id):
+def create_activity_file(db: Session, activity_id: int, current_user: models.User, fileinfo: dict):
+    if not get_accessible_activity(db, activity_id, current_user):
         return None
     db_file = models.ActivityFile(
         activity_id=activity_id,
         filename=fileinfo.get('filename'),
         file_path=fileinfo.get('file_path'),
         file_size=fileinfo.get('file_size'),
+        sha256=fileinfo.get('sha256'),
         file_type=fileinfo.get('file_type'),
         uploaded_by=fileinfo.get('uploaded_by')
     )
     db.add(db_file)
+    _touch_activity(db, activity_id)
     db.commit()
     db.refresh(db_file)
     return db_file
 
-def list_activity_files(db: Session, activity_id: int, owner_id: int):
-    if not has_activity_access(db, activity_id, owner_id):
+def list_activity_files(db: Session, activity_id: int, current_user: models.User):
+    if not get_accessible_activity(db, activity_id, current_user):
         return None
     return db.query(models.ActivityFile).filter(models.ActivityFile.activity_id == activity_id).order_by(models.ActivityFile.timestamp.desc()).all()
 
-def get_activity_file(db: Session, file_id: int, activity_id: int, owner_id: int):
-    if not has_activity_access(db, activity_id, owner_id):
-        return None
-    return db.query(models.ActivityFile).filter(models.ActivityFile.id == file_id, models.ActivityFile.activity_id == activity_id).first()
-
-def delete_activity_file(db: Session, file_id: int, activity_id: int, owner_id: int):
-    db_file = get_activity_file(db, file_id, activity_id, owner_id)
+def get_activity_file(db: Session, file_id: int, activity_id: int, current_user: models.User):
+    """Archivo de una actividad accesible, en una sola consulta (mismo alcance por EXISTS)."""
+    stmt = select(models.ActivityFile).join(
+        models.Activity, models.Activity.id == models.ActivityFile.activity_id
+    ).where(models.ActivityFile.id == file_id, models.ActivityFile.activity_id == activity_id)
+    scope = _activity_scope_clause(current_user)
+    if scope is not None:
+        stmt = stmt.where(scope)
+    return db.execute(stmt).scalars().first()
+
+def delete_activity_file(db: Session, file_id: int, activity_id: int, current_user: models.User):
+    db_file = get_activity_file(db, file_id, activity_id, current_user)
     if not db_file:
         return None
     db.delete(db_file)
+    _touch_activity(db, activity_id)
     db.commit()
     return db_file
 
-def get_weekly_dashboard(db: Session, current_user: models.User):
-    """Get weekly activity summary by status for last 7 days"""
-    import datetime as dt
-    today = dt.datetime.utcnow().date()
-    week_ago = today - dt.timedelta(days=7)
-    base_query = _activity_scope_query(db, current_user)
-    
-    # Count activities by status created in last 7 days
-    # Estados en BD español: 'En Curso', 'Completada', 'Cancelada'
-    in_progress_count = base_query.filter(
-        models.Activity.status == 'En Curso',
-        models.Activity.timestamp >= dt.datetime(week_ago.year, week_ago.month, week_ago.day)
-    ).count()
-    
-    done_count = base_query.filter(
-        models.Activity.status == 'Completada',
-        models.Activity.timestamp >= dt.datetime(week_ago.year, week_ago.month, week_ago.day)
-    ).count()
-    
-    cancelled_count = base_query.filter(
-        models.Activity.status == 'Cancelada',
-        models.Activity.timestamp >= dt.datetime(week_ago.year, week_ago.month, week_ago.day)
-    ).count()
-    
-    total = in_progress_count + done_count + cancelled_count
-    
+DASHBOARD_WINDOWS = (7, 30, 90)
+DASHBOARD_STATUS_KEYS = {'En Curso': 'in_progress', 'Completada': 'done', 'Cancelada': 'cancelled'}
+_dashboard_cache = TTLCache(maxsize=512, ttl=30)
+
+def _status_summary(counts: dict):
+    total = sum(counts.values())
     return {
-        'period': f'Últimos 7 días (desde {week_ago})',
-        'in_progress': in_progress_count,
-        'done': done_count,
-        'cancelled': cancelled_count,
+        **counts,
         'total': total,
         'percentages': {
-            'in_progress': round((in_progress_count / total * 100) if total > 0 else 0, 1),
-            'done': round((done_count / total * 100) if total > 0 else 0, 1),
-            'cancelled': round((cancelled_count / total * 100) if total > 0 else 0, 1)
+            key: round((value / total * 100) if total > 0 else 0, 1)
+            for key, value in counts.items()
         }
     }
 
-def get_due_activities(db: Session, current_user: models.User, within_hours: int = 24):
-    """Return activities with due_date within the next `within_hours` hours and not Done."""
+def _dashboard_cache_key(current_user: models.User, days: int, version=None):
+    """Clave de caché; con `version` (la del ETag) el cuerpo cacheado siempre coincide con él."""
+    if days not in DASHBOARD_WINDOWS:
+        raise ValueError(f"Ventana inválida, use una de {DASHBOARD_WINDOWS}")
+    scope = 'admin' if current_user.role == "Admin" else current_user.id
+    return (scope, days, version)
+
+def _dashboard_since(days: int):
+    return datetime.datetime.utcnow().date() - datetime.timedelta(days=days)
+
+def _dashboard_rows_statement(current_user: models.User, since: datetime.date):
+    """Un solo GROUP BY (estado, indicador, asignado) para el dashboard."""
+    # Estados en BD español: 'En Curso', 'Completada', 'Cancelada'
+    if current_user.role == "Admin":
+        # Alcance completo: se lee de la tabla de rollups, O(grupos) en vez de O(actividades)
+        rollup = models.ActivityRollup
+        return select(
+            rollup.status,
+            rollup.indicator_id,
+            models.Indicator.name,
+            func.nullif(rollup.assigned_to, ''),
+            func.sum(rollup.count)
+        ).outerjoin(
+            models.Indicator, models.Indicator.id == rollup.indicator_id
+        ).where(
+            rollup.status.in_(DASHBOARD_STATUS_KEYS.keys()),
+            rollup.day >= since
+        ).group_by(
+            rollup.status,
+            rollup.indicator_id,
+            models.Indicator.name,
+            rollup.assigned_to
+        ).having(func.sum(rollup.count) > 0)
+
+    return select(
+        models.Activity.status,
+        models.Activity.indicator_id,
+        models.Indicator.name,
+        models.Activity.assigned_to,
+        func.count(models.Activity.id)
+    ).outerjoin(
+        models.Indicator, models.Indicator.id == models.Activity.indicator_id
+    ).where(
+        _activity_scope_clause(current_user),
+        models.Activity.status.in_(DASHBOARD_STATUS_KEYS.keys()),
+        models.Activity.timestamp >= datetime.datetime(since.year, since.month, since.day)
+    ).group_by(
+        models.Activity.status,
+        models.Activity.indicator_id,
+        models.Indicator.name,
+        models.Activity.assigned_to
+    )
+
+def _dashboard_result(rows, days: int, since: datetime.date):
+    def _empty():
+        return {key: 0 for key in DASHBOARD_STATUS_KEYS.values()}
+
+    totals = _empty()
+    by_indicator = {}
+    by_assignee = {}
+    for status, indicator_id, indicator_name, assigned_to, count in rows:
+        count = int(count)
+        key = DASHBOARD_STATUS_KEYS[status]
+        totals[key] += count
+        indicator = by_indicator.setdefault(indicator_id, {'indicator_id': indicator_id, 'name': indicator_name, 'counts': _empty()})
+        indicator['counts'][key] += count
+        assignee = by_assignee.setdefault(assigned_to, {'assigned_to': assigned_to, 'counts': _empty()})
+        assignee['counts'][key] += count
+
+    summary = _status_summary(totals)
+    return {
+        'period': f'Últimos {days} días (desde {since})',
+        'days': days,
+        'in_progress': summary['in_progress'],
+        'done': summary['done'],
+        'cancelled': summary['cancelled'],
+        'total': summary['total'],
+        'percentages': summary['percentages'],
+        'by_indicator': [
+            {'indicator_id': item['indicator_id'], 'name': item['name'], **_status_summary(item['counts'])}
+            for item in sorted(by_indicator.values(), key=lambda i: i['indicator_id'] or 0)
+        ],
+        'by_assignee': [
+            {'assigned_to': item['assigned_to'], **_status_summary(item['counts'])}
+            for item in sorted(by_assignee.values(), key=lambda i: i['assigned_to'] or '')
+        ]
+    }
+
+def get_weekly_dashboard(db: Session, current_user: models.User, days: int = 7, version=None):
+    """Resumen por estado de las actividades creadas en los últimos `days` días.
+
+    Se calcula con un solo GROUP BY (estado, indicador, asignado) y se cachea
+    unos segundos por alcance de usuario (todos los Admin comparten el mismo).
+    """
+    cache_key = _dashboard_cache_key(current_user, days, version)
+    cached = _dashboard_cache.get(cache_key)
+    if cached is not None:
+        return cached
+
+    since = _dashboard_since(days)
+    rows = db.execute(_dashboard_rows_statement(current_user, since)).all()
+    result = _dashboard_result(rows, days, since)
+    _dashboard_cache.set(cache_key, result)
+    return result
+
+CLOSED_STATUSES = ('Done', 'Completada', 'Cancelada')
+
+def get_due_activities(db: Session, current_user: models.User, within_hours: int = 24, load_files: bool = False):
+    """Return activities with due_date within the next `within_hours` hours and not closed."""
     import datetime as dt
     now = dt.datetime.utcnow()
     window = now + dt.timedelta(hours=within_hours)
 
-    return _activity_scope_query(db, current_user).filter(
+    query = _activity_scope_query(db, current_user).filter(
         models.Activity.due_date != None,
         models.Activity.due_date >= now,
         models.Activity.due_date <= window,
-        models.Activity.status != 'Done'
-    ).order_by(models.Activity.due_date.asc()).all()
+        models.Activity.status.notin_(CLOSED_STATUSES)
+    )
+    if load_files:
+        query = query.options(selectinload(models.Activity.files))
+    return query.order_by(models.Activity.due_date.asc()).all()
+
+def create_reminder_job(db: Session, current_user: models.User, within_hours: int):
+    job = models.ReminderJob(requested_by_id=current_user.id, within_hours=within_hours)
+    db.add(job)
+    db.commit()
+    db.refresh(job)
+    return job
+
+def get_reminder_job(db: Session, job_id: int, current_user: models.User):
+    query = db.query(models.ReminderJob).filter(models.ReminderJob.id == job_id)
+    if current_user.role != "Admin":
+        query = query.filter(models.ReminderJob.requested_by_id == current_user.id)
+    return query.first()
 
-def create_invitation(db: Session, activity_id: int, owner_id: int, invited_email: str, username: str):
+def create_invitation(db: Session, activity_id: int, current_user: models.User, invited_email: str):
     """Crear una invitación para una actividad"""
     import secrets
     import datetime as dt
     
     # Verificar que la actividad existe y el usuario tiene acceso
-    if not has_activity_access(db, activity_id, owner_id):
-        return None
-    
-    db_act = db.query(models.Activity).filter(models.Activity.id == activity_id).first()
-    if not db_act:
+    if not get_accessible_activity(db, activity_id, current_user):
         return None
     
     # Generar token único
@@ -450,7 +812,7 @@ def create_invitation(db: Session, activity_id: int, owner_id: int, invited_emai
         activity_id=activity_id,
         invited_email=invited_email,
         token=token,
-        created_by=username,
+        created_by=current_user.username,
         expires_at=expires_at
     )
     db.add(db_inv)
@@ -498,12 +860,9 @@ def list_collaborators(db: Session, current_user_id: int):
         models.User.role == "collaborator"
     ).order_by(models.User.full_name.asc()).all()
 
-def assign_activity_to_collaborator(db: Session, activity_id: int, owner_id: int, collaborator_id: int, username: str):
-    activity = db.query(models.Activity).filter(
-        models.Activity.id == activity_id,
-        models.Activity.owner_id == owner_id
-    ).first()
-    if not activity:
+def assign_activity_to_collaborator(db: Session, activity_id: int, current_user: models.User, collaborator_id: int):
+    activity = get_accessible_activity(db, activity_id, current_user)
+    if not activity or activity.owner_id != current_user.id:
         return None, None, None
 
     collaborator = db.query(models.User).filter(
@@ -514,6 +873,8 @@ def assign_activity_to_collaborator(db: Session, activity_id: int, owner_id: int
         return activity, None, None
 
     old_assignee = activity.assigned_to
+    now = datetime.datetime.utcnow()
+    rollup_before = rollups.activity_key(activity)
     activity.assigned_to = collaborator.full_name or collaborator.username
     activity.assigned_email = collaborator.email or collaborator.username
 
@@ -525,22 +886,103 @@ def assign_activity_to_collaborator(db: Session, activity_id: int, owner_id: int
         db.add(models.ActivityAccess(
             activity_id=activity_id,
             user_id=collaborator.id,
-            granted_by=username
+            granted_by=current_user.username
         ))
 
-    db.add(models.ActivityHistory(
-        activity_id=activity_id,
-        changed_by=username,
-        changed_field='assigned_to',
-        old_value=old_assignee,
-        new_value=activity.assigned_to
-    ))
+    db.execute(insert(models.ActivityChangeset), [history.changeset_row(
+        activity_id, current_user.username, {'assigned_to': (old_assignee, activity.assigned_to)}, now
+    )])
 
-    inv = create_invitation(db, activity_id, owner_id, activity.assigned_email, username)
+    rollups.move(db, rollup_before, rollups.activity_key(activity))
+    inv = create_invitation(db, activity_id, current_user, activity.assigned_email)
     db.commit()
     db.refresh(activity)
+    indicator_catalog.ensure(db, [activity.indicator_id])
     return activity, collaborator, inv
 
+def bulk_assign_activities(db: Session, activity_ids: list, current_user: models.User, collaborator_id: int):
+    """Asigna varias actividades propias a un colaborador con un commit.
+
+    Devuelve (colaborador, [{id, title, token}], ids no encontrados) o
+    (None, [], []) si el colaborador no existe. Sale un único webhook
+    `activities_bulk_assigned`.
+    """
+    import secrets
+
+    collaborator = db.query(models.User).filter(
+        models.User.id == collaborator_id,
+        models.User.role == "collaborator"
+    ).first()
+    if not collaborator:
+        return None, [], []
+
+    activities = _activity_scope_query(db, current_user).filter(
+        models.Activity.id.in_(activity_ids),
+        models.Activity.owner_id == current_user.id
+    ).all()
+    found_ids = [a.id for a in activities]
+    not_found = sorted(set(activity_ids) - set(found_ids))
+    if not activities:
+        return collaborator, [], not_found
+
+    now = datetime.datetime.utcnow()
+    assigned_to = collaborator.full_name or collaborator.username
+    assigned_email = collaborator.email or collaborator.username
+    with_access = set(db.execute(
+        select(models.ActivityAccess.activity_id).where(
+            models.ActivityAccess.activity_id.in_(found_ids),
+            models.ActivityAccess.user_id == collaborator.id
+        )
+    ).scalars())
+
+    rollup_deltas = Counter()
+    changesets = []
+    assigned = []
+    for act in activities:
+        assigned.append({'id': act.id, 'title': act.title, 'assigned_to': assigned_to})
+        rollup_deltas[rollups.activity_key(act)] -= 1
+        rollup_deltas[rollups.activity_key(act, assigned_to=assigned_to)] += 1
+        changesets.append(history.changeset_row(
+            act.id, current_user.username, {'assigned_to': (act.assigned_to, assigned_to)}, now
+        ))
+
+    db.execute(
+        update(models.Activity)
+        .where(models.Activity.id.in_(found_ids))
+        .values(assigned_to=assigned_to, assigned_email=assigned_email, updated_at=now)
+        .execution_options(synchronize_session=False)
+    )
+    new_access = [
+        {'activity_id': act_id, 'user_id': collaborator.id, 'granted_by': current_user.username}
+        for act_id in found_ids if act_id not in with_access
+    ]
+    if new_access:
+        db.execute(insert(models.ActivityAccess), new_access)
+    db.execute(insert(models.ActivityChangeset), changesets)
+    invitations = [
+        {
+            'activity_id': act_id,
+            'invited_email': assigned_email,
+            'token': secrets.token_urlsafe(32),
+            'created_by': current_user.username,
+            'created_at': now,
+            'expires_at': now + datetime.timedelta(days=7),
+        }
+        for act_id in found_ids
+    ]
+    db.execute(insert(models.Invitation), invitations)
+    for key, delta in rollup_deltas.items():
+        if key is not None and delta:
+            rollups.apply_delta(db, key, delta)
+    db.commit()
+
+    try:
+        send_bulk_webhooks(db, current_user.id, 'activities_bulk_assigned', assigned)
+    except Exception as e:
+        logger.error(f"Error enviando webhooks: {str(e)}")
+    tokens = {inv['activity_id']: inv['token'] for inv in invitations}
+    return collaborator, [dict(a, token=tokens[a['id']]) for a in assigned], not_found
+
 def create_admin_user(db: Session, current_user: models.User, payload: schemas.AdminUserCreate):
     if current_user.role != "Admin":
         return None
@@ -560,7 +1002,7 @@ def create_admin_user(db: Session, current_user: models.User, payload: schemas.A
     return user
 
 def get_all_indicators(db: Session):
-    return db.query(models.Indicator).all()
+    return indicator_catalog.all(db)
 
 def get_indicator_by_id(db: Session, indicator_id: int):
-    return db.query(models.Indicator).filter(models.Indicator.id == indicator_id).first()
+    return indicator_catalog.get(db, indicator_id)
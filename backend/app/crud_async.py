@@ -0,0 +1,94 @@
+"""Versiones async de las lecturas más frecuentes de `crud`.
+
+Usan las mismas sentencias que las funciones síncronas (mismo alcance, mismo
+orden, misma caché de dashboard) pero se ejecutan sobre una AsyncSession, para
+que el handler no ocupe un hilo del threadpool mientras espera a la base.
+"""
+import datetime
+
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from . import models
+from .catalog import indicator_catalog
+from .crud import (
+    _accessible_activity_statement,
+    _activities_version_statement,
+    _activity_history_page,
+    _activity_history_statement,
+    _dashboard_cache,
+    _dashboard_cache_key,
+    _dashboard_result,
+    _dashboard_rows_statement,
+    _dashboard_since,
+    _list_activities_page,
+    _list_activities_statements,
+    _search_activities_page,
+    _search_activities_statement,
+    _subtasks_statement,
+)
+
+
+async def get_accessible_activity(db: AsyncSession, activity_id: int, current_user: models.User):
+    cache = db.info.setdefault('activity_access', {})
+    key = (activity_id, current_user.id)
+    if key in cache:
+        return cache[key]
+    act = (await db.execute(_accessible_activity_statement(activity_id, current_user))).scalars().first()
+    cache[key] = act
+    return act
+
+
+async def list_activities(db: AsyncSession, current_user: models.User, status: str = None, assigned_to: str = None, page: int = 1, per_page: int = 10, cursor: str = None, include_total: bool = None):
+    count_stmt, page_stmt = _list_activities_statements(current_user, status, assigned_to, page, per_page, cursor, include_total)
+    total = (await db.execute(count_stmt)).scalar() if count_stmt is not None else None
+    items = (await db.execute(page_stmt)).scalars().all()
+    await indicator_catalog.ensure_async(db, {a.indicator_id for a in items})
+    return _list_activities_page(items, total, page, per_page)
+
+
+async def activities_version(db: AsyncSession, current_user: models.User, status: str = None, assigned_to: str = None):
+    row = (await db.execute(_activities_version_statement(current_user, status, assigned_to))).first()
+    return tuple(row) if row else (None, 0)
+
+
+async def indicators_version(db: AsyncSession) -> str:
+    await indicator_catalog.ensure_async(db)
+    return indicator_catalog.version
+
+
+async def search_activities(db: AsyncSession, current_user: models.User, q: str, page: int = 1, per_page: int = 20):
+    stmt = _search_activities_statement(current_user, q, page, per_page)
+    items = (await db.execute(stmt)).scalars().all() if stmt is not None else []
+    await indicator_catalog.ensure_async(db, {a.indicator_id for a in items})
+    return _search_activities_page(items, page, per_page)
+
+
+async def get_activity_history(db: AsyncSession, activity_id: int, current_user: models.User, field: str = None, page: int = 1, per_page: int = 50, cursor: str = None, since: datetime.datetime = None):
+    if not await get_accessible_activity(db, activity_id, current_user):
+        return None
+    rows = (await db.execute(_activity_history_statement(activity_id, field, page, per_page, cursor, since))).scalars().all()
+    return _activity_history_page(rows, field, page, per_page)
+
+
+async def get_global_history(db: AsyncSession, field: str = None, page: int = 1, per_page: int = 50, cursor: str = None, since: datetime.datetime = None):
+    """Feed de cambios de todas las actividades (solo Admin; lo valida el handler)."""
+    rows = (await db.execute(_activity_history_statement(None, field, page, per_page, cursor, since))).scalars().all()
+    return _activity_history_page(rows, field, page, per_page)
+
+
+async def list_subtasks(db: AsyncSession, activity_id: int, current_user: models.User):
+    if not await get_accessible_activity(db, activity_id, current_user):
+        return None
+    return (await db.execute(_subtasks_statement(activity_id))).scalars().all()
+
+
+async def get_weekly_dashboard(db: AsyncSession, current_user: models.User, days: int = 7, version=None):
+    cache_key = _dashboard_cache_key(current_user, days, version)
+    cached = _dashboard_cache.get(cache_key)
+    if cached is not None:
+        return cached
+    since = _dashboard_since(days)
+    rows = (await db.execute(_dashboard_rows_statement(current_user, since))).all()
+    result = _dashboard_result(rows, days, since)
+    _dashboard_cache.set(cache_key, result)
+    return result
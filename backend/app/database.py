@@ -1,8 +1,13 @@
-from sqlalchemy import create_engine
+from sqlalchemy import create_engine, event
 from sqlalchemy.ext.declarative import declarative_base
 from sqlalchemy.orm import sessionmaker
+from sqlalchemy.ext.asyncio import create_async_engine, async_sessionmaker
+from sqlalchemy.pool import QueuePool, AsyncAdaptedQueuePool
 from dotenv import load_dotenv
+import logging
 import os
+import threading
+import time
 
 load_dotenv()
 
@@ -10,17 +15,172 @@ SQLALCHEMY_DATABASE_URL = os.getenv("DATABASE_URL", "sqlite:///./test.db")
 if SQLALCHEMY_DATABASE_URL.startswith("postgres://"):
     SQLALCHEMY_DATABASE_URL = SQLALCHEMY_DATABASE_URL.replace("postgres://", "postgresql://", 1)
 
-connect_args = {"check_same_thread": False} if SQLALCHEMY_DATABASE_URL.startswith("sqlite") else {}
+IS_SQLITE = SQLALCHEMY_DATABASE_URL.startswith("sqlite")
+IS_SQLITE_MEMORY = IS_SQLITE and (":memory:" in SQLALCHEMY_DATABASE_URL or SQLALCHEMY_DATABASE_URL.rstrip("/") == "sqlite:")
+
+# Pool de conexiones (por worker de uvicorn)
+DB_POOL_SIZE = int(os.getenv("DB_POOL_SIZE", "5"))
+DB_MAX_OVERFLOW = int(os.getenv("DB_MAX_OVERFLOW", "10"))
+DB_POOL_TIMEOUT = float(os.getenv("DB_POOL_TIMEOUT", "30"))
+DB_POOL_RECYCLE = int(os.getenv("DB_POOL_RECYCLE", "1800"))
+DB_POOL_PRE_PING = os.getenv("DB_POOL_PRE_PING", "true").lower() in ("1", "true", "yes")
+# Tiempo máximo por sentencia en Postgres (0 = sin límite)
+DB_STATEMENT_TIMEOUT_MS = int(os.getenv("DB_STATEMENT_TIMEOUT_MS", "30000"))
+
+
+class _PoolWaitMetrics:
+    """Mide cuánto esperan los checkouts del pool (conexión libre o nueva)."""
+
+    def _do_get(self):
+        start = time.perf_counter()
+        try:
+            return super()._do_get()
+        finally:
+            waited = time.perf_counter() - start
+            lock = self.__dict__.setdefault("_wait_lock", threading.Lock())
+            with lock:
+                self._wait_count = getattr(self, "_wait_count", 0) + 1
+                self._wait_total = getattr(self, "_wait_total", 0.0) + waited
+                self._wait_max = max(getattr(self, "_wait_max", 0.0), waited)
+
+    def wait_metrics(self):
+        count = getattr(self, "_wait_count", 0)
+        return {
+            "checkouts": count,
+            "wait_avg_ms": round(getattr(self, "_wait_total", 0.0) / count * 1000, 3) if count else 0.0,
+            "wait_max_ms": round(getattr(self, "_wait_max", 0.0) * 1000, 3),
+        }
+
+
+class MeteredQueuePool(_PoolWaitMetrics, QueuePool):
+    pass
+
+
+class MeteredAsyncAdaptedQueuePool(_PoolWaitMetrics, AsyncAdaptedQueuePool):
+    pass
+
+
+# El logger del pool toma el nombre de la clase (app.database.Metered...), fuera del
+# árbol "sqlalchemy" que SQLAlchemy deja en WARN: sin esto, basicConfig(DEBUG) en
+# main.py registra cada checkout/checkin
+for _pool_class in (MeteredQueuePool, MeteredAsyncAdaptedQueuePool):
+    logging.getLogger(f"{_pool_class.__module__}.{_pool_class.__name__}").setLevel(logging.WARN)
+
+
+def _engine_options(async_driver: bool = False) -> dict:
+    options = {}
+    if IS_SQLITE:
+        connect_args = {} if async_driver else {"check_same_thread": False}
+    elif async_driver:
+        connect_args = {"server_settings": {"statement_timeout": str(DB_STATEMENT_TIMEOUT_MS)}} if DB_STATEMENT_TIMEOUT_MS else {}
+    else:
+        connect_args = {"options": f"-c statement_timeout={DB_STATEMENT_TIMEOUT_MS}"} if DB_STATEMENT_TIMEOUT_MS else {}
+    options["connect_args"] = connect_args
+    if not IS_SQLITE_MEMORY:
+        options.update(
+            poolclass=MeteredAsyncAdaptedQueuePool if async_driver else MeteredQueuePool,
+            pool_size=DB_POOL_SIZE,
+            max_overflow=DB_MAX_OVERFLOW,
+            pool_timeout=DB_POOL_TIMEOUT,
+            pool_recycle=DB_POOL_RECYCLE,
+            pool_pre_ping=DB_POOL_PRE_PING,
+        )
+    return options
+
 
 engine = create_engine(
-    SQLALCHEMY_DATABASE_URL, connect_args=connect_args
+    SQLALCHEMY_DATABASE_URL, **_engine_options()
 )
 SessionLocal = sessionmaker(autocommit=False, autoflush=False, bind=engine)
 Base = declarative_base()
 
+# Modo producción para SQLite: WAL + pragmas y un solo escritor por proceso.
+# Las lecturas siguen en paralelo (WAL no bloquea lectores); las transacciones que
+# escriben se encolan en un lock en vez de chocar con "database is locked".
+SQLITE_PRODUCTION_MODE = IS_SQLITE and not IS_SQLITE_MEMORY and os.getenv("SQLITE_PRODUCTION_MODE", "false").lower() in ("1", "true", "yes")
+SQLITE_BUSY_TIMEOUT_MS = int(os.getenv("SQLITE_BUSY_TIMEOUT_MS", "5000"))
+SQLITE_MMAP_SIZE = int(os.getenv("SQLITE_MMAP_SIZE", str(256 * 1024 * 1024)))
+
+_sqlite_writer_lock = threading.Lock()
+
+
+def _set_sqlite_pragmas(dbapi_connection, connection_record):
+    cursor = dbapi_connection.cursor()
+    cursor.execute("PRAGMA journal_mode=WAL")
+    cursor.execute("PRAGMA synchronous=NORMAL")
+    cursor.execute(f"PRAGMA mmap_size={SQLITE_MMAP_SIZE}")
+    cursor.execute(f"PRAGMA busy_timeout={SQLITE_BUSY_TIMEOUT_MS}")
+    cursor.close()
+
+
+def _acquire_sqlite_writer(session):
+    if session.info.get("sqlite_writer"):
+        return
+    # Si se agota la espera se sigue igual: busy_timeout de SQLite es la red de seguridad
+    acquired = _sqlite_writer_lock.acquire(timeout=SQLITE_BUSY_TIMEOUT_MS / 1000)
+    session.info["sqlite_writer"] = acquired
+
+
+def _sqlite_before_flush(session, flush_context, instances):
+    _acquire_sqlite_writer(session)
+
+
+def _sqlite_orm_execute(orm_execute_state):
+    if orm_execute_state.is_insert or orm_execute_state.is_update or orm_execute_state.is_delete:
+        _acquire_sqlite_writer(orm_execute_state.session)
+
+
+def _sqlite_after_transaction_end(session, transaction):
+    if transaction.parent is None and session.info.pop("sqlite_writer", False):
+        _sqlite_writer_lock.release()
+
+
+if SQLITE_PRODUCTION_MODE:
+    event.listen(engine, "connect", _set_sqlite_pragmas)
+    event.listen(SessionLocal, "before_flush", _sqlite_before_flush)
+    event.listen(SessionLocal, "do_orm_execute", _sqlite_orm_execute)
+    event.listen(SessionLocal, "after_transaction_end", _sqlite_after_transaction_end)
+
+
+def _async_database_url(url: str) -> str:
+    """Misma base con driver async: asyncpg para Postgres, aiosqlite para SQLite."""
+    scheme, rest = url.split("://", 1)
+    backend = scheme.split("+", 1)[0]
+    if backend == "postgresql":
+        # asyncpg no entiende sslmode; usa ssl
+        return "postgresql+asyncpg://" + rest.replace("sslmode=", "ssl=")
+    if backend == "sqlite":
+        return "sqlite+aiosqlite://" + rest
+    return url
+
+ASYNC_DATABASE_URL = os.getenv("ASYNC_DATABASE_URL", _async_database_url(SQLALCHEMY_DATABASE_URL))
+async_engine = create_async_engine(ASYNC_DATABASE_URL, **_engine_options(async_driver=True))
+if SQLITE_PRODUCTION_MODE:
+    event.listen(async_engine.sync_engine, "connect", _set_sqlite_pragmas)
+AsyncSessionLocal = async_sessionmaker(async_engine, autoflush=False, expire_on_commit=False)
+
+def pool_metrics(pool) -> dict:
+    """Estado de un pool para /api/health."""
+    metrics = {"class": type(pool).__name__}
+    if isinstance(pool, QueuePool):
+        metrics.update(
+            size=pool.size(),
+            checked_out=pool.checkedout(),
+            checked_in=pool.checkedin(),
+            overflow=max(pool.overflow(), 0),
+            max_overflow=pool._max_overflow,
+        )
+    if isinstance(pool, _PoolWaitMetrics):
+        metrics.update(pool.wait_metrics())
+    return metrics
+
 def get_db():
     db = SessionLocal()
     try:
         yield db
     finally:
-        db.close()
\ No newline at end of file
+        db.close()
+
+async def get_async_db():
+    async with AsyncSessionLocal() as db:
+        yield db
@@ -0,0 +1,138 @@
+"""Worker del outbox de correos.
+
+Toma lotes de `email_outbox` pendientes (reclamándolos con un UPDATE atómico
+para que dos workers no envíen la misma fila), los envía con el transporte configurado
+en `email_service` (un solo cliente de Gmail reutilizado) y marca cada fila como
+enviada o la reprograma con backoff hasta agotar los intentos.
+"""
+import datetime
+import os
+import threading
+
+from sqlalchemy import update
+
+from . import models
+from .database import SessionLocal
+from .email_service import build_message, get_transport
+from .logging_config import logger
+
+EMAIL_BATCH_SIZE = int(os.getenv("EMAIL_BATCH_SIZE", "20"))
+EMAIL_POLL_SECONDS = float(os.getenv("EMAIL_POLL_SECONDS", "10"))
+EMAIL_MAX_ATTEMPTS = int(os.getenv("EMAIL_MAX_ATTEMPTS", "5"))
+EMAIL_RETRY_BASE_SECONDS = int(os.getenv("EMAIL_RETRY_BASE_SECONDS", "30"))
+# Cuánto dura la toma de un lote; pasado ese tiempo otro worker puede reenviarlo
+EMAIL_SENDING_TIMEOUT_SECONDS = int(os.getenv("EMAIL_SENDING_TIMEOUT_SECONDS", "600"))
+
+
+def _due_filter(now):
+    # "sending" vencido: el worker que lo tomó murió antes de terminar; se puede volver a tomar
+    return (
+        models.EmailOutbox.status.in_(("pending", "sending")),
+        models.EmailOutbox.next_attempt_at <= now,
+    )
+
+
+def claim_outbox_batch(db, batch_size: int = EMAIL_BATCH_SIZE) -> list:
+    """Marca como "sending" un lote vencido y devuelve solo las filas que tomó este worker.
+
+    El UPDATE vuelve a evaluar el estado, así que si otro worker tomó una fila entre
+    el SELECT y el UPDATE no se devuelve (SELECT ... FOR UPDATE no bloquea en SQLite).
+    La fila queda tomada hasta `next_attempt_at`; si el worker cae, otro la retoma.
+    """
+    now = datetime.datetime.utcnow()
+    candidates = [row[0] for row in db.query(models.EmailOutbox.id).filter(
+        *_due_filter(now)
+    ).order_by(models.EmailOutbox.id).limit(batch_size).all()]
+    if not candidates:
+        db.commit()
+        return []
+    claimed = db.execute(
+        update(models.EmailOutbox)
+        .where(models.EmailOutbox.id.in_(candidates), *_due_filter(now))
+        .values(status="sending", next_attempt_at=now + datetime.timedelta(seconds=EMAIL_SENDING_TIMEOUT_SECONDS))
+        .returning(models.EmailOutbox.id)
+        .execution_options(synchronize_session=False)
+    ).scalars().all()
+    db.commit()
+    if not claimed:
+        return []
+    return db.query(models.EmailOutbox).filter(
+        models.EmailOutbox.id.in_(claimed)
+    ).order_by(models.EmailOutbox.id).all()
+
+
+def process_outbox_batch(db, batch_size: int = EMAIL_BATCH_SIZE) -> int:
+    """Envía un lote de correos pendientes. Devuelve cuántos se procesaron."""
+    entries = claim_outbox_batch(db, batch_size)
+    if not entries:
+        return 0
+
+    messages = []
+    for entry in entries:
+        messages.append(build_message(entry.to_email, entry.subject, entry.html_content, entry.attachments))
+    errors = get_transport().send_batch(messages)
+    now = datetime.datetime.utcnow()
+
+    for entry, error in zip(entries, errors):
+        entry.attempts = (entry.attempts or 0) + 1
+        if error is None:
+            entry.status = "sent"
+            entry.sent_at = now
+            entry.last_error = None
+            logger.info(f"Email enviado correctamente a {entry.to_email}")
+        else:
+            entry.last_error = error
+            if entry.attempts >= EMAIL_MAX_ATTEMPTS:
+                entry.status = "failed"
+                logger.error(f"Error al enviar email a {entry.to_email}, sin más reintentos: {error}")
+            else:
+                delay = EMAIL_RETRY_BASE_SECONDS * 2 ** (entry.attempts - 1)
+                entry.status = "pending"
+                entry.next_attempt_at = now + datetime.timedelta(seconds=delay)
+                logger.warning(f"Error al enviar email a {entry.to_email}, reintento en {delay}s: {error}")
+    db.commit()
+    return len(entries)
+
+
+class OutboxWorker:
+    def __init__(self, poll_seconds: float = EMAIL_POLL_SECONDS, batch_size: int = EMAIL_BATCH_SIZE):
+        self.poll_seconds = poll_seconds
+        self.batch_size = batch_size
+        self._wake = threading.Event()
+        self._stop = threading.Event()
+        self._thread = None
+
+    def start(self):
+        if self._thread and self._thread.is_alive():
+            return
+        self._stop.clear()
+        self._thread = threading.Thread(target=self._run, name="email-outbox", daemon=True)
+        self._thread.start()
+
+    def wake(self):
+        self._wake.set()
+
+    def stop(self, timeout: float = None):
+        self._stop.set()
+        self._wake.set()
+        if self._thread:
+            self._thread.join(timeout)
+
+    def _run(self):
+        while not self._stop.is_set():
+            self._wake.clear()
+            processed = 0
+            db = SessionLocal()
+            try:
+                processed = process_outbox_batch(db, self.batch_size)
+            except Exception as e:
+                db.rollback()
+                logger.error(f"Error procesando el outbox de correos: {e}", exc_info=True)
+            finally:
+                db.close()
+            # Si el lote salió lleno puede haber más pendientes: seguir sin esperar
+            if processed < self.batch_size:
+                self._wake.wait(self.poll_seconds)
+
+
+outbox_worker = OutboxWorker()
@@ -1,11 +1,14 @@
 import os
 import base64
+from html import escape
+import mimetypes
+import threading
+from email.mime.application import MIMEApplication
 from email.mime.multipart import MIMEMultipart
 from email.mime.text import MIMEText
 from dotenv import load_dotenv
-from google.oauth2.credentials import Credentials
-from googleapiclient.discovery import build
-from googleapiclient.errors import HttpError
+from sqlalchemy.orm import Session
+from . import models
 from .logging_config import logger
 
 load_dotenv()
@@ -15,45 +18,145 @@ GMAIL_CLIENT_SECRET = os.getenv("GMAIL_CLIENT_SECRET")
 GMAIL_REFRESH_TOKEN = os.getenv("GMAIL_REFRESH_TOKEN")
 GMAIL_USER = os.getenv("GMAIL_USER")
 FRONTEND_URL = os.getenv("FRONTEND_URL", "http://localhost:5173")
+# Tope de adjuntos por correo (Gmail rechaza mensajes de más de 25 MB ya codificados)
+EMAIL_MAX_ATTACHMENT_BYTES = int(os.getenv("EMAIL_MAX_ATTACHMENT_BYTES", str(18 * 1024 * 1024)))
 
 
-def _get_gmail_service():
-    creds = Credentials(
-        token=None,
-        refresh_token=GMAIL_REFRESH_TOKEN,
-        token_uri="https://oauth2.googleapis.com/token",
-        client_id=GMAIL_CLIENT_ID,
-        client_secret=GMAIL_CLIENT_SECRET,
-        scopes=["https://www.googleapis.com/auth/gmail.send"]
+def gmail_configured() -> bool:
+    return all([GMAIL_CLIENT_ID, GMAIL_CLIENT_SECRET, GMAIL_REFRESH_TOKEN, GMAIL_USER])
+
+
+def build_message(to_email: str, subject: str, html_content: str, attachments: list = None) -> MIMEMultipart:
+    msg = MIMEMultipart("mixed")
+    msg["Subject"] = subject
+    msg["From"] = f"Sistema de Actividades <{GMAIL_USER}>"
+    msg["To"] = to_email
+    msg.attach(MIMEText(html_content, "html"))
+    budget = EMAIL_MAX_ATTACHMENT_BYTES
+    for attachment in attachments or []:
+        # Ruta, o [ruta, nombre] para archivos guardados por contenido (el nombre en disco es el hash)
+        path, name = (attachment, os.path.basename(attachment)) if isinstance(attachment, str) else attachment
+        if not os.path.exists(path):
+            logger.warning(f"Adjunto no encontrado, se omite: {path}")
+            continue
+        size = os.path.getsize(path)
+        if size > budget:
+            logger.warning(f"Adjunto {name} ({size} bytes) supera el tope del correo a {to_email}, se omite")
+            continue
+        budget -= size
+        with open(path, "rb") as f:
+            part = MIMEApplication(f.read(), Name=name)
+        ctype = mimetypes.guess_type(name)[0]
+        if ctype:
+            part.set_type(ctype)
+        part["Content-Disposition"] = f'attachment; filename="{name}"'
+        msg.attach(part)
+    return msg
+
+
+class GmailTransport:
+    """Envía correos por la API de Gmail reutilizando un único cliente.
+
+    El cliente (credenciales + documento de discovery) se construye una vez;
+    google-auth renueva el access token cuando expira. Los lotes se envían con
+    una sola petición batch HTTP.
+    """
+
+    def __init__(self):
+        self._service = None
+        self._lock = threading.Lock()
+
+    def _get_service(self):
+        with self._lock:
+            if self._service is None:
+                from google.oauth2.credentials import Credentials
+                from googleapiclient.discovery import build
+                creds = Credentials(
+                    token=None,
+                    refresh_token=GMAIL_REFRESH_TOKEN,
+                    token_uri="https://oauth2.googleapis.com/token",
+                    client_id=GMAIL_CLIENT_ID,
+                    client_secret=GMAIL_CLIENT_SECRET,
+                    scopes=["https://www.googleapis.com/auth/gmail.send"]
+                )
+                self._service = build("gmail", "v1", credentials=creds, cache_discovery=False)
+            return self._service
+
+    def send_batch(self, messages: list) -> list:
+        """Envía mensajes MIME; devuelve por cada uno None si salió o el error."""
+        if not gmail_configured():
+            return ["Gmail API no configurada"] * len(messages)
+        service = self._get_service()
+        errors = [None] * len(messages)
+
+        def _callback(request_id, response, exception):
+            if exception is not None:
+                errors[int(request_id)] = str(exception)
+
+        batch = service.new_batch_http_request(callback=_callback)
+        for i, msg in enumerate(messages):
+            raw = base64.urlsafe_b64encode(msg.as_bytes()).decode()
+            batch.add(service.users().messages().send(userId="me", body={"raw": raw}), request_id=str(i))
+        try:
+            batch.execute()
+        except Exception as e:
+            # Un fallo de la petición batch completa (p. ej. refresh del token) invalida el cliente
+            with self._lock:
+                self._service = None
+            return [str(e)] * len(messages)
+        return errors
+
+
+class MemoryTransport:
+    """Transporte en memoria para desarrollo local y pruebas (EMAIL_TRANSPORT=memory)."""
+
+    def __init__(self):
+        self.sent = []
+
+    def send_batch(self, messages: list) -> list:
+        self.sent.extend(messages)
+        return [None] * len(messages)
+
+
+_transport = MemoryTransport() if os.getenv("EMAIL_TRANSPORT") == "memory" else GmailTransport()
+
+
+def get_transport():
+    return _transport
+
+
+def set_transport(transport):
+    """Reemplaza el transporte (p. ej. por un fake en pruebas)."""
+    global _transport
+    _transport = transport
+
+
+def enqueue_email(db: Session, to_email: str, subject: str, html_content: str, attachments: list = None, commit: bool = True) -> models.EmailOutbox:
+    """Guarda el correo en el outbox; el worker lo envía en segundo plano.
+
+    Con `commit=False` solo se agrega a la sesión, para encolar varios correos
+    en una misma transacción; quien llama hace el commit y `wake_outbox()`.
+    """
+    entry = models.EmailOutbox(
+        to_email=to_email,
+        subject=subject,
+        html_content=html_content,
+        attachments=attachments or []
     )
-    return build("gmail", "v1", credentials=creds)
-
-
-def _send_email(to_email: str, subject: str, html_content: str) -> bool:
-    if not all([GMAIL_CLIENT_ID, GMAIL_CLIENT_SECRET, GMAIL_REFRESH_TOKEN, GMAIL_USER]):
-        logger.warning("Gmail API no configurada. Faltan variables de entorno.")
-        return False
-    try:
-        service = _get_gmail_service()
-        msg = MIMEMultipart("alternative")
-        msg["Subject"] = subject
-        msg["From"] = f"Sistema de Actividades <{GMAIL_USER}>"
-        msg["To"] = to_email
-        msg.attach(MIMEText(html_content, "html"))
-
-        raw = base64.urlsafe_b64encode(msg.as_bytes()).decode()
-        service.users().messages().send(userId="me", body={"raw": raw}).execute()
-        logger.info(f"Email enviado correctamente a {to_email}")
-        return True
-    except HttpError as e:
-        logger.error(f"Error HTTP al enviar email a {to_email}: {e}", exc_info=True)
-        return False
-    except Exception as e:
-        logger.error(f"Error al enviar email a {to_email}: {e}", exc_info=True)
-        return False
-
-
-def send_invitation_email(to_email: str, activity_title: str, invitation_token: str, inviter_name: str):
+    db.add(entry)
+    if commit:
+        db.commit()
+        db.refresh(entry)
+        wake_outbox()
+    return entry
+
+
+def wake_outbox():
+    from .email_outbox import outbox_worker
+    outbox_worker.wake()
+
+
+def send_invitation_email(db: Session, to_email: str, activity_title: str, invitation_token: str, inviter_name: str):
     acceptance_link = f"{FRONTEND_URL}?token={invitation_token}"
     html = f"""
 <html>
@@ -79,13 +182,12 @@ def send_invitation_email(to_email: str, activity_title: str, invitation_token:
   </body>
 </html>
 """
-    result = _send_email(to_email, f"Invitacion a colaborar: {activity_title}", html)
-    if not result:
+    if not gmail_configured():
         logger.info(f"FALLBACK TOKEN para {to_email}: {invitation_token}")
-    return result
+    return enqueue_email(db, to_email, f"Invitacion a colaborar: {activity_title}", html)
 
 
-def send_assignment_notification_email(to_email: str, activity_title: str, activity_description: str, assigner_name: str):
+def send_assignment_notification_email(db: Session, to_email: str, activity_title: str, activity_description: str, assigner_name: str):
     html = f"""
 <html>
   <head><meta charset="UTF-8"></head>
@@ -104,10 +206,43 @@ def send_assignment_notification_email(to_email: str, activity_title: str, activ
   </body>
 </html>
 """
-    return _send_email(to_email, f"Nueva actividad asignada: {activity_title}", html)
+    return enqueue_email(db, to_email, f"Nueva actividad asignada: {activity_title}", html)
+
 
+def send_bulk_assignment_email(db: Session, to_email: str, activities: list, assigner_name: str):
+    """Un solo correo con todas las actividades asignadas en lote.
 
-def send_deadline_email(to_email: str, activity_title: str, due_date: str, owner_name: str, attachments: list = None):
+    `activities` es una lista de tuplas (titulo, token_invitacion).
+    """
+    rows = "".join(
+        f'<li style="margin-bottom: 8px;"><strong>{title}</strong> &mdash; '
+        f'<a href="{FRONTEND_URL}?token={token}" style="color: #27ae60;">Aceptar invitacion</a></li>'
+        for title, token in activities
+    )
+    html = f"""
+<html>
+  <head><meta charset="UTF-8"></head>
+  <body style="font-family: Arial, sans-serif; line-height: 1.6; color: #333;">
+    <div style="max-width: 600px; margin: 0 auto; padding: 20px; border: 1px solid #ddd; border-radius: 8px;">
+      <h2 style="color: #2c3e50;">Nuevas actividades asignadas</h2>
+      <p><strong>{assigner_name}</strong> te ha asignado {len(activities)} actividades:</p>
+      <ul>{rows}</ul>
+      <div style="text-align: center; margin: 30px 0;">
+        <a href="{FRONTEND_URL}" style="background-color: #27ae60; color: white; padding: 12px 30px; text-decoration: none; border-radius: 5px; display: inline-block; font-weight: bold;">Ir a la Plataforma</a>
+      </div>
+      <p style="color: #7f8c8d; font-size: 0.9em;">Los enlaces de invitacion expiran en 7 dias.</p>
+    </div>
+  </body>
+</html>
+"""
+    if len(activities) == 1:
+        subject = f"Nueva actividad asignada: {activities[0][0]}"
+    else:
+        subject = f"{len(activities)} actividades asignadas"
+    return enqueue_email(db, to_email, subject, html)
+
+
+def send_deadline_email(db: Session, to_email: str, activity_title: str, due_date: str, owner_name: str, attachments: list = None):
     html = f"""
 <html>
   <head><meta charset="UTF-8"></head>
@@ -124,4 +259,43 @@ def send_deadline_email(to_email: str, activity_title: str, due_date: str, owner
   </body>
 </html>
 """
-    return _send_email(to_email, f"Recordatorio: actividad proxima a vencer - {activity_title}", html)
\ No newline at end of file
+    return enqueue_email(db, to_email, f"Recordatorio: actividad proxima a vencer - {activity_title}", html, attachments)
+
+
+def _file_list(names: list) -> str:
+    if not names:
+        return ""
+    items = "".join(f'<li>{escape(name)}</li>' for name in names)
+    return f'<ul style="font-size: 13px;">{items}</ul>'
+
+
+def send_deadline_digest_email(db: Session, to_email: str, activities: list, owner_name: str, commit: bool = True):
+    """Un solo recordatorio con todas las actividades próximas a vencer de un destinatario.
+
+    `activities` es una lista de tuplas (titulo, fecha_limite, archivos). Los archivos
+    solo se nombran: se descargan desde la aplicación, que verifica el acceso.
+    """
+    rows = "".join(
+        f'<li><strong>{title}</strong> &mdash; Fecha limite: <strong>{due_date}</strong>{_file_list(files)}</li>'
+        for title, due_date, files in activities
+    )
+    html = f"""
+<html>
+  <head><meta charset="UTF-8"></head>
+  <body style="font-family: Arial, sans-serif; color: #333;">
+    <div style="max-width: 600px; margin: 0 auto; padding: 20px; border: 1px solid #ddd; border-radius: 8px;">
+      <h3>Recordatorio: actividades proximas a vencer</h3>
+      <ul>{rows}</ul>
+      <p>Asignadas por: {owner_name}</p>
+      <div style="text-align: center; margin: 20px 0;">
+        <a href="{FRONTEND_URL}" style="background:#27ae60; color:#fff; padding:10px 18px; text-decoration:none; border-radius:4px;">Abrir aplicacion</a>
+      </div>
+    </div>
+  </body>
+</html>
+"""
+    if len(activities) == 1:
+        subject = f"Recordatorio: actividad proxima a vencer - {activities[0][0]}"
+    else:
+        subject = f"Recordatorio: {len(activities)} actividades proximas a vencer"
+    return enqueue_email(db, to_email, subject, html, commit=commit)
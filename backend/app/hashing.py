@@ -0,0 +1,97 @@
+"""Servicio de hashing de contraseñas.
+
+El trabajo del KDF (pbkdf2_sha256) corre en un pool de procesos acotado para no
+ocupar los hilos de las requests. El costo se configura con PASSWORD_HASH_ROUNDS;
+los hashes con otro costo o con bcrypt (usado antes por manage_users.py) se
+verifican igual y se reemplazan en el siguiente login.
+"""
+import multiprocessing
+import os
+import threading
+from concurrent.futures import ProcessPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+
+from passlib.context import CryptContext
+
+PASSWORD_HASH_ROUNDS = int(os.getenv("PASSWORD_HASH_ROUNDS", "29000"))
+# 0 = calcular en el mismo proceso (scripts, pruebas)
+PASSWORD_HASH_WORKERS = int(os.getenv("PASSWORD_HASH_WORKERS", str(min(4, os.cpu_count() or 1))))
+
+pwd_context = CryptContext(
+    schemes=["pbkdf2_sha256"],
+    pbkdf2_sha256__default_rounds=PASSWORD_HASH_ROUNDS,
+    pbkdf2_sha256__min_rounds=PASSWORD_HASH_ROUNDS,
+    pbkdf2_sha256__max_rounds=PASSWORD_HASH_ROUNDS,
+)
+
+_pool = None
+_pool_lock = threading.Lock()
+
+
+def hash_password_inline(password: str) -> str:
+    return pwd_context.hash(password)
+
+
+_BCRYPT_PREFIXES = ("$2a$", "$2b$", "$2y$")
+
+
+def verify_and_update_inline(password: str, hashed: str):
+    """Devuelve (valida, nuevo_hash); nuevo_hash es None si no hace falta rehash."""
+    if hashed.startswith(_BCRYPT_PREFIXES):
+        # Hashes antiguos de manage_users.py: se verifican con bcrypt directamente
+        # (passlib 1.7 no carga bcrypt>=4.1) y se migran a pbkdf2_sha256
+        import bcrypt
+        if bcrypt.checkpw(password.encode("utf-8")[:72], hashed.encode("utf-8")):
+            return True, hash_password_inline(password)
+        return False, None
+    try:
+        return pwd_context.verify_and_update(password, hashed)
+    except ValueError:
+        # Hash con formato desconocido
+        return False, None
+
+
+def _get_pool():
+    global _pool
+    with _pool_lock:
+        if _pool is None:
+            _pool = ProcessPoolExecutor(
+                max_workers=PASSWORD_HASH_WORKERS,
+                mp_context=multiprocessing.get_context("spawn")
+            )
+        return _pool
+
+
+def _run(fn, *args):
+    if PASSWORD_HASH_WORKERS <= 0:
+        return fn(*args)
+    pool = _get_pool()
+    try:
+        return pool.submit(fn, *args).result()
+    except BrokenProcessPool:
+        # Un worker murió: se descarta el pool para que la próxima llamada lo recree
+        global _pool
+        with _pool_lock:
+            if _pool is pool:
+                _pool = None
+        raise
+
+
+def hash_password(password: str) -> str:
+    return _run(hash_password_inline, password)
+
+
+def verify_and_update(password: str, hashed: str):
+    return _run(verify_and_update_inline, password, hashed)
+
+
+def verify_password(password: str, hashed: str) -> bool:
+    return verify_and_update(password, hashed)[0]
+
+
+def shutdown():
+    global _pool
+    with _pool_lock:
+        if _pool is not None:
+            _pool.shutdown(wait=True)
+            _pool = None
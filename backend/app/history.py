@@ -0,0 +1,124 @@
+"""Historial de cambios compacto (`activity_changesets`).
+
+Cada update guarda una sola fila con {campo: [anterior, nuevo]} y la lista de
+campos en `fields` ("|status|due_date|") para seguir filtrando por campo. Aquí
+también están la compactación del formato anterior (`activity_history`, una
+fila por campo) y la retención de cambios antiguos.
+"""
+import datetime
+import os
+from typing import Optional
+
+from sqlalchemy import delete, insert, select
+from sqlalchemy.orm import Session
+
+from . import models
+
+# Días que se conserva el historial (0 = siempre)
+HISTORY_RETENTION_DAYS = int(os.getenv("HISTORY_RETENTION_DAYS", "0"))
+HISTORY_COMPACT_BATCH_SIZE = int(os.getenv("HISTORY_COMPACT_BATCH_SIZE", "1000"))
+
+
+def history_value(value):
+    if value is None:
+        return None
+    if isinstance(value, datetime.datetime):
+        return value.isoformat()
+    return str(value)
+
+
+def field_pattern(field: str) -> str:
+    return f"%|{field}|%"
+
+
+def changeset_row(activity_id: int, username: str, changes: dict, timestamp: datetime.datetime) -> dict:
+    """Fila para insertar; `changes` es {campo: (anterior, nuevo)}."""
+    return {
+        "activity_id": activity_id,
+        "changed_by": username,
+        "fields": "|" + "|".join(changes) + "|",
+        "changes": {
+            field: [history_value(old_value), history_value(new_value)]
+            for field, (old_value, new_value) in changes.items()
+        },
+        "timestamp": timestamp,
+    }
+
+
+def changeset_out(changeset: models.ActivityChangeset, field: Optional[str] = None) -> dict:
+    return {
+        "id": changeset.id,
+        "activity_id": changeset.activity_id,
+        "changed_by": changeset.changed_by,
+        "timestamp": changeset.timestamp,
+        "changes": [
+            {"field": name, "old_value": old_value, "new_value": new_value}
+            for name, (old_value, new_value) in changeset.changes.items()
+            if field is None or name == field
+        ],
+    }
+
+
+# Filas antiguas sin fecha: quedan al final del historial (el cursor necesita un timestamp)
+LEGACY_MISSING_TIMESTAMP = datetime.datetime(1970, 1, 1)
+
+
+def _group_legacy_rows(rows) -> list:
+    grouped = {}
+    for row in sorted(rows, key=lambda r: (r.activity_id, r.timestamp or LEGACY_MISSING_TIMESTAMP, r.id)):
+        timestamp = row.timestamp or LEGACY_MISSING_TIMESTAMP
+        key = (row.activity_id, row.changed_by, timestamp)
+        current = grouped.setdefault(key, {
+            "activity_id": row.activity_id, "changed_by": row.changed_by,
+            "fields": "|", "changes": {}, "timestamp": timestamp,
+        })
+        current["changes"][row.changed_field] = [row.old_value, row.new_value]
+        current["fields"] += f"{row.changed_field}|"
+    return list(grouped.values())
+
+
+def compact_legacy_history(db: Session, batch_size: Optional[int] = None) -> int:
+    """Convierte las filas por campo de `activity_history` en changesets y las borra.
+
+    Agrupa por (actividad, usuario, instante), que es como las escribía un mismo
+    update. Avanza por lotes de actividades, cada uno en su transacción; las filas
+    se toman con DELETE ... RETURNING, así dos workers arrancando a la vez no
+    duplican changesets. Devuelve el número de changesets creados.
+    """
+    batch_size = batch_size or HISTORY_COMPACT_BATCH_SIZE
+    legacy = models.ActivityHistory
+    created = 0
+    # Filas huérfanas (sin actividad) no se pueden agrupar
+    db.execute(delete(legacy).where(legacy.activity_id.is_(None)))
+    db.commit()
+    while True:
+        activity_ids = db.execute(
+            select(legacy.activity_id).distinct().order_by(legacy.activity_id).limit(batch_size)
+        ).scalars().all()
+        if not activity_ids:
+            break
+        rows = db.execute(
+            delete(legacy).where(legacy.activity_id.in_(activity_ids)).returning(
+                legacy.id, legacy.activity_id, legacy.changed_by, legacy.changed_field,
+                legacy.old_value, legacy.new_value, legacy.timestamp
+            )
+        ).all()
+        changesets = _group_legacy_rows(rows)
+        if changesets:
+            db.execute(insert(models.ActivityChangeset), changesets)
+        db.commit()
+        created += len(changesets)
+    return created
+
+
+def purge_history(db: Session, retention_days: Optional[int] = None) -> int:
+    """Borra los changesets más antiguos que la retención. Devuelve cuántos borró."""
+    retention_days = HISTORY_RETENTION_DAYS if retention_days is None else retention_days
+    if retention_days <= 0:
+        return 0
+    cutoff = datetime.datetime.utcnow() - datetime.timedelta(days=retention_days)
+    result = db.execute(
+        delete(models.ActivityChangeset).where(models.ActivityChangeset.timestamp < cutoff)
+    )
+    db.commit()
+    return result.rowcount
@@ -1,19 +1,37 @@
-from fastapi import FastAPI, Depends, HTTPException, UploadFile, File
+from fastapi import FastAPI, Depends, HTTPException, UploadFile, File, BackgroundTasks, Request, Response
 from fastapi.security import OAuth2PasswordRequestForm
 from fastapi.middleware.cors import CORSMiddleware
-from fastapi.responses import StreamingResponse, FileResponse
+from fastapi.responses import StreamingResponse
+from fastapi.concurrency import run_in_threadpool
 from sqlalchemy.orm import Session
+from sqlalchemy.ext.asyncio import AsyncSession
 from sqlalchemy import text
 from typing import Optional
-from . import models, schemas, crud, auth
-from .database import engine, Base, get_db, SessionLocal
-from .email_service import send_invitation_email, send_deadline_email, send_assignment_notification_email
+from . import models, schemas, crud, crud_async, auth, hashing
+from .database import engine, async_engine, Base, get_db, get_async_db, SessionLocal, pool_metrics
+from .webhooks import dispatcher as webhook_dispatcher
+from .email_service import send_invitation_email, send_deadline_email, send_assignment_notification_email, send_bulk_assignment_email
+from .email_outbox import outbox_worker
+from .reminders import run_reminder_job
+from .rollups import rebuild_rollups
+from .history import compact_legacy_history
+from .search import ensure_search_index
+from .catalog import ensure_cache_triggers
+from .activity_import import import_activities
+from . import uploads
+from .storage import (
+    BASE_DIR, UPLOADS_DIR, STORAGE_CHUNK_SIZE, DOWNLOAD_ACCEL_REDIRECT, AttachmentResponse, save_upload, release_object,
+    open_chunk_part, discard_chunk_part,
+    file_etag, accel_redirect_path, create_download_token, read_download_token
+)
 import csv
 import io
 import os
-from pathlib import Path
+from urllib.parse import quote
 import sqlalchemy
-from datetime import datetime
+from datetime import datetime, timezone
+from email.utils import format_datetime
+import hashlib
 import logging
 
 # Configure logging
@@ -28,6 +46,50 @@ except Exception as e:
 
 app = FastAPI(title="Seguimiento de Actividades - Prototipo")
 
+@app.on_event("startup")
+def start_background_workers():
+    outbox_worker.start()
+
+@app.on_event("startup")
+def ensure_activity_rollups():
+    # Primer arranque con la tabla de rollups vacía: poblarla desde las actividades existentes
+    db = SessionLocal()
+    try:
+        if db.query(models.ActivityRollup.id).first() is None and db.query(models.Activity.id).first() is not None:
+            groups = rebuild_rollups(db)
+            logger.info(f"Activity rollups rebuilt: {groups} groups")
+    except Exception as e:
+        logger.error(f"Error rebuilding activity rollups: {e}")
+    finally:
+        db.close()
+
+@app.on_event("startup")
+def ensure_activity_search_index():
+    ensure_search_index()
+
+@app.on_event("startup")
+def ensure_indicator_cache_triggers():
+    ensure_cache_triggers()
+
+@app.on_event("startup")
+def compact_activity_history():
+    # Historial en el formato anterior (una fila por campo): pasarlo a changesets una vez
+    db = SessionLocal()
+    try:
+        if db.query(models.ActivityHistory.id).first() is not None:
+            created = compact_legacy_history(db)
+            logger.info(f"Activity history compacted: {created} changesets")
+    except Exception as e:
+        logger.error(f"Error compacting activity history: {e}")
+    finally:
+        db.close()
+
+@app.on_event("shutdown")
+def stop_background_workers():
+    webhook_dispatcher.stop(timeout=30)
+    outbox_worker.stop(timeout=30)
+    hashing.shutdown()
+
 # Permitir CORS desde el frontend (ajustar orígenes en producción)
 origins = [
     "http://127.0.0.1:5173",
@@ -42,9 +104,33 @@ app.add_middleware(
     allow_credentials=True,
     allow_methods=["*"],
     allow_headers=["*"],
+    expose_headers=["ETag", "Last-Modified"],
     max_age=3600,
 )
 
+def _etag(*parts) -> str:
+    return 'W/"' + hashlib.sha1(repr(parts).encode()).hexdigest() + '"'
+
+def _not_modified(request: Request, response: Response, etag: str, last_modified: datetime = None):
+    """Pone ETag / Last-Modified en la respuesta; devuelve un 304 si el cliente ya tiene esa versión.
+
+    Solo se valida con If-None-Match: la fecha sola no detecta borrados.
+    """
+    headers = {'ETag': etag, 'Cache-Control': 'private, no-cache', 'Vary': 'Authorization'}
+    if last_modified is not None:
+        headers['Last-Modified'] = format_datetime(last_modified.replace(tzinfo=timezone.utc), usegmt=True)
+    if _etag_matches(request, etag):
+        return Response(status_code=304, headers=headers)
+    response.headers.update(headers)
+    return None
+
+def _etag_matches(request: Request, etag: str) -> bool:
+    if_none_match = request.headers.get('if-none-match')
+    if not if_none_match:
+        return False
+    candidates = {tag.strip().removeprefix('W/') for tag in if_none_match.split(',')}
+    return '*' in candidates or etag.removeprefix('W/') in candidates
+
 # Health check endpoint (antes de autenticación)
 @app.get('/health')
 def health_check():
@@ -52,14 +138,14 @@ def health_check():
 
 @app.get('/api/health')
 def health_check_detailed():
+    pools = {"sync": pool_metrics(engine.pool), "async": pool_metrics(async_engine.pool)}
     try:
-        db = SessionLocal()
-        db.execute(text("SELECT 1"))
-        db.close()
-        return {"status": "ok", "database": "connected"}
+        with engine.connect() as conn:
+            conn.execute(text("SELECT 1"))
+        return {"status": "ok", "database": "connected", "pool": pools}
     except Exception as e:
         logger.error(f"Health check failed: {e}")
-        return {"status": "error", "database": str(e)}
+        return {"status": "error", "database": str(e), "pool": pools}
 
 @app.post('/register', response_model=schemas.UserOut)
 def register(user: schemas.UserCreate, db: Session = Depends(get_db)):
@@ -88,6 +174,7 @@ def login_for_access_token(form_data: OAuth2PasswordRequestForm = Depends(), db:
             raise HTTPException(status_code=400, detail='Incorrect username or password')
         user.last_login = datetime.utcnow()
         db.commit()
+        auth.invalidate_cached_user(user.username)
         access_token = auth.create_access_token(data={"sub": user.username})
         logger.info(f"Login successful for {user.username}")
         return {"access_token": access_token, "token_type": "bearer"}
@@ -98,82 +185,139 @@ def login_for_access_token(form_data: OAuth2PasswordRequestForm = Depends(), db:
         raise HTTPException(status_code=500, detail=f"Server error: {str(e)}")
 
 @app.get('/indicators', response_model=list[schemas.IndicatorOut])
-def get_indicators(current_user: models.User = Depends(auth.get_current_user), db: Session = Depends(get_db)):
+def get_indicators(request: Request, response: Response, current_user: models.User = Depends(auth.get_current_user), db: Session = Depends(get_db)):
     """Get all available indicators"""
+    not_modified = _not_modified(request, response, _etag('indicators', crud.indicators_version(db)))
+    if not_modified:
+        return not_modified
     return crud.get_all_indicators(db)
 
-@app.post('/activities')
-def create_activity(activity: schemas.ActivityCreate, current_user: models.User = Depends(auth.get_current_user), db: Session = Depends(get_db)):
-    db_act = crud.create_activity(db, owner_id=current_user.id, activity=activity)
-    # Return a simple JSON representation to avoid response-model serialization issues
-    indicator_data = None
-    if db_act.indicator:
-        indicator_data = {
-            'id': db_act.indicator.id,
-            'name': db_act.indicator.name,
-            'description': db_act.indicator.description,
-            'created_at': db_act.indicator.created_at.isoformat() if db_act.indicator.created_at else None
-        }
+def _activity_payload(db: Session, act: models.Activity) -> dict:
+    """JSON simple de la actividad (sin subtareas ni archivos) para evitar problemas de serialización.
+
+    El indicador sale del catálogo en memoria, sin cargar la relación.
+    """
     return {
-        'id': db_act.id,
-        'title': db_act.title,
-        'description': db_act.description,
-        'injected_by': db_act.injected_by,
-        'status': db_act.status,
-        'assigned_to': db_act.assigned_to,
-        'assigned_email': db_act.assigned_email,
-        'due_date': db_act.due_date.isoformat() if db_act.due_date else None,
-        'timestamp': db_act.timestamp.isoformat() if db_act.timestamp else None,
-        'updated_at': db_act.updated_at.isoformat() if db_act.updated_at else None,
-        'owner_id': db_act.owner_id,
-        'indicator_id': db_act.indicator_id,
-        'indicator': indicator_data,
+        'id': act.id,
+        'title': act.title,
+        'description': act.description,
+        'injected_by': act.injected_by,
+        'status': act.status,
+        'assigned_to': act.assigned_to,
+        'assigned_email': act.assigned_email,
+        'due_date': act.due_date.isoformat() if act.due_date else None,
+        'timestamp': act.timestamp.isoformat() if act.timestamp else None,
+        'updated_at': act.updated_at.isoformat() if act.updated_at else None,
+        'owner_id': act.owner_id,
+        'indicator_id': act.indicator_id,
+        'indicator': crud.get_indicator_by_id(db, act.indicator_id),
         'subtasks': [],
         'files': []
     }
 
+@app.post('/activities')
+def create_activity(activity: schemas.ActivityCreate, current_user: models.User = Depends(auth.get_current_user), db: Session = Depends(get_db)):
+    db_act = crud.create_activity(db, owner_id=current_user.id, activity=activity)
+    return _activity_payload(db, db_act)
+
+@app.post('/activities/import')
+def import_activities_csv(
+    file: UploadFile = File(...),
+    dry_run: bool = False,
+    current_user: models.User = Depends(auth.get_current_user),
+    db: Session = Depends(get_db)
+):
+    """Importa actividades desde un CSV (una transacción; las filas con error se reportan)."""
+    # Se lee del archivo temporal de la subida línea a línea, sin cargarlo en memoria
+    lines = io.TextIOWrapper(file.file, encoding='utf-8-sig', newline='')
+    try:
+        result = import_activities(db, lines, owner_id=current_user.id, dry_run=dry_run)
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    finally:
+        lines.detach()
+    logger.info(f"Importación CSV por {current_user.username}: {result['imported']} filas, {result['error_count']} errores")
+    return result
+
 @app.get('/activities', response_model=schemas.PaginatedActivityOut)
-def get_activities(
+async def get_activities(
+    request: Request,
+    response: Response,
     current_user: models.User = Depends(auth.get_current_user),
-    db: Session = Depends(get_db),
+    db: AsyncSession = Depends(get_async_db),
     status: Optional[str] = None,
     assigned_to: Optional[str] = None,
     page: int = 1,
-    per_page: int = 10
+    per_page: int = 10,
+    cursor: Optional[str] = None,
+    include_total: Optional[bool] = None
+):
+    # Sondeo de versión (contador en cache_versions) antes de la consulta completa
+    version = await crud_async.activities_version(db, current_user, status, assigned_to)
+    etag = _etag(
+        'activities', current_user.id, current_user.role, version, await crud_async.indicators_version(db),
+        status, assigned_to, page, per_page, cursor, include_total
+    )
+    not_modified = _not_modified(request, response, etag, version[0])
+    if not_modified:
+        return not_modified
+    try:
+        return await crud_async.list_activities(
+            db, current_user=current_user, status=status, assigned_to=assigned_to,
+            page=page, per_page=per_page, cursor=cursor, include_total=include_total
+        )
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+
+@app.get('/activities/search', response_model=schemas.ActivitySearchOut)
+async def search_activities(
+    q: str,
+    current_user: models.User = Depends(auth.get_current_user),
+    db: AsyncSession = Depends(get_async_db),
+    page: int = 1,
+    per_page: int = 20
 ):
-    return crud.list_activities(db, current_user=current_user, status=status, assigned_to=assigned_to, page=page, per_page=per_page)
+    """Búsqueda de texto en título, descripción, inyectado por y subtareas."""
+    try:
+        return await crud_async.search_activities(db, current_user, q, page=page, per_page=per_page)
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+
+# Rutas por lote antes de /activities/{activity_id} para que "bulk" no se tome como id
+@app.patch('/activities/bulk')
+def bulk_update_activities(body: schemas.ActivityBulkUpdate, current_user: models.User = Depends(auth.get_current_user), db: Session = Depends(get_db)):
+    return crud.bulk_update_activities(db, body.ids, current_user, body.changes)
+
+@app.post('/activities/bulk-assign')
+def bulk_assign_activities(body: schemas.BulkAssignRequest, current_user: models.User = Depends(auth.get_current_user), db: Session = Depends(get_db)):
+    if current_user.role != "Admin":
+        raise HTTPException(status_code=403, detail='Solo usuarios Admin pueden asignar actividades')
+    collaborator, assigned, not_found = crud.bulk_assign_activities(
+        db, body.activity_ids, current_user, body.collaborator_id
+    )
+    if not collaborator:
+        raise HTTPException(status_code=404, detail='Collaborator not found')
+
+    # Un solo correo con todas las actividades e invitaciones
+    if assigned:
+        send_bulk_assignment_email(
+            db,
+            to_email=collaborator.email or collaborator.username,
+            activities=[(a['title'], a['token']) for a in assigned],
+            assigner_name=current_user.username
+        )
+    return {
+        'collaborator_id': collaborator.id,
+        'assigned': [a['id'] for a in assigned],
+        'not_found': not_found,
+    }
 
 @app.patch('/activities/{activity_id}')
 def update_activity(activity_id: int, activity_update: schemas.ActivityUpdate, current_user: models.User = Depends(auth.get_current_user), db: Session = Depends(get_db)):
-    result = crud.update_activity(db, activity_id, current_user.id, activity_update, current_user.username)
+    result = crud.update_activity(db, activity_id, current_user, activity_update)
     if not result:
         raise HTTPException(status_code=404, detail='Activity not found')
-    # Return simple JSON to avoid serialization issues
-    indicator_data = None
-    if result.indicator:
-        indicator_data = {
-            'id': result.indicator.id,
-            'name': result.indicator.name,
-            'description': result.indicator.description,
-            'created_at': result.indicator.created_at.isoformat() if result.indicator.created_at else None
-        }
-    return {
-        'id': result.id,
-        'title': result.title,
-        'description': result.description,
-        'status': result.status,
-        'assigned_to': result.assigned_to,
-        'assigned_email': result.assigned_email,
-        'due_date': result.due_date.isoformat() if result.due_date else None,
-        'timestamp': result.timestamp.isoformat() if result.timestamp else None,
-        'updated_at': result.updated_at.isoformat() if result.updated_at else None,
-        'injected_by': result.injected_by,
-        'owner_id': result.owner_id,
-        'indicator_id': result.indicator_id,
-        'indicator': indicator_data,
-        'subtasks': [],
-        'files': []
-    }
+    return _activity_payload(db, result)
 
 @app.delete('/activities/{activity_id}')
 def delete_activity(activity_id: int, current_user: models.User = Depends(auth.get_current_user), db: Session = Depends(get_db)):
@@ -184,40 +328,86 @@ def delete_activity(activity_id: int, current_user: models.User = Depends(auth.g
         raise HTTPException(status_code=404, detail='Activity not found')
     return {"ok": True}
 
-@app.get('/activities/{activity_id}/history', response_model=list[schemas.ActivityHistoryOut])
-def get_activity_history(activity_id: int, current_user: models.User = Depends(auth.get_current_user), db: Session = Depends(get_db)):
-    result = crud.get_activity_history(db, activity_id, current_user.id)
+@app.get('/activities/{activity_id}/history', response_model=schemas.PaginatedHistoryOut)
+async def get_activity_history(
+    activity_id: int,
+    current_user: models.User = Depends(auth.get_current_user),
+    db: AsyncSession = Depends(get_async_db),
+    field: Optional[str] = None,
+    since: Optional[datetime] = None,
+    page: int = 1,
+    per_page: int = 50,
+    cursor: Optional[str] = None
+):
+    try:
+        result = await crud_async.get_activity_history(
+            db, activity_id, current_user, field=field, page=page, per_page=per_page, cursor=cursor, since=since
+        )
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
     if result is None:
         raise HTTPException(status_code=404, detail='Activity not found')
     return result
 
+@app.get('/history', response_model=schemas.PaginatedHistoryOut)
+async def get_global_history(
+    current_user: models.User = Depends(auth.get_current_user),
+    db: AsyncSession = Depends(get_async_db),
+    field: Optional[str] = None,
+    since: Optional[datetime] = None,
+    page: int = 1,
+    per_page: int = 50,
+    cursor: Optional[str] = None
+):
+    """Cambios recientes de todas las actividades (solo Admin)."""
+    if current_user.role != "Admin":
+        raise HTTPException(status_code=403, detail='Solo usuarios Admin pueden ver el historial global')
+    try:
+        return await crud_async.get_global_history(db, field=field, page=page, per_page=per_page, cursor=cursor, since=since)
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+
+CSV_EXPORT_HEADER = ['ID', 'Título', 'Descripción', 'Estado', 'Asignado a', 'Inyectado por', 'Creado', 'Actualizado']
+CSV_EXPORT_CHUNK_ROWS = 500
+
+
+def _stream_activities_csv(fetch_activities):
+    """Genera el CSV por bloques de filas usando su propia sesión.
+
+    La sesión de la request se cierra antes de que termine el streaming, así que
+    el generador abre una sesión propia y la cierra al terminar.
+    """
+    db = SessionLocal()
+    try:
+        output = io.StringIO()
+        writer = csv.writer(output)
+        writer.writerow(CSV_EXPORT_HEADER)
+        for i, act in enumerate(fetch_activities(db), start=1):
+            writer.writerow([
+                act.id,
+                act.title,
+                act.description or '',
+                act.status,
+                act.assigned_to or '',
+                act.injected_by or '',
+                act.timestamp.isoformat() if act.timestamp else '',
+                act.updated_at.isoformat() if act.updated_at else ''
+            ])
+            if i % CSV_EXPORT_CHUNK_ROWS == 0:
+                yield output.getvalue()
+                output.seek(0)
+                output.truncate(0)
+        yield output.getvalue()
+    finally:
+        db.close()
+
 @app.get('/activities/export/csv')
 def export_activities_csv(
     current_user: models.User = Depends(auth.get_current_user),
-    db: Session = Depends(get_db),
     status: Optional[str] = None
 ):
-    activities = crud.get_activities_for_export(db, current_user, status)
-    
-    output = io.StringIO()
-    writer = csv.writer(output)
-    writer.writerow(['ID', 'Título', 'Descripción', 'Estado', 'Asignado a', 'Inyectado por', 'Creado', 'Actualizado'])
-    
-    for act in activities:
-        writer.writerow([
-            act.id,
-            act.title,
-            act.description or '',
-            act.status,
-            act.assigned_to or '',
-            act.injected_by or '',
-            act.timestamp.isoformat(),
-            act.updated_at.isoformat()
-        ])
-    
-    output.seek(0)
     return StreamingResponse(
-        iter([output.getvalue()]),
+        _stream_activities_csv(lambda db: crud.get_activities_for_export(db, current_user, status, batch_size=CSV_EXPORT_CHUNK_ROWS)),
         media_type="text/csv",
         headers={"Content-Disposition": "attachment; filename=actividades.csv"}
     )
@@ -225,30 +415,11 @@ def export_activities_csv(
 @app.get('/activities/export/weekly')
 def export_weekly_activities_csv(
     current_user: models.User = Depends(auth.get_current_user),
-    db: Session = Depends(get_db),
     days: int = 7
 ):
-    activities = crud.get_activities_for_week(db, current_user, days=days)
-    output = io.StringIO()
-    writer = csv.writer(output)
-    writer.writerow(['ID', 'Título', 'Descripción', 'Estado', 'Asignado a', 'Inyectado por', 'Creado', 'Actualizado'])
-
-    for act in activities:
-        writer.writerow([
-            act.id,
-            act.title,
-            act.description or '',
-            act.status,
-            act.assigned_to or '',
-            act.injected_by or '',
-            act.timestamp.isoformat() if act.timestamp else '',
-            act.updated_at.isoformat() if act.updated_at else ''
-        ])
-
-    output.seek(0)
     filename = f"actividades_semana_{datetime.utcnow().date().isoformat()}.csv"
     return StreamingResponse(
-        iter([output.getvalue()]),
+        _stream_activities_csv(lambda db: crud.get_activities_for_week(db, current_user, days=days, batch_size=CSV_EXPORT_CHUNK_ROWS)),
         media_type="text/csv",
         headers={"Content-Disposition": f"attachment; filename={filename}"}
     )
@@ -269,106 +440,226 @@ def delete_webhook(webhook_id: int, current_user: models.User = Depends(auth.get
     return {"ok": True}
 
 # Uploads directory
-BASE_DIR = Path(__file__).resolve().parent.parent
-UPLOADS_DIR = BASE_DIR / 'uploads'
 os.makedirs(UPLOADS_DIR, exist_ok=True)
 
 
 @app.post('/activities/{activity_id}/files', response_model=schemas.ActivityFileOut)
 async def upload_activity_file(activity_id: int, file: UploadFile = File(...), current_user: models.User = Depends(auth.get_current_user), db: Session = Depends(get_db)):
-    # Guardar archivo en disco
-    safe_name = f"{int(__import__('time').time())}_{file.filename}"
-    dest = UPLOADS_DIR / safe_name
-    with open(dest, 'wb') as f:
-        while True:
-            chunk = await file.read(1024*1024)
-            if not chunk:
-                break
-            f.write(chunk)
-
+    # Sesión síncrona: las consultas van al threadpool igual que la escritura a disco
+    if not await run_in_threadpool(crud.get_accessible_activity, db, activity_id, current_user):
+        raise HTTPException(status_code=404, detail='Activity not found')
+    stored = await save_upload(file)
     info = {
         'filename': file.filename,
-        'file_path': str(dest.relative_to(BASE_DIR)),
-        'file_size': dest.stat().st_size,
         'file_type': file.content_type,
-        'uploaded_by': current_user.username
+        'uploaded_by': current_user.username,
+        **stored,
     }
-    db_file = crud.create_activity_file(db, activity_id, current_user.id, info)
+    db_file = await run_in_threadpool(crud.create_activity_file, db, activity_id, current_user, info)
     if not db_file:
-        # remove saved file if record fails
+        await run_in_threadpool(release_object, db, stored['sha256'], stored['file_path'])
+        raise HTTPException(status_code=404, detail='Activity not found')
+    return db_file
+
+
+@app.post('/activities/{activity_id}/uploads', response_model=schemas.UploadSessionOut)
+def create_upload(activity_id: int, body: schemas.UploadCreate, current_user: models.User = Depends(auth.get_current_user), db: Session = Depends(get_db)):
+    """Inicia una subida reanudable por partes (ver app/uploads.py)."""
+    try:
+        upload = uploads.create_upload(db, activity_id, current_user, body.filename, body.file_type, body.total_size)
+    except uploads.UploadError as e:
+        raise HTTPException(status_code=413, detail=str(e))
+    if not upload:
+        raise HTTPException(status_code=404, detail='Activity not found')
+    return uploads.upload_out(db, upload)
+
+
+@app.get('/uploads/{upload_id}', response_model=schemas.UploadSessionOut)
+def get_upload(upload_id: str, current_user: models.User = Depends(auth.get_current_user), db: Session = Depends(get_db)):
+    upload = uploads.get_upload(db, upload_id, current_user)
+    if not upload:
+        raise HTTPException(status_code=404, detail='Upload not found')
+    return uploads.upload_out(db, upload)
+
+
+@app.put('/uploads/{upload_id}/chunks/{index}')
+async def upload_chunk(upload_id: str, index: int, request: Request, current_user: models.User = Depends(auth.get_current_user), db: Session = Depends(get_db)):
+    upload = await run_in_threadpool(uploads.get_upload, db, upload_id, current_user)
+    if not upload:
+        raise HTTPException(status_code=404, detail='Upload not found')
+    try:
+        offset, expected = uploads.chunk_span(upload, index)
+    except uploads.UploadError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+
+    # El cuerpo va a un archivo propio a medida que llega, en bloques de hasta 1 MB;
+    # se copia a su offset solo si la sesión sigue abierta (ver uploads.record_chunk)
+    writer = await run_in_threadpool(open_chunk_part, upload_id)
+    received = 0
+    buffer = bytearray()
+    try:
         try:
-            os.remove(dest)
-        except Exception:
-            pass
+            async for piece in request.stream():
+                received += len(piece)
+                if received > expected:
+                    raise HTTPException(status_code=400, detail=f'La parte {index} debe tener {expected} bytes')
+                buffer += piece
+                if len(buffer) >= STORAGE_CHUNK_SIZE:
+                    await run_in_threadpool(writer.write, bytes(buffer))
+                    buffer.clear()
+            if buffer:
+                await run_in_threadpool(writer.write, bytes(buffer))
+        finally:
+            await run_in_threadpool(writer.close)
+        if received != expected:
+            raise HTTPException(status_code=400, detail=f'La parte {index} debe tener {expected} bytes, llegaron {received}')
+        try:
+            await run_in_threadpool(uploads.record_chunk, db, upload, index, writer.name, received)
+        except uploads.UploadClosed as e:
+            raise HTTPException(status_code=410, detail=str(e))
+    finally:
+        await run_in_threadpool(discard_chunk_part, writer.name)
+    return {'upload_id': upload_id, 'index': index, 'offset': offset, 'size': received}
+
+
+@app.post('/uploads/{upload_id}/complete', response_model=schemas.ActivityFileOut)
+def complete_upload(upload_id: str, current_user: models.User = Depends(auth.get_current_user), db: Session = Depends(get_db)):
+    upload = uploads.get_upload(db, upload_id, current_user)
+    if not upload:
+        raise HTTPException(status_code=404, detail='Upload not found')
+    try:
+        db_file = uploads.complete_upload(db, upload, current_user)
+    except uploads.UploadError as e:
+        raise HTTPException(status_code=409, detail=str(e))
+    if not db_file:
         raise HTTPException(status_code=404, detail='Activity not found')
     return db_file
 
 
+@app.delete('/uploads/{upload_id}')
+def abort_upload(upload_id: str, current_user: models.User = Depends(auth.get_current_user), db: Session = Depends(get_db)):
+    upload = uploads.get_upload(db, upload_id, current_user)
+    if not upload:
+        raise HTTPException(status_code=404, detail='Upload not found')
+    uploads.abort_upload(db, upload)
+    return {"ok": True}
+
+
 @app.get('/activities/{activity_id}/files', response_model=list[schemas.ActivityFileOut])
 def list_activity_files(activity_id: int, current_user: models.User = Depends(auth.get_current_user), db: Session = Depends(get_db)):
-    result = crud.list_activity_files(db, activity_id, current_user.id)
+    result = crud.list_activity_files(db, activity_id, current_user)
     if result is None:
         raise HTTPException(status_code=404, detail='Activity not found')
     return result
 
 
+def _serve_file(request: Request, file_path: str, filename: str, media_type: Optional[str], sha256: Optional[str]):
+    """Descarga con ETag / If-None-Match; Range e If-Range los resuelve AttachmentResponse (o nginx)."""
+    headers = {'Cache-Control': 'private, no-cache'}
+    path = BASE_DIR / file_path
+    stat_result = None
+    if not sha256:
+        try:
+            stat_result = os.stat(path)
+        except FileNotFoundError:
+            raise HTTPException(status_code=404, detail='File missing on server')
+    headers['ETag'] = file_etag(sha256, stat_result)
+    if _etag_matches(request, headers['ETag']):
+        return Response(status_code=304, headers=headers)
+    if DOWNLOAD_ACCEL_REDIRECT:
+        headers['X-Accel-Redirect'] = accel_redirect_path(file_path)
+        headers['Content-Disposition'] = f"attachment; filename*=utf-8''{quote(filename)}"
+        return Response(headers=headers, media_type=media_type or 'application/octet-stream')
+    if stat_result is None and not path.is_file():
+        raise HTTPException(status_code=404, detail='File missing on server')
+    return AttachmentResponse(path, filename=filename, media_type=media_type, headers=headers, stat_result=stat_result)
+
+
 @app.get('/activities/{activity_id}/files/{file_id}')
-def download_activity_file(activity_id: int, file_id: int, current_user: models.User = Depends(auth.get_current_user), db: Session = Depends(get_db)):
-    db_file = crud.get_activity_file(db, file_id, activity_id, current_user.id)
+def download_activity_file(request: Request, activity_id: int, file_id: int, current_user: models.User = Depends(auth.get_current_user), db: Session = Depends(get_db)):
+    db_file = crud.get_activity_file(db, file_id, activity_id, current_user)
     if not db_file:
         raise HTTPException(status_code=404, detail='File not found')
-    file_path = BASE_DIR / db_file.file_path
-    if not file_path.exists():
-        raise HTTPException(status_code=404, detail='File missing on server')
-    return FileResponse(path=str(file_path), filename=db_file.filename, media_type=db_file.file_type)
+    return _serve_file(request, db_file.file_path, db_file.filename, db_file.file_type, db_file.sha256)
+
+
+@app.post('/activities/{activity_id}/files/{file_id}/link', response_model=schemas.FileLinkOut)
+def create_activity_file_link(activity_id: int, file_id: int, current_user: models.User = Depends(auth.get_current_user), db: Session = Depends(get_db)):
+    """Enlace firmado de corta duración: el navegador descarga directo, sin header Authorization."""
+    db_file = crud.get_activity_file(db, file_id, activity_id, current_user)
+    if not db_file:
+        raise HTTPException(status_code=404, detail='File not found')
+    token, expires_at = create_download_token(db_file)
+    return {'url': f'/files/download?token={token}', 'expires_at': expires_at}
+
+
+@app.get('/files/download')
+def download_signed_file(request: Request, token: str):
+    # Sin consulta a la base: el token firmado ya dice qué archivo y con qué nombre
+    payload = read_download_token(token)
+    if payload is None:
+        raise HTTPException(status_code=403, detail='Enlace de descarga inválido o vencido')
+    return _serve_file(request, payload['path'], payload['name'], payload.get('type'), payload.get('sha256'))
 
 
 @app.delete('/activities/{activity_id}/files/{file_id}')
 def delete_activity_file(activity_id: int, file_id: int, current_user: models.User = Depends(auth.get_current_user), db: Session = Depends(get_db)):
-    db_file = crud.get_activity_file(db, file_id, activity_id, current_user.id)
+    db_file = crud.get_activity_file(db, file_id, activity_id, current_user)
     if not db_file:
         raise HTTPException(status_code=404, detail='File not found')
-    file_path = BASE_DIR / db_file.file_path
-    # borrar registro y archivo
-    deleted = crud.delete_activity_file(db, file_id, activity_id, current_user.id)
+    sha256, file_path = db_file.sha256, db_file.file_path
+    # borrar registro; el objeto por contenido lo borra sweep_uploads.py cuando nadie lo usa
+    crud.delete_activity_file(db, file_id, activity_id, current_user)
     try:
-        if file_path.exists():
-            os.remove(file_path)
-    except Exception:
-        pass
+        release_object(db, sha256, file_path)
+    except Exception as e:
+        logger.error(f"Error borrando archivo {file_path}: {e}")
     return {"ok": True}
 
 @app.post('/activities/{activity_id}/subtasks', response_model=schemas.SubActivityOut)
 def create_subtask(activity_id: int, subtask: schemas.SubActivityCreate, current_user: models.User = Depends(auth.get_current_user), db: Session = Depends(get_db)):
-    result = crud.create_subtask(db, activity_id, current_user.id, subtask)
+    result = crud.create_subtask(db, activity_id, current_user, subtask)
     if not result:
         raise HTTPException(status_code=404, detail='Activity not found')
     return result
 
 @app.get('/activities/{activity_id}/subtasks', response_model=list[schemas.SubActivityOut])
-def get_subtasks(activity_id: int, current_user: models.User = Depends(auth.get_current_user), db: Session = Depends(get_db)):
-    result = crud.list_subtasks(db, activity_id, current_user.id)
+async def get_subtasks(activity_id: int, current_user: models.User = Depends(auth.get_current_user), db: AsyncSession = Depends(get_async_db)):
+    result = await crud_async.list_subtasks(db, activity_id, current_user)
     if result is None:
         raise HTTPException(status_code=404, detail='Activity not found')
     return result
 
 @app.patch('/activities/{activity_id}/subtasks/{subtask_id}', response_model=schemas.SubActivityOut)
 def update_subtask(activity_id: int, subtask_id: int, subtask_update: schemas.SubActivityUpdate, current_user: models.User = Depends(auth.get_current_user), db: Session = Depends(get_db)):
-    result = crud.update_subtask(db, subtask_id, activity_id, current_user.id, subtask_update, current_user.username)
+    result = crud.update_subtask(db, subtask_id, activity_id, current_user, subtask_update)
     if not result:
         raise HTTPException(status_code=404, detail='Subtask not found')
     return result
 
 @app.delete('/activities/{activity_id}/subtasks/{subtask_id}')
 def delete_subtask(activity_id: int, subtask_id: int, current_user: models.User = Depends(auth.get_current_user), db: Session = Depends(get_db)):
-    result = crud.delete_subtask(db, subtask_id, activity_id, current_user.id)
+    result = crud.delete_subtask(db, subtask_id, activity_id, current_user)
     if not result:
         raise HTTPException(status_code=404, detail='Subtask not found')
     return {"ok": True}
 
 @app.get('/dashboard/weekly')
-def get_weekly_dashboard(current_user: models.User = Depends(auth.get_current_user), db: Session = Depends(get_db)):
-    return crud.get_weekly_dashboard(db, current_user)
+async def get_weekly_dashboard(request: Request, response: Response, days: int = 7, current_user: models.User = Depends(auth.get_current_user), db: AsyncSession = Depends(get_async_db)):
+    try:
+        crud._dashboard_cache_key(current_user, days)
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    version = (
+        await crud_async.activities_version(db, current_user),
+        await crud_async.indicators_version(db),
+        crud._dashboard_since(days),
+    )
+    etag = _etag('dashboard', 'admin' if current_user.role == "Admin" else current_user.id, days, version)
+    not_modified = _not_modified(request, response, etag, version[0][0])
+    if not_modified:
+        return not_modified
+    return await crud_async.get_weekly_dashboard(db, current_user, days=days, version=version)
 
 
 @app.get('/activities/due')
@@ -389,28 +680,37 @@ def get_due_activities(hours: int = 24, current_user: models.User = Depends(auth
     return out
 
 
-@app.post('/activities/due/send-reminders')
-def send_due_reminders(hours: int = 24, current_user: models.User = Depends(auth.get_current_user), db: Session = Depends(get_db)):
-    """Send reminder emails for activities due within `hours` hours.
-    Will attempt to send to `assigned_to` if it looks like an email (contains '@').
-    Returns summary of attempts.
+def _reminder_job_out(job: models.ReminderJob):
+    return {
+        'job_id': job.id,
+        'status': job.status,
+        'within_hours': job.within_hours,
+        'count': job.activities_count,
+        'emails_queued': job.emails_queued,
+        'results': job.results or [],
+        'error': job.error,
+        'created_at': job.created_at.isoformat() if job.created_at else None,
+        'finished_at': job.finished_at.isoformat() if job.finished_at else None,
+    }
+
+
+@app.post('/activities/due/send-reminders', status_code=202)
+def send_due_reminders(background_tasks: BackgroundTasks, hours: int = 24, current_user: models.User = Depends(auth.get_current_user), db: Session = Depends(get_db)):
+    """Start a reminder job for activities due within `hours` hours.
+    Emails are grouped into one digest per recipient and queued in the outbox.
+    Returns the job; poll GET /activities/due/reminder-jobs/{job_id} for its result.
     """
-    activities = crud.get_due_activities(db, current_user, within_hours=hours)
-    results = []
-    for a in activities:
-        target = a.assigned_to
-        if target and '@' in target:
-            # formatted due_date
-            due_str = a.due_date.isoformat() if a.due_date else ''
-            # obtener archivos adjuntos de la actividad (si existen)
-            files = crud.list_activity_files(db, a.id, current_user.id) or []
-            attachments = [str(BASE_DIR / f.file_path) for f in files]
-            sent = send_deadline_email(target, a.title, due_str, current_user.username, attachments=attachments)
-            results.append({'activity_id': a.id, 'to': target, 'sent': bool(sent)})
-        else:
-            # no email available
-            results.append({'activity_id': a.id, 'to': target, 'sent': False, 'reason': 'no-email'})
-    return {'count': len(results), 'results': results}
+    job = crud.create_reminder_job(db, current_user, hours)
+    background_tasks.add_task(run_reminder_job, job.id)
+    return _reminder_job_out(job)
+
+
+@app.get('/activities/due/reminder-jobs/{job_id}')
+def get_reminder_job(job_id: int, current_user: models.User = Depends(auth.get_current_user), db: Session = Depends(get_db)):
+    job = crud.get_reminder_job(db, job_id, current_user)
+    if not job:
+        raise HTTPException(status_code=404, detail='Job not found')
+    return _reminder_job_out(job)
 
 
 @app.post('/smtp/test')
@@ -421,14 +721,15 @@ def smtp_test_send(
     db: Session = Depends(get_db),
 ):
     """Send a manual SMTP test email, optionally attaching files from an activity."""
-    attachments: list[str] = []
+    attachments: list = []
     if activity_id is not None:
-        files = crud.list_activity_files(db, activity_id, current_user.id)
+        files = crud.list_activity_files(db, activity_id, current_user)
         if files is None:
             raise HTTPException(status_code=404, detail='Activity not found')
-        attachments = [str(BASE_DIR / f.file_path) for f in files]
+        attachments = [[str(BASE_DIR / f.file_path), f.filename] for f in files]
 
-    ok = send_deadline_email(
+    queued = send_deadline_email(
+        db,
         to_email=to_email,
         activity_title='Prueba SMTP',
         due_date=datetime.utcnow().isoformat(),
@@ -436,7 +737,8 @@ def smtp_test_send(
         attachments=attachments,
     )
     return {
-        'ok': bool(ok),
+        'ok': True,
+        'outbox_id': queued.id,
         'to': to_email,
         'activity_id': activity_id,
         'attachments_count': len(attachments),
@@ -444,16 +746,17 @@ def smtp_test_send(
 
 @app.post('/activities/{activity_id}/invite', response_model=schemas.InvitationOut)
 def create_invitation(activity_id: int, invite: schemas.InvitationCreate, current_user: models.User = Depends(auth.get_current_user), db: Session = Depends(get_db)):
-    result = crud.create_invitation(db, activity_id, current_user.id, invite.invited_email, current_user.username)
+    result = crud.create_invitation(db, activity_id, current_user, invite.invited_email)
     if not result:
         raise HTTPException(status_code=404, detail='Activity not found')
     
-    # Obtener datos de la actividad
-    activity = db.query(models.Activity).filter(models.Activity.id == activity_id).first()
+    # Obtener datos de la actividad (ya resuelta por el chequeo de acceso)
+    activity = crud.get_accessible_activity(db, activity_id, current_user)
     activity_title = activity.title if activity else "Actividad sin título"
     
     # Enviar email
     send_invitation_email(
+        db,
         to_email=invite.invited_email,
         activity_title=activity_title,
         invitation_token=result.token,
@@ -481,7 +784,9 @@ def update_user_role(user_id: int, role: str, current_user: models.User = Depend
         raise HTTPException(status_code=404, detail='Usuario no encontrado')
     
     user.role = role
+    auth.bump_users_version(db)
     db.commit()
+    auth.invalidate_cached_user(user.username)
     return {"success": True, "message": f"Rol actualizado a {role}"}
 
 @app.delete('/admin/users/{user_id}')
@@ -498,7 +803,9 @@ def delete_user(user_id: int, current_user: models.User = Depends(auth.get_curre
         raise HTTPException(status_code=404, detail='Usuario no encontrado')
     
     db.delete(user)
+    auth.bump_users_version(db)
     db.commit()
+    auth.invalidate_cached_user(user.username)
     return {"success": True, "message": f"Usuario {user.username} eliminado"}
 
 @app.post('/activities/{activity_id}/assign', response_model=schemas.ActivityOut)
@@ -506,7 +813,7 @@ def assign_activity(activity_id: int, body: schemas.AssignActivityRequest, curre
     if current_user.role != "Admin":
         raise HTTPException(status_code=403, detail='Solo usuarios Admin pueden asignar actividades')
     activity, collaborator, invitation = crud.assign_activity_to_collaborator(
-        db, activity_id, current_user.id, body.collaborator_id, current_user.username
+        db, activity_id, current_user, body.collaborator_id
     )
     if not activity:
         raise HTTPException(status_code=404, detail='Activity not found')
@@ -516,6 +823,7 @@ def assign_activity(activity_id: int, body: schemas.AssignActivityRequest, curre
     # Enviar email de notificación al colaborador asignado
     if collaborator.email:
         send_assignment_notification_email(
+            db,
             to_email=collaborator.email,
             activity_title=activity.title,
             activity_description=activity.description or '',
@@ -525,6 +833,7 @@ def assign_activity(activity_id: int, body: schemas.AssignActivityRequest, curre
     # Si también se creó una invitación (para nuevos usuarios), enviar ese email también
     if invitation:
         send_invitation_email(
+            db,
             to_email=collaborator.email or collaborator.username,
             activity_title=activity.title,
             invitation_token=invitation.token,
@@ -1,4 +1,4 @@
-from sqlalchemy import Column, Integer, String, DateTime, ForeignKey, Text, Boolean
+from sqlalchemy import Column, Integer, BigInteger, String, Date, DateTime, ForeignKey, Text, Boolean, JSON, UniqueConstraint, Index
 from sqlalchemy.orm import relationship
 from .database import Base
 import datetime
@@ -26,6 +26,10 @@ class User(Base):
 
 class Activity(Base):
     __tablename__ = "activities"
+    __table_args__ = (
+        Index("ix_activities_status_timestamp", "status", "timestamp"),
+        Index("ix_activities_timestamp_id", "timestamp", "id"),
+    )
     id = Column(Integer, primary_key=True, index=True)
     title = Column(String, index=True)
     description = Column(Text, nullable=True)
@@ -33,10 +37,10 @@ class Activity(Base):
     status = Column(String, default="En Curso", index=True)  # En Curso, Completada, Cancelada
     assigned_to = Column(String, nullable=True)
     assigned_email = Column(String, nullable=True)
-    due_date = Column(DateTime, nullable=True)
+    due_date = Column(DateTime, nullable=True, index=True)
     timestamp = Column(DateTime, default=datetime.datetime.utcnow)
     updated_at = Column(DateTime, default=datetime.datetime.utcnow, onupdate=datetime.datetime.utcnow)
-    owner_id = Column(Integer, ForeignKey("users.id"))
+    owner_id = Column(Integer, ForeignKey("users.id"), index=True)
     indicator_id = Column(Integer, ForeignKey("indicators.id"), nullable=False)
     owner = relationship("User", back_populates="activities")
     indicator = relationship("Indicator", back_populates="activities")
@@ -45,8 +49,18 @@ class Activity(Base):
     files = relationship("ActivityFile", back_populates="activity", cascade="all, delete-orphan")
     shared_with = relationship("ActivityAccess", back_populates="activity", cascade="all, delete-orphan")
 
+    @property
+    def catalog_indicator(self):
+        """Indicador desde la caché del catálogo (sin consulta); crud la deja al día antes de serializar."""
+        from .catalog import indicator_catalog
+        return indicator_catalog.cached(self.indicator_id)
+
 class ActivityAccess(Base):
     __tablename__ = "activity_access"
+    __table_args__ = (
+        Index("uq_activity_access_activity_user", "activity_id", "user_id", unique=True),
+        Index("ix_activity_access_user_activity", "user_id", "activity_id"),
+    )
     id = Column(Integer, primary_key=True, index=True)
     activity_id = Column(Integer, ForeignKey("activities.id"))
     user_id = Column(Integer, ForeignKey("users.id"))
@@ -68,7 +82,11 @@ class SubActivity(Base):
     timestamp = Column(DateTime, default=datetime.datetime.utcnow)
 
 class ActivityHistory(Base):
+    """Formato anterior (una fila por campo). Solo se lee para compactarlo a activity_changesets."""
     __tablename__ = "activity_history"
+    __table_args__ = (
+        Index("ix_activity_history_activity_timestamp", "activity_id", "timestamp"),
+    )
     id = Column(Integer, primary_key=True, index=True)
     activity_id = Column(Integer, ForeignKey("activities.id"))
     activity = relationship("Activity", back_populates="history")
@@ -78,6 +96,20 @@ class ActivityHistory(Base):
     new_value = Column(Text, nullable=True)
     timestamp = Column(DateTime, default=datetime.datetime.utcnow)
 
+class ActivityChangeset(Base):
+    """Un cambio de actividad por fila: {campo: [anterior, nuevo]} (reemplaza a activity_history)."""
+    __tablename__ = "activity_changesets"
+    __table_args__ = (
+        Index("ix_activity_changesets_activity_timestamp", "activity_id", "timestamp", "id"),
+        Index("ix_activity_changesets_timestamp_id", "timestamp", "id"),
+    )
+    id = Column(Integer, primary_key=True, index=True)
+    activity_id = Column(Integer, ForeignKey("activities.id"), nullable=False)
+    changed_by = Column(String)
+    fields = Column(String, nullable=False)  # "|status|due_date|" para filtrar por campo con LIKE
+    changes = Column(JSON, nullable=False)
+    timestamp = Column(DateTime, nullable=False, default=datetime.datetime.utcnow)
+
 class Webhook(Base):
     __tablename__ = "webhooks"
     id = Column(Integer, primary_key=True, index=True)
@@ -87,6 +119,17 @@ class Webhook(Base):
     active = Column(Boolean, default=True)
     created_at = Column(DateTime, default=datetime.datetime.utcnow)
 
+class WebhookDeadLetter(Base):
+    __tablename__ = "webhook_dead_letters"
+    id = Column(Integer, primary_key=True, index=True)
+    webhook_id = Column(Integer, ForeignKey("webhooks.id", ondelete="SET NULL"), nullable=True, index=True)
+    url = Column(String, nullable=False)
+    event = Column(String, nullable=True)
+    payload = Column(JSON, nullable=True)
+    attempts = Column(Integer, default=0)
+    last_error = Column(Text, nullable=True)
+    failed_at = Column(DateTime, default=datetime.datetime.utcnow)
+
 class ActivityFile(Base):
     __tablename__ = "activity_files"
     id = Column(Integer, primary_key=True, index=True)
@@ -95,6 +138,7 @@ class ActivityFile(Base):
     filename = Column(String, nullable=False)
     file_path = Column(String, nullable=False)  # Path relative to uploads directory
     file_size = Column(Integer)  # Size in bytes
+    sha256 = Column(String(64), nullable=True, index=True)  # Contenido (uploads/objects/..); NULL en archivos antiguos
     file_type = Column(String)  # MIME type
     uploaded_by = Column(String)  # Username
     timestamp = Column(DateTime, default=datetime.datetime.utcnow)
@@ -111,3 +155,77 @@ class Invitation(Base):
     created_at = Column(DateTime, default=datetime.datetime.utcnow)
     expires_at = Column(DateTime)  # When invitation expires (e.g., 7 days from creation)
     accepted_at = Column(DateTime, nullable=True)
+
+class EmailOutbox(Base):
+    __tablename__ = "email_outbox"
+    id = Column(Integer, primary_key=True, index=True)
+    to_email = Column(String, nullable=False)
+    subject = Column(String, nullable=False)
+    html_content = Column(Text, nullable=False)
+    attachments = Column(JSON, nullable=True)  # Rutas absolutas de adjuntos
+    status = Column(String, default="pending", index=True)  # pending, sending, sent, failed
+    attempts = Column(Integer, default=0)
+    last_error = Column(Text, nullable=True)
+    next_attempt_at = Column(DateTime, default=datetime.datetime.utcnow, index=True)
+    created_at = Column(DateTime, default=datetime.datetime.utcnow)
+    sent_at = Column(DateTime, nullable=True)
+
+class ReminderJob(Base):
+    __tablename__ = "reminder_jobs"
+    id = Column(Integer, primary_key=True, index=True)
+    requested_by_id = Column(Integer, ForeignKey("users.id"))
+    within_hours = Column(Integer, default=24)
+    status = Column(String, default="queued")  # queued, running, done, failed
+    activities_count = Column(Integer, default=0)
+    emails_queued = Column(Integer, default=0)
+    results = Column(JSON, nullable=True)
+    error = Column(Text, nullable=True)
+    created_at = Column(DateTime, default=datetime.datetime.utcnow)
+    finished_at = Column(DateTime, nullable=True)
+
+class ActivityRollup(Base):
+    """Conteo de actividades por (indicador, estado, dueño, asignado, día de creación)."""
+    __tablename__ = "activity_rollups"
+    __table_args__ = (
+        UniqueConstraint("indicator_id", "status", "owner_id", "assigned_to", "day", name="uq_activity_rollups_key"),
+    )
+    id = Column(Integer, primary_key=True, index=True)
+    indicator_id = Column(Integer, ForeignKey("indicators.id"), nullable=True)
+    status = Column(String, nullable=False)
+    owner_id = Column(Integer, ForeignKey("users.id"), nullable=True)
+    assigned_to = Column(String, nullable=False, default="")  # '' = sin asignar
+    day = Column(Date, nullable=False, index=True)
+    count = Column(Integer, nullable=False, default=0)
+
+class CacheVersion(Base):
+    """Versión por caché en memoria; la suben triggers de BD al cambiar la tabla de origen."""
+    __tablename__ = "cache_versions"
+    name = Column(String, primary_key=True)
+    version = Column(Integer, nullable=False, default=0)
+    updated_at = Column(DateTime, default=datetime.datetime.utcnow)
+
+class UploadSession(Base):
+    """Subida por partes en curso; el contenido se arma en uploads/tmp/upload_<id>."""
+    __tablename__ = "upload_sessions"
+    id = Column(String(32), primary_key=True)
+    activity_id = Column(Integer, ForeignKey("activities.id", ondelete="CASCADE"), nullable=False, index=True)
+    created_by = Column(Integer, ForeignKey("users.id", ondelete="CASCADE"), nullable=False)
+    filename = Column(String, nullable=False)
+    file_type = Column(String, nullable=True)
+    total_size = Column(BigInteger, nullable=False)
+    chunk_size = Column(Integer, nullable=False)
+    status = Column(String, nullable=False, default="open")  # open | finalizing
+    created_at = Column(DateTime, default=datetime.datetime.utcnow)
+    expires_at = Column(DateTime, nullable=False, index=True)
+
+class UploadChunk(Base):
+    """Parte recibida de una subida; una fila por índice (las partes pueden llegar en paralelo)."""
+    __tablename__ = "upload_chunks"
+    __table_args__ = (
+        UniqueConstraint("upload_id", "chunk_index", name="uq_upload_chunks_upload_index"),
+    )
+    id = Column(Integer, primary_key=True)
+    upload_id = Column(String(32), ForeignKey("upload_sessions.id", ondelete="CASCADE"), nullable=False)
+    chunk_index = Column(Integer, nullable=False)
+    size = Column(Integer, nullable=False)
+    received_at = Column(DateTime, default=datetime.datetime.utcnow)
@@ -0,0 +1,70 @@
+"""Ejecución en lote de los recordatorios de vencimiento.
+
+Un job carga en una consulta las actividades por vencer con sus archivos, agrupa
+por destinatario y encola un único correo resumen por persona en el outbox
+(que los envía en lotes). Los archivos solo se nombran, no se adjuntan: se
+descargan desde la aplicación, con sesión y control de acceso. El resultado
+queda en `reminder_jobs` para consultarlo.
+"""
+import datetime
+from collections import defaultdict
+
+from . import crud, models
+from .database import SessionLocal
+from .email_service import send_deadline_digest_email, wake_outbox
+from .logging_config import logger
+
+
+def _recipient(activity: models.Activity):
+    if activity.assigned_email and '@' in activity.assigned_email:
+        return activity.assigned_email
+    if activity.assigned_to and '@' in activity.assigned_to:
+        return activity.assigned_to
+    return None
+
+
+def run_reminder_job(job_id: int):
+    db = SessionLocal()
+    try:
+        job = db.query(models.ReminderJob).filter(models.ReminderJob.id == job_id).first()
+        if not job:
+            return
+        user = db.query(models.User).filter(models.User.id == job.requested_by_id).first()
+        job.status = "running"
+        db.commit()
+
+        try:
+            activities = crud.get_due_activities(db, user, within_hours=job.within_hours, load_files=True)
+            by_recipient = defaultdict(list)
+            results = []
+            for a in activities:
+                target = _recipient(a)
+                if target:
+                    by_recipient[target].append(a)
+                    results.append({'activity_id': a.id, 'to': target, 'queued': True})
+                else:
+                    results.append({'activity_id': a.id, 'to': a.assigned_to, 'queued': False, 'reason': 'no-email'})
+
+            for target, acts in by_recipient.items():
+                send_deadline_digest_email(
+                    db, target,
+                    [(a.title, a.due_date.isoformat() if a.due_date else '', [f.filename for f in a.files]) for a in acts],
+                    user.username,
+                    commit=False
+                )
+
+            job.activities_count = len(activities)
+            job.emails_queued = len(by_recipient)
+            job.results = results
+            job.status = "done"
+        except Exception as e:
+            db.rollback()
+            logger.error(f"Error en el job de recordatorios {job_id}: {e}", exc_info=True)
+            job.status = "failed"
+            job.error = str(e)
+        job.finished_at = datetime.datetime.utcnow()
+        db.commit()
+        if job.status == "done":
+            wake_outbox()
+    finally:
+        db.close()
@@ -0,0 +1,99 @@
+"""Tabla de conteos `activity_rollups` mantenida de forma incremental.
+
+Cada cambio de estado, indicador, asignado o dueño de una actividad mueve una
+unidad entre las claves (indicator_id, status, owner_id, assigned_to, day)
+dentro de la misma transacción. `rebuild_rollups` la recalcula desde cero.
+"""
+from sqlalchemy import func, insert, literal
+from sqlalchemy.exc import IntegrityError
+from sqlalchemy.orm import Session
+
+from . import models
+
+
+def activity_key(activity: models.Activity, **changes):
+    """Clave de rollup de una actividad (o None si aún no tiene fecha de creación).
+
+    `changes` reemplaza valores sin tocar el objeto (útil en updates por lote).
+    """
+    def value(field):
+        return changes[field] if field in changes else getattr(activity, field)
+
+    if value("timestamp") is None:
+        return None
+    return (
+        value("indicator_id"),
+        value("status"),
+        value("owner_id"),
+        value("assigned_to") or "",
+        value("timestamp").date(),
+    )
+
+
+def _key_filter(key):
+    columns = (
+        models.ActivityRollup.indicator_id,
+        models.ActivityRollup.status,
+        models.ActivityRollup.owner_id,
+        models.ActivityRollup.assigned_to,
+        models.ActivityRollup.day,
+    )
+    return [col.is_(None) if value is None else col == value for col, value in zip(columns, key)]
+
+
+def apply_delta(db: Session, key, delta: int):
+    if key is None or delta == 0:
+        return
+    updated = db.query(models.ActivityRollup).filter(*_key_filter(key)).update(
+        {models.ActivityRollup.count: models.ActivityRollup.count + delta},
+        synchronize_session=False
+    )
+    if updated:
+        return
+    indicator_id, status, owner_id, assigned_to, day = key
+    try:
+        with db.begin_nested():
+            db.add(models.ActivityRollup(
+                indicator_id=indicator_id, status=status, owner_id=owner_id,
+                assigned_to=assigned_to, day=day, count=delta
+            ))
+    except IntegrityError:
+        # Otra transacción creó la fila entre el UPDATE y el INSERT
+        db.query(models.ActivityRollup).filter(*_key_filter(key)).update(
+            {models.ActivityRollup.count: models.ActivityRollup.count + delta},
+            synchronize_session=False
+        )
+
+
+def move(db: Session, old_key, new_key):
+    """Registra que una actividad pasó de `old_key` a `new_key`."""
+    if old_key == new_key:
+        return
+    apply_delta(db, old_key, -1)
+    apply_delta(db, new_key, 1)
+
+
+def rebuild_rollups(db: Session) -> int:
+    """Recalcula toda la tabla desde `activities`. Devuelve el número de grupos."""
+    day = func.date(models.Activity.timestamp)
+    assigned = func.coalesce(models.Activity.assigned_to, literal(""))
+    source = db.query(
+        models.Activity.indicator_id,
+        models.Activity.status,
+        models.Activity.owner_id,
+        assigned,
+        day,
+        func.count(models.Activity.id),
+    ).filter(
+        models.Activity.timestamp != None,
+        models.Activity.status != None
+    ).group_by(
+        models.Activity.indicator_id, models.Activity.status, models.Activity.owner_id, assigned, day
+    )
+    db.query(models.ActivityRollup).delete(synchronize_session=False)
+    result = db.execute(insert(models.ActivityRollup).from_select(
+        ["indicator_id", "status", "owner_id", "assigned_to", "day", "count"],
+        source.subquery().select()
+    ))
+    db.commit()
+    return result.rowcount
@@ -1,4 +1,4 @@
-from pydantic import BaseModel, field_validator, ConfigDict
+from pydantic import BaseModel, field_validator, ConfigDict, Field, AliasChoices
 from typing import Optional
 import datetime
 import re
@@ -91,10 +91,37 @@ class ActivityFileOut(BaseModel):
     filename: str
     file_path: str
     file_size: Optional[int]
+    sha256: Optional[str] = None
     file_type: Optional[str]
     uploaded_by: Optional[str]
     timestamp: datetime.datetime
 
+class UploadCreate(BaseModel):
+    filename: str
+    file_type: Optional[str] = None
+    total_size: int
+
+    @field_validator('total_size')
+    @classmethod
+    def validate_total_size(cls, v):
+        if v < 0:
+            raise ValueError('total_size no puede ser negativo')
+        return v
+
+class UploadSessionOut(BaseModel):
+    upload_id: str
+    activity_id: int
+    filename: str
+    total_size: int
+    chunk_size: int
+    total_chunks: int
+    received: list[int]
+    expires_at: datetime.datetime
+
+class FileLinkOut(BaseModel):
+    url: str
+    expires_at: datetime.datetime
+
 class ActivityOut(BaseModel):
     model_config = ConfigDict(from_attributes=True)
     
@@ -110,30 +137,47 @@ class ActivityOut(BaseModel):
     updated_at: datetime.datetime
     owner_id: int
     indicator_id: int
-    indicator: Optional[IndicatorOut] = None
+    # Desde la caché del catálogo, sin cargar la relación
+    indicator: Optional[IndicatorOut] = Field(None, validation_alias=AliasChoices('catalog_indicator', 'indicator'))
     subtasks: list[SubActivityOut] = []
     files: list[ActivityFileOut] = []
 
-class ActivityHistoryOut(BaseModel):
-    id: int
-    activity_id: int
-    changed_by: str
-    changed_field: str
+class HistoryChangeOut(BaseModel):
+    field: str
     old_value: Optional[str]
     new_value: Optional[str]
+
+class ActivityChangesetOut(BaseModel):
+    id: int
+    activity_id: int
+    changed_by: Optional[str]
     timestamp: datetime.datetime
+    changes: list[HistoryChangeOut]
 
-    class Config:
-        from_attributes = True
+class PaginatedHistoryOut(BaseModel):
+    page: int
+    per_page: int
+    has_more: bool
+    next_cursor: Optional[str] = None
+    items: list[ActivityChangesetOut]
 
 class PaginatedActivityOut(BaseModel):
-    total: int
+    total: Optional[int] = None
+    page: int
+    per_page: int
+    items: list[ActivityOut]
+    next_cursor: Optional[str] = None
+
+class ActivitySearchOut(BaseModel):
     page: int
     per_page: int
+    has_more: bool
     items: list[ActivityOut]
 
 class WebhookCreate(BaseModel):
     url: str
+    # "*", "activity_updated", "activities_bulk_updated" o "activities_bulk_assigned";
+    # "activity_updated" recibe también los dos eventos por lote
     event: Optional[str] = "*"
 
 class WebhookOut(BaseModel):
@@ -181,6 +225,34 @@ class CollaboratorOut(BaseModel):
 class AssignActivityRequest(BaseModel):
     collaborator_id: int
 
+BULK_MAX_ACTIVITIES = 1000
+
+def _bulk_ids(ids: list[int]) -> list[int]:
+    ids = list(dict.fromkeys(ids))
+    if not ids:
+        raise ValueError('Debe indicar al menos una actividad')
+    if len(ids) > BULK_MAX_ACTIVITIES:
+        raise ValueError(f'Máximo {BULK_MAX_ACTIVITIES} actividades por operación')
+    return ids
+
+class ActivityBulkUpdate(BaseModel):
+    ids: list[int]
+    changes: ActivityUpdate
+
+    @field_validator('ids')
+    @classmethod
+    def validate_ids(cls, v):
+        return _bulk_ids(v)
+
+class BulkAssignRequest(BaseModel):
+    activity_ids: list[int]
+    collaborator_id: int
+
+    @field_validator('activity_ids')
+    @classmethod
+    def validate_ids(cls, v):
+        return _bulk_ids(v)
+
 class AdminUserCreate(BaseModel):
     username: str
     password: str
@@ -0,0 +1,177 @@
+"""Índice de búsqueda de texto sobre actividades (`activity_search`).
+
+Indexa título, inyectado por, descripción y los títulos de las subtareas:
+- PostgreSQL: columna tsvector (configuración 'spanish', pesos A/B/C) con índice GIN.
+- SQLite: tabla virtual FTS5 (unicode61 sin tildes), rowid = id de la actividad.
+
+La tabla no es un modelo ORM porque su tipo depende del motor; se crea al
+arrancar con `ensure_search_index`. Las funciones de crud llaman a
+`index_activities` / `remove_activities` dentro de la misma transacción del
+cambio. Si el índice no está disponible la búsqueda usa LIKE.
+"""
+import re
+
+from sqlalchemy import bindparam, column, exists, func, literal_column, or_, select, table, text
+from sqlalchemy.orm import Session
+
+from . import models
+from .database import IS_SQLITE, engine
+from .logging_config import logger
+
+SEARCH_TABLE = "activity_search"
+
+_state = {"available": None}
+
+_POSTGRES_DDL = (
+    f"""CREATE TABLE IF NOT EXISTS {SEARCH_TABLE} (
+        activity_id INTEGER PRIMARY KEY REFERENCES activities(id) ON DELETE CASCADE,
+        document tsvector NOT NULL
+    )""",
+    f"CREATE INDEX IF NOT EXISTS ix_activity_search_document ON {SEARCH_TABLE} USING GIN (document)",
+)
+
+_SQLITE_DDL = (
+    f"""CREATE VIRTUAL TABLE IF NOT EXISTS {SEARCH_TABLE} USING fts5(
+        title, injected_by, description, subtasks,
+        tokenize = 'unicode61 remove_diacritics 2'
+    )""",
+)
+
+# Documento de cada actividad: {where} se reemplaza por el filtro de ids (o nada)
+_POSTGRES_UPSERT = f"""
+    INSERT INTO {SEARCH_TABLE} (activity_id, document)
+    SELECT a.id,
+           setweight(to_tsvector('spanish', coalesce(a.title, '')), 'A') ||
+           setweight(to_tsvector('spanish', coalesce(a.injected_by, '')), 'B') ||
+           setweight(to_tsvector('spanish', coalesce(a.description, '')), 'C') ||
+           setweight(to_tsvector('spanish', coalesce(
+               (SELECT string_agg(s.title, ' ') FROM sub_activities s WHERE s.activity_id = a.id), ''
+           )), 'C')
+    FROM activities a
+    {{where}}
+    ON CONFLICT (activity_id) DO UPDATE SET document = EXCLUDED.document
+"""
+
+_SQLITE_INSERT = f"""
+    INSERT INTO {SEARCH_TABLE} (rowid, title, injected_by, description, subtasks)
+    SELECT a.id, coalesce(a.title, ''), coalesce(a.injected_by, ''), coalesce(a.description, ''),
+           coalesce((SELECT group_concat(s.title, ' ') FROM sub_activities s WHERE s.activity_id = a.id), '')
+    FROM activities a
+    {{where}}
+"""
+
+# Pesos bm25 por columna (title, injected_by, description, subtasks); menor rank = mejor
+_SQLITE_WEIGHTS = (10.0, 4.0, 2.0, 2.0)
+
+
+def search_available() -> bool:
+    return bool(_state["available"])
+
+
+def ensure_search_index() -> bool:
+    """Crea el índice si hace falta y lo llena si está vacío. Devuelve si quedó disponible."""
+    try:
+        with engine.begin() as conn:
+            for ddl in (_SQLITE_DDL if IS_SQLITE else _POSTGRES_DDL):
+                conn.execute(text(ddl))
+    except Exception as e:
+        logger.error(f"Índice de búsqueda no disponible, se usará LIKE: {e}")
+        _state["available"] = False
+        return False
+    _state["available"] = True
+    try:
+        with engine.begin() as conn:
+            empty = conn.execute(text(f"SELECT 1 FROM {SEARCH_TABLE} LIMIT 1")).first() is None
+            if empty and conn.execute(text("SELECT 1 FROM activities LIMIT 1")).first() is not None:
+                _reindex(conn, None)
+                logger.info("Índice de búsqueda de actividades reconstruido")
+    except Exception as e:
+        # Otro worker pudo llenarlo a la vez; el índice sigue disponible
+        logger.error(f"Error llenando el índice de búsqueda: {e}")
+    return True
+
+
+def _reindex(conn, activity_ids):
+    ids_param = bindparam("ids", expanding=True)
+    if IS_SQLITE:
+        if activity_ids is None:
+            conn.execute(text(f"DELETE FROM {SEARCH_TABLE}"))
+            conn.execute(text(_SQLITE_INSERT.format(where="")))
+        else:
+            conn.execute(text(f"DELETE FROM {SEARCH_TABLE} WHERE rowid IN :ids").bindparams(ids_param),
+                         {"ids": list(activity_ids)})
+            conn.execute(text(_SQLITE_INSERT.format(where="WHERE a.id IN :ids")).bindparams(ids_param),
+                         {"ids": list(activity_ids)})
+    elif activity_ids is None:
+        conn.execute(text(_POSTGRES_UPSERT.format(where="")))
+    else:
+        conn.execute(text(_POSTGRES_UPSERT.format(where="WHERE a.id IN :ids")).bindparams(ids_param),
+                     {"ids": list(activity_ids)})
+
+
+def index_activities(db: Session, activity_ids):
+    """(Re)indexa actividades en la transacción de `db`; sin efecto si no hay índice."""
+    activity_ids = [i for i in activity_ids if i is not None]
+    if not search_available() or not activity_ids:
+        return
+    db.flush()
+    _reindex(db, activity_ids)
+
+
+def remove_activities(db: Session, activity_ids):
+    activity_ids = list(activity_ids)
+    if not search_available() or not activity_ids:
+        return
+    column_name = "rowid" if IS_SQLITE else "activity_id"
+    db.execute(
+        text(f"DELETE FROM {SEARCH_TABLE} WHERE {column_name} IN :ids").bindparams(bindparam("ids", expanding=True)),
+        {"ids": activity_ids}
+    )
+
+
+def rebuild_search_index(db: Session):
+    _reindex(db, None)
+    db.commit()
+
+
+def _fts5_query(q: str) -> str:
+    # Cada palabra como prefijo entre comillas: evita errores de sintaxis FTS5 con la entrada del usuario
+    terms = re.findall(r"\w+", q)
+    return " ".join(f'"{term}"*' for term in terms)
+
+
+def search_match(q: str):
+    """(tabla para JOIN, condición de JOIN, condición de búsqueda, expresión de orden) o None."""
+    if not search_available():
+        pattern = f"%{q.lower()}%"
+        condition = or_(
+            func.lower(models.Activity.title).like(pattern),
+            func.lower(models.Activity.description).like(pattern),
+            func.lower(models.Activity.injected_by).like(pattern),
+            # Las subtareas también están en el documento indexado
+            exists(select(models.SubActivity.id).where(
+                models.SubActivity.activity_id == models.Activity.id,
+                func.lower(models.SubActivity.title).like(pattern),
+            )),
+        )
+        return None, None, condition, models.Activity.timestamp.desc()
+    if IS_SQLITE:
+        query = _fts5_query(q)
+        if not query:
+            return None
+        search = table(SEARCH_TABLE, column("rowid"))
+        fts = literal_column(SEARCH_TABLE)
+        return (
+            search,
+            search.c.rowid == models.Activity.id,
+            fts.op("MATCH")(query),
+            func.bm25(fts, *_SQLITE_WEIGHTS).asc(),
+        )
+    search = table(SEARCH_TABLE, column("activity_id"), column("document"))
+    tsquery = func.websearch_to_tsquery("spanish", q)
+    return (
+        search,
+        search.c.activity_id == models.Activity.id,
+        search.c.document.op("@@")(tsquery),
+        func.ts_rank(search.c.document, tsquery).desc(),
+    )
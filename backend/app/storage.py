@@ -0,0 +1,280 @@
+"""Almacenamiento de archivos adjuntos por contenido (SHA-256).
+
+Cada contenido se guarda una sola vez en `uploads/objects/ab/cd/<sha256>`
+(dos niveles de carpetas por prefijo del hash, para no acumular todo en un solo
+directorio). El archivo se copia a `uploads/tmp/` calculando el hash mientras
+se escribe y después se mueve a su dirección con `os.replace`; si ya existía,
+el temporal se descarta. La copia corre en el threadpool, fuera del event loop.
+
+Varias filas de `activity_files` pueden apuntar al mismo objeto, así que borrar
+una fila no borra el objeto: lo hace `sweep_unreferenced_objects` (script
+sweep_uploads.py) con los que llevan STORAGE_SWEEP_GRACE_HOURS sin referencias.
+Cada vez que una subida reutiliza un objeto se le renueva la fecha, así que una
+subida en curso (objeto listo, fila aún sin confirmar) nunca pierde su archivo.
+
+Para descargar se emiten enlaces firmados de corta duración (JWT con alcance
+"download" que lleva ruta, nombre y tipo): servirlos no consulta la base.
+"""
+import datetime
+import hashlib
+import os
+import time
+import uuid
+from pathlib import Path
+from typing import Optional
+from urllib.parse import quote
+
+from fastapi import UploadFile
+from fastapi.concurrency import run_in_threadpool
+from fastapi.responses import FileResponse
+from jose import JWTError, jwt
+from sqlalchemy.orm import Session
+
+from . import models
+from .auth import ALGORITHM, SECRET_KEY
+
+BASE_DIR = Path(__file__).resolve().parent.parent
+UPLOADS_DIR = BASE_DIR / 'uploads'
+OBJECTS_DIR = UPLOADS_DIR / 'objects'
+TMP_DIR = UPLOADS_DIR / 'tmp'
+TRASH_DIR = UPLOADS_DIR / 'trash'
+
+STORAGE_CHUNK_SIZE = 1024 * 1024
+
+DOWNLOAD_URL_TTL_SECONDS = int(os.getenv("DOWNLOAD_URL_TTL_SECONDS", "300"))
+STORAGE_SWEEP_GRACE_HOURS = float(os.getenv("STORAGE_SWEEP_GRACE_HOURS", "24"))
+# Detrás de nginx: prefijo de una location `internal` que apunta a uploads/; nginx
+# envía el archivo con sendfile (y resuelve Range) en lugar del worker
+DOWNLOAD_ACCEL_REDIRECT = os.getenv("DOWNLOAD_ACCEL_REDIRECT", "")
+
+
+class AttachmentResponse(FileResponse):
+    """FileResponse (Range, If-Range, pathsend si el servidor lo soporta) con bloques de 1 MB."""
+    chunk_size = STORAGE_CHUNK_SIZE
+
+
+def object_path(sha256: str) -> Path:
+    return OBJECTS_DIR / sha256[:2] / sha256[2:4] / sha256
+
+
+def new_temp_path() -> Path:
+    os.makedirs(TMP_DIR, exist_ok=True)
+    return TMP_DIR / uuid.uuid4().hex
+
+
+def commit_object(tmp_path: Path, sha256: str, size: int) -> dict:
+    """Mueve un temporal ya hasheado a su dirección (o lo descarta si el contenido ya está)."""
+    dest = object_path(sha256)
+    try:
+        # Ya estaba: renovar la fecha lo saca de la gracia del barrido
+        os.utime(dest)
+        os.remove(tmp_path)
+    except FileNotFoundError:
+        os.makedirs(dest.parent, exist_ok=True)
+        os.replace(tmp_path, dest)
+    return {
+        'sha256': sha256,
+        'file_size': size,
+        'file_path': str(dest.relative_to(BASE_DIR)),
+    }
+
+
+def store_file(fileobj) -> dict:
+    """Guarda el contenido de `fileobj` (bloqueante). Devuelve sha256, file_size y file_path."""
+    tmp_path = new_temp_path()
+    digest = hashlib.sha256()
+    size = 0
+    try:
+        with open(tmp_path, 'wb') as out:
+            while True:
+                chunk = fileobj.read(STORAGE_CHUNK_SIZE)
+                if not chunk:
+                    break
+                digest.update(chunk)
+                out.write(chunk)
+                size += len(chunk)
+        return commit_object(tmp_path, digest.hexdigest(), size)
+    except BaseException:
+        if tmp_path.exists():
+            os.remove(tmp_path)
+        raise
+
+
+def upload_temp_path(upload_id: str) -> Path:
+    return TMP_DIR / f"upload_{upload_id}"
+
+
+def allocate_upload(upload_id: str, total_size: int):
+    """Archivo temporal del tamaño final (disperso); cada parte se escribe en su offset."""
+    os.makedirs(TMP_DIR, exist_ok=True)
+    with open(upload_temp_path(upload_id), 'wb') as f:
+        f.truncate(total_size)
+
+
+def open_chunk_part(upload_id: str):
+    """Archivo propio de esta request para el cuerpo de una parte; `place_chunk` lo copia a su offset."""
+    os.makedirs(TMP_DIR, exist_ok=True)
+    return open(TMP_DIR / f"upload_{upload_id}.part.{uuid.uuid4().hex}", 'wb')
+
+
+def place_chunk(upload_id: str, part_path, offset: int):
+    """Copia la parte recibida a su offset en el archivo armado (bloqueante)."""
+    with open(part_path, 'rb') as src, open(upload_temp_path(upload_id), 'r+b') as dest:
+        dest.seek(offset)
+        while True:
+            block = src.read(STORAGE_CHUNK_SIZE)
+            if not block:
+                break
+            dest.write(block)
+
+
+def discard_chunk_part(part_path):
+    try:
+        os.remove(part_path)
+    except FileNotFoundError:
+        pass
+
+
+def store_assembled(upload_id: str) -> dict:
+    """Hashea el archivo armado y lo mueve a su dirección (bloqueante)."""
+    tmp_path = upload_temp_path(upload_id)
+    digest = hashlib.sha256()
+    size = 0
+    with open(tmp_path, 'rb') as f:
+        while True:
+            chunk = f.read(STORAGE_CHUNK_SIZE)
+            if not chunk:
+                break
+            digest.update(chunk)
+            size += len(chunk)
+    return commit_object(tmp_path, digest.hexdigest(), size)
+
+
+def discard_upload(upload_id: str):
+    try:
+        os.remove(upload_temp_path(upload_id))
+    except FileNotFoundError:
+        pass
+
+
+async def save_upload(upload: UploadFile) -> dict:
+    await upload.seek(0)
+    return await run_in_threadpool(store_file, upload.file)
+
+
+def release_object(db: Session, sha256: str, file_path: str):
+    """Tras borrar una fila: los archivos antiguos sin hash (ruta única) se borran ya.
+
+    Los objetos por contenido quedan para `sweep_unreferenced_objects`: borrarlos
+    aquí competiría con una subida del mismo contenido que aún no confirmó su fila.
+    """
+    if sha256:
+        return
+    try:
+        os.remove(BASE_DIR / file_path)
+    except FileNotFoundError:
+        pass
+
+
+def _referenced(db: Session, hashes) -> set:
+    return {row[0] for row in db.query(models.ActivityFile.sha256).filter(
+        models.ActivityFile.sha256.in_(list(hashes))
+    ).distinct().all()}
+
+
+def _is_fresh(path: Path, cutoff: float) -> bool:
+    return path.stat().st_mtime >= cutoff
+
+
+def _sweep_batch(db: Session, paths: list, cutoff: float) -> int:
+    """Mueve a la papelera los objetos sin referencias y los borra si siguen así."""
+    candidates = []
+    for path in paths:
+        try:
+            if not _is_fresh(path, cutoff):
+                candidates.append(path)
+        except FileNotFoundError:
+            pass
+    if not candidates:
+        return 0
+    referenced = _referenced(db, [p.name for p in candidates])
+    os.makedirs(TRASH_DIR, exist_ok=True)
+    removed = 0
+    for path in candidates:
+        if path.name in referenced:
+            continue
+        trashed = TRASH_DIR / path.name
+        try:
+            os.replace(path, trashed)
+        except FileNotFoundError:
+            continue
+        # Desde aquí una subida nueva del mismo contenido instala su propia copia.
+        # Si alguna lo reutilizó justo antes (fecha renovada) o ya hay fila, se devuelve.
+        db.rollback()
+        if _is_fresh(trashed, cutoff) or _referenced(db, [path.name]):
+            os.makedirs(path.parent, exist_ok=True)
+            os.replace(trashed, path)
+            continue
+        os.remove(trashed)
+        removed += 1
+    return removed
+
+
+def sweep_unreferenced_objects(db: Session, grace_hours: float = STORAGE_SWEEP_GRACE_HOURS, batch_size: int = 500) -> int:
+    """Borra los objetos que ninguna fila referencia y no se usaron en `grace_hours`. Devuelve cuántos."""
+    cutoff = time.time() - grace_hours * 3600
+    removed = 0
+    # Restos de un barrido interrumpido: vuelven a su lugar y se evalúan de nuevo
+    if TRASH_DIR.exists():
+        for trashed in TRASH_DIR.iterdir():
+            dest = object_path(trashed.name)
+            os.makedirs(dest.parent, exist_ok=True)
+            os.replace(trashed, dest)
+    if not OBJECTS_DIR.exists():
+        return 0
+    batch = []
+    for root, _dirs, names in os.walk(OBJECTS_DIR):
+        for name in names:
+            batch.append(Path(root) / name)
+            if len(batch) >= batch_size:
+                removed += _sweep_batch(db, batch, cutoff)
+                batch = []
+    if batch:
+        removed += _sweep_batch(db, batch, cutoff)
+    return removed
+
+
+def file_etag(sha256: Optional[str], stat_result: Optional[os.stat_result] = None) -> str:
+    """ETag fuerte: el hash del contenido, o tamaño y fecha para archivos antiguos."""
+    if sha256:
+        return f'"{sha256}"'
+    return f'"{stat_result.st_size:x}-{int(stat_result.st_mtime):x}"'
+
+
+def accel_redirect_path(file_path: str) -> str:
+    relative = (BASE_DIR / file_path).relative_to(UPLOADS_DIR).as_posix()
+    return DOWNLOAD_ACCEL_REDIRECT.rstrip('/') + '/' + quote(relative)
+
+
+def create_download_token(db_file: models.ActivityFile):
+    """Token firmado para `GET /files/download`; devuelve (token, vence)."""
+    expires_at = datetime.datetime.utcnow() + datetime.timedelta(seconds=DOWNLOAD_URL_TTL_SECONDS)
+    token = jwt.encode({
+        "scope": "download",
+        "fid": db_file.id,
+        "path": db_file.file_path,
+        "name": db_file.filename,
+        "type": db_file.file_type,
+        "sha256": db_file.sha256,
+        "exp": expires_at,
+    }, SECRET_KEY, algorithm=ALGORITHM)
+    return token, expires_at
+
+
+def read_download_token(token: str) -> Optional[dict]:
+    """Contenido del token o None si es inválido, venció o no es de descarga."""
+    try:
+        payload = jwt.decode(token, SECRET_KEY, algorithms=[ALGORITHM])
+    except JWTError:
+        return None
+    return payload if payload.get("scope") == "download" else None
@@ -0,0 +1,202 @@
+"""Subidas reanudables por partes para adjuntos grandes.
+
+Protocolo:
+1. `POST /activities/{id}/uploads` crea la sesión: el servidor fija el tamaño
+   de parte y reserva `uploads/tmp/upload_<id>` con el tamaño final.
+2. `PUT /uploads/{id}/chunks/{n}` recibe la parte n en streaming a un archivo
+   propio y la copia al offset n * chunk_size solo si la sesión sigue abierta
+   (410 si venció, se canceló o se está finalizando). Las partes pueden llegar en
+   cualquier orden y en paralelo; cada una recibida queda en `upload_chunks`, así
+   que tras un corte basta con consultar `GET /uploads/{id}` y reenviar las que faltan.
+3. `POST /uploads/{id}/complete` verifica que estén todas, calcula el SHA-256,
+   mueve el archivo al almacenamiento por contenido y crea el ActivityFile en la
+   misma transacción que borra la sesión.
+
+Las sesiones sin completar vencen a las UPLOAD_SESSION_TTL_HOURS y se limpian
+al crear otras.
+"""
+import datetime
+import math
+import os
+import uuid
+
+from sqlalchemy import delete, update
+from sqlalchemy.orm import Session
+
+from . import crud, models, storage
+
+UPLOAD_CHUNK_SIZE = int(os.getenv("UPLOAD_CHUNK_SIZE", str(8 * 1024 * 1024)))
+UPLOAD_MAX_SIZE = int(os.getenv("UPLOAD_MAX_SIZE", str(2 * 1024 ** 3)))
+UPLOAD_SESSION_TTL_HOURS = int(os.getenv("UPLOAD_SESSION_TTL_HOURS", "24"))
+
+
+class UploadError(ValueError):
+    """La parte o la finalización no son válidas para el estado de la subida."""
+
+
+class UploadClosed(UploadError):
+    """La sesión venció, se está finalizando o se canceló mientras llegaba una parte."""
+
+
+def total_chunks(upload: models.UploadSession) -> int:
+    return math.ceil(upload.total_size / upload.chunk_size)
+
+
+def chunk_span(upload: models.UploadSession, index: int):
+    """(offset, tamaño esperado) de la parte `index`."""
+    if not 0 <= index < total_chunks(upload):
+        raise UploadError(f"Parte fuera de rango: use 0..{total_chunks(upload) - 1}")
+    offset = index * upload.chunk_size
+    return offset, min(upload.chunk_size, upload.total_size - offset)
+
+
+def received_chunks(db: Session, upload_id: str) -> list:
+    return [row[0] for row in db.query(models.UploadChunk.chunk_index).filter(
+        models.UploadChunk.upload_id == upload_id
+    ).order_by(models.UploadChunk.chunk_index).all()]
+
+
+def upload_out(db: Session, upload: models.UploadSession) -> dict:
+    return {
+        "upload_id": upload.id,
+        "activity_id": upload.activity_id,
+        "filename": upload.filename,
+        "total_size": upload.total_size,
+        "chunk_size": upload.chunk_size,
+        "total_chunks": total_chunks(upload),
+        "received": received_chunks(db, upload.id),
+        "expires_at": upload.expires_at,
+    }
+
+
+def purge_expired_uploads(db: Session) -> int:
+    expired = [row[0] for row in db.query(models.UploadSession.id).filter(
+        models.UploadSession.expires_at < datetime.datetime.utcnow()
+    ).all()]
+    if not expired:
+        return 0
+    db.execute(delete(models.UploadChunk).where(models.UploadChunk.upload_id.in_(expired)))
+    db.execute(delete(models.UploadSession).where(models.UploadSession.id.in_(expired)))
+    db.commit()
+    for upload_id in expired:
+        storage.discard_upload(upload_id)
+    return len(expired)
+
+
+def create_upload(db: Session, activity_id: int, current_user: models.User, filename: str, file_type: str, total_size: int):
+    """Crea la sesión (None si no hay acceso a la actividad)."""
+    if total_size > UPLOAD_MAX_SIZE:
+        raise UploadError(f"El archivo supera el máximo de {UPLOAD_MAX_SIZE} bytes")
+    if not crud.get_accessible_activity(db, activity_id, current_user):
+        return None
+    purge_expired_uploads(db)
+    upload = models.UploadSession(
+        id=uuid.uuid4().hex,
+        activity_id=activity_id,
+        created_by=current_user.id,
+        filename=filename,
+        file_type=file_type,
+        total_size=total_size,
+        chunk_size=UPLOAD_CHUNK_SIZE,
+        expires_at=datetime.datetime.utcnow() + datetime.timedelta(hours=UPLOAD_SESSION_TTL_HOURS),
+    )
+    storage.allocate_upload(upload.id, total_size)
+    db.add(upload)
+    db.commit()
+    return upload
+
+
+def get_upload(db: Session, upload_id: str, current_user: models.User):
+    """Sesión abierta y vigente del usuario, o None."""
+    return db.query(models.UploadSession).filter(
+        models.UploadSession.id == upload_id,
+        models.UploadSession.created_by == current_user.id,
+        models.UploadSession.status == "open",
+        models.UploadSession.expires_at >= datetime.datetime.utcnow(),
+    ).first()
+
+
+def record_chunk(db: Session, upload: models.UploadSession, index: int, part_path, size: int):
+    """Pone la parte en su offset y la registra, solo si la sesión sigue abierta (bloqueante).
+
+    El UPDATE sobre la sesión la bloquea hasta el commit: `complete_upload` (que la pasa
+    a "finalizing"), la cancelación y la limpieza por vencimiento esperan, así que nunca
+    se escriben bytes en un archivo que ya se está hasheando o se borró.
+    """
+    offset, _ = chunk_span(upload, index)
+    locked = db.execute(
+        update(models.UploadSession)
+        .where(
+            models.UploadSession.id == upload.id,
+            models.UploadSession.status == "open",
+            models.UploadSession.expires_at >= datetime.datetime.utcnow(),
+        )
+        .values(status="open")
+    ).rowcount
+    if not locked:
+        db.rollback()
+        raise UploadClosed("La subida ya no está abierta (vencida, finalizada o cancelada)")
+    try:
+        storage.place_chunk(upload.id, part_path, offset)
+        already = db.query(models.UploadChunk.id).filter(
+            models.UploadChunk.upload_id == upload.id, models.UploadChunk.chunk_index == index
+        ).first()
+        # Reintento de una parte ya recibida: los bytes se sobrescribieron, la fila ya está
+        if not already:
+            db.add(models.UploadChunk(upload_id=upload.id, chunk_index=index, size=size))
+        db.commit()
+    except Exception:
+        db.rollback()
+        raise
+
+
+def complete_upload(db: Session, upload: models.UploadSession, current_user: models.User):
+    """Arma el ActivityFile (bloqueante: hashea el archivo). Devuelve None si ya no hay acceso."""
+    claimed = db.execute(
+        update(models.UploadSession)
+        .where(models.UploadSession.id == upload.id, models.UploadSession.status == "open")
+        .values(status="finalizing")
+    ).rowcount
+    db.commit()
+    if not claimed:
+        raise UploadError("La subida ya se está finalizando")
+
+    missing = sorted(set(range(total_chunks(upload))) - set(received_chunks(db, upload.id)))
+    if missing:
+        db.execute(update(models.UploadSession).where(models.UploadSession.id == upload.id).values(status="open"))
+        db.commit()
+        raise UploadError(f"Faltan {len(missing)} partes: {missing[:20]}")
+
+    try:
+        stored = storage.store_assembled(upload.id)
+    except Exception:
+        abort_upload(db, upload)
+        raise
+    info = {
+        "filename": upload.filename,
+        "file_type": upload.file_type,
+        "uploaded_by": current_user.username,
+        **stored,
+    }
+    # La sesión se borra en el mismo commit que crea el ActivityFile
+    db.execute(delete(models.UploadChunk).where(models.UploadChunk.upload_id == upload.id))
+    db.execute(delete(models.UploadSession).where(models.UploadSession.id == upload.id))
+    try:
+        db_file = crud.create_activity_file(db, upload.activity_id, current_user, info)
+    except Exception:
+        db.rollback()
+        abort_upload(db, upload)
+        storage.release_object(db, stored["sha256"], stored["file_path"])
+        raise
+    if not db_file:
+        db.rollback()
+        abort_upload(db, upload)
+        storage.release_object(db, stored["sha256"], stored["file_path"])
+    return db_file
+
+
+def abort_upload(db: Session, upload: models.UploadSession):
+    db.execute(delete(models.UploadChunk).where(models.UploadChunk.upload_id == upload.id))
+    db.execute(delete(models.UploadSession).where(models.UploadSession.id == upload.id))
+    db.commit()
+    storage.discard_upload(upload.id)
@@ -0,0 +1,149 @@
+"""Entrega de webhooks en segundo plano.
+
+Las requests solo encolan la entrega; un hilo dedicado con su propio event loop
+envía los POST con un cliente httpx compartido (pool de conexiones), con
+concurrencia acotada, reintentos con backoff y registro en `webhook_dead_letters`
+cuando se agotan los intentos. Las entregas a un mismo webhook salen en orden.
+"""
+import asyncio
+import datetime
+import json
+import os
+import threading
+from typing import Optional
+
+import httpx
+
+from . import models
+from .database import SessionLocal
+from .logging_config import logger
+
+WEBHOOK_TIMEOUT_SECONDS = float(os.getenv("WEBHOOK_TIMEOUT_SECONDS", "5"))
+WEBHOOK_MAX_CONCURRENCY = int(os.getenv("WEBHOOK_MAX_CONCURRENCY", "10"))
+WEBHOOK_MAX_ATTEMPTS = int(os.getenv("WEBHOOK_MAX_ATTEMPTS", "4"))
+WEBHOOK_BACKOFF_SECONDS = float(os.getenv("WEBHOOK_BACKOFF_SECONDS", "1"))
+
+
+class WebhookDispatcher:
+    def __init__(self, max_concurrency: int = WEBHOOK_MAX_CONCURRENCY, max_attempts: int = WEBHOOK_MAX_ATTEMPTS,
+                 backoff_seconds: float = WEBHOOK_BACKOFF_SECONDS, timeout: float = WEBHOOK_TIMEOUT_SECONDS):
+        self.max_concurrency = max_concurrency
+        self.max_attempts = max_attempts
+        self.backoff_seconds = backoff_seconds
+        self.timeout = timeout
+        self._loop: Optional[asyncio.AbstractEventLoop] = None
+        self._thread: Optional[threading.Thread] = None
+        self._ready = threading.Event()
+        self._start_lock = threading.Lock()
+        self._pending: set = set()
+
+    def start(self):
+        with self._start_lock:
+            if not (self._thread and self._thread.is_alive()):
+                self._ready.clear()
+                self._thread = threading.Thread(target=self._run, name="webhook-dispatcher", daemon=True)
+                self._thread.start()
+        # También si el hilo ya existía: otro hilo pudo arrancarlo y aún no crear el loop
+        self._ready.wait()
+
+    def _run(self):
+        self._loop = asyncio.new_event_loop()
+        asyncio.set_event_loop(self._loop)
+        self._semaphore = asyncio.Semaphore(self.max_concurrency)
+        self._tails: dict = {}
+        self._client = httpx.AsyncClient(
+            timeout=self.timeout,
+            limits=httpx.Limits(max_connections=self.max_concurrency)
+        )
+        self._ready.set()
+        try:
+            self._loop.run_forever()
+        finally:
+            self._loop.run_until_complete(self._client.aclose())
+            self._loop.close()
+
+    def enqueue(self, webhook_id: int, url: str, payload: dict):
+        """Encola una entrega; se puede llamar desde cualquier hilo y no bloquea."""
+        self.start()
+        self._loop.call_soon_threadsafe(self._schedule, webhook_id, url, payload)
+
+    def _schedule(self, webhook_id: int, url: str, payload: dict):
+        # Encadena cada entrega tras la anterior del mismo webhook para conservar el orden
+        previous = self._tails.get(webhook_id)
+        task = self._loop.create_task(self._deliver_after(previous, webhook_id, url, payload))
+        self._tails[webhook_id] = task
+        self._pending.add(task)
+
+        def _done(t):
+            self._pending.discard(t)
+            if self._tails.get(webhook_id) is t:
+                del self._tails[webhook_id]
+        task.add_done_callback(_done)
+
+    async def _deliver_after(self, previous, webhook_id: int, url: str, payload: dict):
+        if previous is not None:
+            await asyncio.wait([previous])
+        await self._deliver(webhook_id, url, payload)
+
+    async def _deliver(self, webhook_id: int, url: str, payload: dict):
+        last_error = None
+        for attempt in range(1, self.max_attempts + 1):
+            try:
+                async with self._semaphore:
+                    response = await self._client.post(url, json=payload)
+                if response.status_code < 500:
+                    if response.status_code >= 400:
+                        logger.warning(f"Webhook {url} rechazó la entrega: HTTP {response.status_code}")
+                    return
+                last_error = f"HTTP {response.status_code}"
+            except Exception as e:
+                # No solo httpx.HTTPError: una URL mal registrada (InvalidURL) o un payload
+                # que no se puede serializar también deben terminar en dead letter
+                last_error = f"{e.__class__.__name__}: {e}" if str(e) else e.__class__.__name__
+                logger.warning(f"Webhook {url} intento {attempt}/{self.max_attempts} falló: {last_error}")
+            if attempt < self.max_attempts:
+                await asyncio.sleep(self.backoff_seconds * 2 ** (attempt - 1))
+        logger.error(f"Webhook {url} agotó {self.max_attempts} intentos: {last_error}")
+        await asyncio.to_thread(_record_dead_letter, webhook_id, url, payload, self.max_attempts, last_error)
+
+    def drain(self, timeout: float = None):
+        """Espera a que terminen las entregas pendientes (útil al apagar)."""
+        if not self._loop or not self._thread.is_alive():
+            return
+
+        async def _wait():
+            while self._pending:
+                await asyncio.wait(list(self._pending))
+        asyncio.run_coroutine_threadsafe(_wait(), self._loop).result(timeout)
+
+    def stop(self, timeout: float = None):
+        if not self._loop or not self._thread.is_alive():
+            return
+        try:
+            self.drain(timeout)
+        finally:
+            self._loop.call_soon_threadsafe(self._loop.stop)
+            self._thread.join(timeout)
+
+
+def _record_dead_letter(webhook_id: int, url: str, payload: dict, attempts: int, last_error: str):
+    db = SessionLocal()
+    try:
+        db.add(models.WebhookDeadLetter(
+            webhook_id=webhook_id,
+            url=url,
+            event=payload.get('event'),
+            # El fallo pudo ser justamente serializar el payload: se guarda una copia segura
+            payload=json.loads(json.dumps(payload, default=str)),
+            attempts=attempts,
+            last_error=last_error,
+            failed_at=datetime.datetime.utcnow()
+        ))
+        db.commit()
+    except Exception as e:
+        logger.error(f"No se pudo registrar el webhook fallido {url}: {e}")
+    finally:
+        db.close()
+
+
+dispatcher = WebhookDispatcher()
@@ -0,0 +1,183 @@
+"""
+Benchmark de las consultas de acceso y alcance antes y después de migration_indices.sql
+
+Crea una base SQLite temporal con datos sintéticos (por defecto 100k actividades),
+ejecuta las consultas calientes sin los índices nuevos, aplica la migración y
+vuelve a medir. Muestra el plan de consulta (EXPLAIN QUERY PLAN) y el tiempo
+medio de cada una.
+
+Uso:
+    python benchmark_indices.py
+    python benchmark_indices.py --activities 20000 --repeat 50
+"""
+
+import argparse
+import os
+import random
+import sys
+import tempfile
+import time
+from datetime import datetime, timedelta
+from pathlib import Path
+
+BASE_DIR = Path(__file__).resolve().parent
+
+NEW_INDEXES = [
+    "uq_activity_access_activity_user",
+    "ix_activity_access_user_activity",
+    "ix_activities_owner_id",
+    "ix_activities_due_date",
+    "ix_activities_status_timestamp",
+    "ix_activities_timestamp_id",
+    "ix_activity_history_activity_timestamp",
+]
+
+
+def seed(engine, models, n_activities, n_users):
+    rnd = random.Random(42)
+    now = datetime.utcnow()
+    statuses = ["En Curso", "Completada", "Cancelada"]
+    with engine.begin() as conn:
+        conn.execute(models.Indicator.__table__.insert(), [
+            {"id": i, "name": f"Indicador {i}"} for i in range(1, 7)
+        ])
+        conn.execute(models.User.__table__.insert(), [
+            {"id": i, "username": f"user{i}", "role": "Admin" if i == 1 else "collaborator", "hashed_password": "x"}
+            for i in range(1, n_users + 1)
+        ])
+        conn.execute(models.Activity.__table__.insert(), [
+            {
+                "id": i,
+                "title": f"Actividad {i}",
+                "status": rnd.choice(statuses),
+                "owner_id": rnd.randint(1, n_users),
+                "indicator_id": rnd.randint(1, 6),
+                "timestamp": now - timedelta(minutes=rnd.randint(0, 525600)),
+                "updated_at": now,
+                "due_date": now + timedelta(hours=rnd.randint(-2000, 2000)),
+            }
+            for i in range(1, n_activities + 1)
+        ])
+        conn.execute(models.ActivityAccess.__table__.insert(), [
+            {"activity_id": rnd.randint(1, n_activities), "user_id": rnd.randint(2, n_users)}
+            for _ in range(n_activities)
+        ])
+        conn.execute(models.ActivityChangeset.__table__.insert(), [
+            {
+                "activity_id": rnd.randint(1, n_activities),
+                "changed_by": "user1",
+                "fields": "|status|",
+                "changes": {"status": ["En Curso", "Completada"]},
+                "timestamp": now - timedelta(minutes=rnd.randint(0, 525600)),
+            }
+            for _ in range(n_activities * 2)
+        ])
+
+
+def build_cases(crud, models, db, n_activities):
+    admin = db.query(models.User).filter(models.User.id == 1).first()
+    collaborator = db.query(models.User).filter(models.User.id == 2).first()
+    target = n_activities // 2
+    return [
+        ("has_activity_access", lambda: crud.has_activity_access(db, target, collaborator.id)),
+        ("get_accessible_activity", lambda: (db.info.clear(), crud.get_accessible_activity(db, target, collaborator))),
+        ("list_activities (colaborador)", lambda: crud.list_activities(db, collaborator, per_page=20)),
+        ("get_due_activities (colaborador)", lambda: crud.get_due_activities(db, collaborator, within_hours=72)),
+        ("get_activity_history (admin)", lambda: (db.info.clear(), crud.get_activity_history(db, target, admin))),
+    ]
+
+
+def capture_plans(engine, db, cases):
+    """Ejecuta cada caso una vez y devuelve los planes de las sentencias emitidas."""
+    from sqlalchemy import event
+    statements = []
+
+    def _before(conn, cursor, statement, parameters, context, executemany):
+        if not statement.startswith("EXPLAIN"):
+            statements.append((statement, parameters))
+
+    plans = {}
+    event.listen(engine, "before_cursor_execute", _before)
+    try:
+        for name, fn in cases:
+            statements.clear()
+            fn()
+            db.expunge_all()
+            plans[name] = list(statements)
+    finally:
+        event.remove(engine, "before_cursor_execute", _before)
+    with engine.connect() as conn:
+        for name, stmts in plans.items():
+            plans[name] = [
+                row[-1] for stmt, params in stmts
+                for row in conn.exec_driver_sql("EXPLAIN QUERY PLAN " + stmt, params).fetchall()
+            ]
+    return plans
+
+
+def measure(db, cases, repeat, budget_seconds):
+    """Tiempo medio (ms) por caso; corta antes de `repeat` si supera el presupuesto."""
+    timings = {}
+    for name, fn in cases:
+        runs = 0
+        start = time.perf_counter()
+        while runs < repeat:
+            fn()
+            db.expunge_all()
+            runs += 1
+            if time.perf_counter() - start > budget_seconds:
+                break
+        timings[name] = (time.perf_counter() - start) / runs * 1000
+    return timings
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark de índices de acceso/alcance (SQLite temporal)")
+    parser.add_argument("--activities", type=int, default=100_000, help="Número de actividades a generar")
+    parser.add_argument("--users", type=int, default=1_000, help="Número de usuarios a generar")
+    parser.add_argument("--repeat", type=int, default=20, help="Repeticiones por consulta")
+    parser.add_argument("--budget", type=float, default=10, help="Segundos máximos de medición por consulta")
+    args = parser.parse_args()
+
+    workdir = tempfile.mkdtemp(prefix="bench_indices_")
+    os.environ["DATABASE_URL"] = f"sqlite:///{workdir}/bench.db"
+    sys.path.insert(0, str(BASE_DIR))
+    from sqlalchemy import text
+    from app.database import Base, SessionLocal, engine
+    from app import crud, models
+
+    print(f"Generando {args.activities} actividades en {workdir} ...")
+    Base.metadata.create_all(bind=engine)
+    with engine.begin() as conn:
+        for name in NEW_INDEXES:
+            conn.execute(text(f"DROP INDEX IF EXISTS {name}"))
+    seed(engine, models, args.activities, args.users)
+    with engine.begin() as conn:
+        conn.execute(text("ANALYZE"))
+
+    results = {}
+    for phase in ("antes", "despues"):
+        if phase == "despues":
+            sql = (BASE_DIR / "migration_indices.sql").read_text(encoding="utf-8")
+            with engine.begin() as conn:
+                conn.connection.executescript(sql)
+        with SessionLocal() as db:
+            cases = build_cases(crud, models, db, args.activities)
+            plans = capture_plans(engine, db, cases)
+            timings = measure(db, cases, args.repeat, args.budget)
+        results[phase] = (plans, timings)
+
+    print("\n" + "=" * 80)
+    for name in results["antes"][1]:
+        before_ms = results["antes"][1][name]
+        after_ms = results["despues"][1][name]
+        print(f"{name}")
+        print(f"   antes:   {before_ms:8.2f} ms   | después: {after_ms:8.2f} ms   ({before_ms / after_ms if after_ms else 0:.1f}x)")
+        for phase in ("antes", "despues"):
+            for line in results[phase][0][name]:
+                print(f"   [{phase}] {line}")
+        print("-" * 80)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,53 @@
+"""
+Benchmark de throughput de login (verificación de contraseñas)
+
+Simula ráfagas de logins concurrentes verificando contraseñas con el servicio
+de `app/hashing.py`, primero en los hilos (como antes) y luego en el pool de
+procesos, y muestra logins por segundo.
+
+Uso:
+    python benchmark_login.py
+    python benchmark_login.py --logins 400 --threads 40 --workers 4 --rounds 29000
+"""
+
+import argparse
+import os
+import sys
+import time
+from concurrent.futures import ThreadPoolExecutor
+from pathlib import Path
+
+
+def run(label, verify, hashed, logins, threads):
+    start = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=threads) as executor:
+        results = list(executor.map(lambda _: verify("secreto123", hashed), range(logins)))
+    elapsed = time.perf_counter() - start
+    assert all(ok for ok, _ in results)
+    print(f"{label:<28} {logins / elapsed:8.1f} logins/s   ({elapsed:.2f} s)")
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark de throughput de login")
+    parser.add_argument("--logins", type=int, default=200, help="Logins a simular")
+    parser.add_argument("--threads", type=int, default=40, help="Hilos concurrentes (como el threadpool de Starlette)")
+    parser.add_argument("--workers", type=int, default=os.cpu_count() or 1, help="Procesos del pool de hashing")
+    parser.add_argument("--rounds", type=int, default=29000, help="Rondas de pbkdf2_sha256")
+    args = parser.parse_args()
+
+    os.environ["PASSWORD_HASH_WORKERS"] = str(args.workers)
+    os.environ["PASSWORD_HASH_ROUNDS"] = str(args.rounds)
+    sys.path.insert(0, str(Path(__file__).resolve().parent))
+    from app import hashing
+
+    hashed = hashing.hash_password_inline("secreto123")
+    print(f"pbkdf2_sha256 con {args.rounds} rondas, {args.logins} logins, {args.threads} hilos")
+    print("=" * 70)
+    run("En hilos (sin pool)", hashing.verify_and_update_inline, hashed, args.logins, args.threads)
+    hashing.verify_and_update("secreto123", hashed)  # arrancar el pool antes de medir
+    run(f"Pool de {args.workers} procesos", hashing.verify_and_update, hashed, args.logins, args.threads)
+    hashing.shutdown()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,162 @@
+"""
+Benchmark de concurrencia sobre SQLite: modo por defecto vs SQLITE_PRODUCTION_MODE
+
+Crea una base SQLite temporal, lanza hilos lectores (list_activities) y hilos
+escritores (cambio de estado + historial + commit) durante unos segundos y cuenta
+operaciones completadas y errores "database is locked". Cada modo corre en un
+proceso aparte porque la configuración del engine se lee al importar app.database.
+
+Uso:
+    python benchmark_sqlite.py
+    python benchmark_sqlite.py --readers 8 --writers 4 --seconds 10
+"""
+
+import argparse
+import json
+import os
+import random
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+from datetime import datetime
+from pathlib import Path
+
+BASE_DIR = Path(__file__).resolve().parent
+
+
+def seed(engine, models, n_activities, n_users):
+    now = datetime.utcnow()
+    rnd = random.Random(42)
+    with engine.begin() as conn:
+        conn.execute(models.Indicator.__table__.insert(), [
+            {"id": i, "name": f"Indicador {i}"} for i in range(1, 7)
+        ])
+        conn.execute(models.User.__table__.insert(), [
+            {"id": i, "username": f"user{i}", "role": "Admin" if i == 1 else "collaborator", "hashed_password": "x"}
+            for i in range(1, n_users + 1)
+        ])
+        conn.execute(models.Activity.__table__.insert(), [
+            {
+                "id": i,
+                "title": f"Actividad {i}",
+                "status": "En Curso",
+                "owner_id": rnd.randint(1, n_users),
+                "indicator_id": rnd.randint(1, 6),
+                "timestamp": now,
+                "updated_at": now,
+            }
+            for i in range(1, n_activities + 1)
+        ])
+
+
+def run_mode(args):
+    """Corre dentro del subproceso: mide un modo y devuelve el resultado en JSON."""
+    sys.path.insert(0, str(BASE_DIR))
+    from sqlalchemy.exc import OperationalError
+    from app.database import Base, SessionLocal, engine, SQLITE_PRODUCTION_MODE
+    from app import crud, models, schemas
+
+    Base.metadata.create_all(bind=engine)
+    seed(engine, models, args.activities, args.users)
+
+    stop = threading.Event()
+    counters = {"reads": 0, "writes": 0, "locked": 0}
+    write_latencies = []
+    lock = threading.Lock()
+
+    def reader():
+        rnd = random.Random()
+        while not stop.is_set():
+            with SessionLocal() as db:
+                user = db.get(models.User, rnd.randint(1, args.users))
+                try:
+                    crud.list_activities(db, user, per_page=20)
+                    with lock:
+                        counters["reads"] += 1
+                except OperationalError:
+                    with lock:
+                        counters["locked"] += 1
+
+    def writer():
+        rnd = random.Random()
+        admin_id = 1
+        while not stop.is_set():
+            start = time.perf_counter()
+            with SessionLocal() as db:
+                admin = db.get(models.User, admin_id)
+                activity_id = rnd.randint(1, args.activities)
+                status = rnd.choice(["En Curso", "Completada"])
+                try:
+                    crud.update_activity(db, activity_id, admin, schemas.ActivityUpdate(status=status))
+                    with lock:
+                        counters["writes"] += 1
+                        write_latencies.append(time.perf_counter() - start)
+                except OperationalError:
+                    db.rollback()
+                    with lock:
+                        counters["locked"] += 1
+
+    threads = [threading.Thread(target=reader) for _ in range(args.readers)]
+    threads += [threading.Thread(target=writer) for _ in range(args.writers)]
+    for t in threads:
+        t.start()
+    time.sleep(args.seconds)
+    stop.set()
+    for t in threads:
+        t.join()
+
+    write_latencies.sort()
+    p95 = write_latencies[int(len(write_latencies) * 0.95)] * 1000 if write_latencies else 0.0
+    print(json.dumps({
+        "production_mode": SQLITE_PRODUCTION_MODE,
+        "reads_per_s": counters["reads"] / args.seconds,
+        "writes_per_s": counters["writes"] / args.seconds,
+        "locked_errors": counters["locked"],
+        "write_p95_ms": p95,
+    }))
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark de concurrencia SQLite (modo por defecto vs producción)")
+    parser.add_argument("--activities", type=int, default=5_000, help="Número de actividades a generar")
+    parser.add_argument("--users", type=int, default=50, help="Número de usuarios a generar")
+    parser.add_argument("--readers", type=int, default=8, help="Hilos lectores")
+    parser.add_argument("--writers", type=int, default=4, help="Hilos escritores")
+    parser.add_argument("--seconds", type=float, default=10, help="Duración de cada medición")
+    parser.add_argument("--child", action="store_true", help=argparse.SUPPRESS)
+    args = parser.parse_args()
+
+    if args.child:
+        run_mode(args)
+        return
+
+    results = {}
+    for mode in ("false", "true"):
+        workdir = tempfile.mkdtemp(prefix="bench_sqlite_")
+        env = dict(os.environ)
+        env.update(
+            DATABASE_URL=f"sqlite:///{workdir}/bench.db",
+            SQLITE_PRODUCTION_MODE=mode,
+        )
+        print(f"Midiendo SQLITE_PRODUCTION_MODE={mode} en {workdir} ...")
+        output = subprocess.run(
+            [sys.executable, __file__, "--child", *sys.argv[1:]],
+            env=env, capture_output=True, text=True, check=True
+        ).stdout
+        results[mode] = json.loads(output.strip().splitlines()[-1])
+
+    print("\n" + "=" * 80)
+    print(f"{'':22}{'por defecto':>16}{'producción':>16}")
+    for key, label in (
+        ("reads_per_s", "lecturas/s"),
+        ("writes_per_s", "escrituras/s"),
+        ("write_p95_ms", "p95 escritura (ms)"),
+        ("locked_errors", "errores 'locked'"),
+    ):
+        print(f"{label:22}{results['false'][key]:>16.1f}{results['true'][key]:>16.1f}")
+
+
+if __name__ == "__main__":
+    main()
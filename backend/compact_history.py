@@ -0,0 +1,40 @@
+"""
+Script para compactar y podar el historial de actividades
+
+- Convierte lo que quede en `activity_history` (formato anterior, una fila por
+  campo) en changesets de `activity_changesets` (una fila por cambio). La API
+  también lo hace al arrancar.
+- Borra los changesets más antiguos que la retención (HISTORY_RETENTION_DAYS en
+  .env o --retention-days). Con 0 no se borra nada.
+
+Uso:
+    python compact_history.py
+    python compact_history.py --retention-days 365
+"""
+
+import argparse
+import sys
+from app.database import SessionLocal, Base, engine
+from app.history import compact_legacy_history, purge_history
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Compactar y podar el historial de actividades")
+    parser.add_argument("--retention-days", type=int, default=None, help="Días de historial a conservar (0 = todo)")
+    parser.add_argument("--batch-size", type=int, default=None, help="Actividades por lote al compactar")
+    args = parser.parse_args()
+
+    Base.metadata.create_all(bind=engine)
+    with SessionLocal() as db:
+        try:
+            created = compact_legacy_history(db, batch_size=args.batch_size)
+            purged = purge_history(db, retention_days=args.retention_days)
+        except Exception as e:
+            print(f" Error: {e}")
+            sys.exit(1)
+    print(f"Changesets creados desde el formato anterior: {created}")
+    print(f"Changesets eliminados por retención: {purged}")
+
+
+if __name__ == "__main__":
+    main()
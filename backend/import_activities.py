@@ -0,0 +1,60 @@
+"""
+Script para importar actividades desde un CSV (reemplaza import_actividades_csv.sql)
+
+Columnas reconocidas (el orden no importa, tildes y mayúsculas tampoco):
+    titulo / title (obligatoria), indicador / indicator o indicator_id (obligatoria),
+    descripcion, estado, fecha_limite / due_date, responsable / assigned_to, inyectado_por
+
+Uso:
+    python import_activities.py "MAPA DE ACCIONES GDA - Hoja 1.csv" --owner admin
+    python import_activities.py actividades.csv --owner admin --dry-run
+"""
+
+import argparse
+import sys
+import time
+from app.database import SessionLocal, Base, engine
+from app import models
+from app.activity_import import import_activities, CSVImportError
+from app.search import ensure_search_index
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Importar actividades desde CSV")
+    parser.add_argument("csv_file", help="Ruta del archivo CSV")
+    parser.add_argument("--owner", required=True, help="Username del dueño de las actividades")
+    parser.add_argument("--dry-run", action="store_true", help="Solo validar, sin guardar")
+    parser.add_argument("--batch-size", type=int, default=None, help="Filas por INSERT en lote")
+    parser.add_argument("--delimiter", default=None, help="Separador (por defecto se detecta , o ;)")
+    parser.add_argument("--encoding", default="utf-8-sig", help="Codificación del archivo")
+    args = parser.parse_args()
+
+    Base.metadata.create_all(bind=engine)
+    ensure_search_index()
+    start = time.perf_counter()
+    with SessionLocal() as db:
+        owner = db.query(models.User).filter(models.User.username == args.owner).first()
+        if not owner:
+            print(f" Error: el usuario '{args.owner}' no existe")
+            sys.exit(1)
+        try:
+            with open(args.csv_file, encoding=args.encoding, newline="") as f:
+                result = import_activities(
+                    db, f, owner_id=owner.id, dry_run=args.dry_run,
+                    batch_size=args.batch_size, delimiter=args.delimiter
+                )
+        except (OSError, CSVImportError, UnicodeDecodeError) as e:
+            print(f" Error: {e}")
+            sys.exit(1)
+    elapsed = time.perf_counter() - start
+
+    for error in result["errors"]:
+        print(f"   línea {error['line']}: {error['error']}")
+    if result["error_count"] > len(result["errors"]):
+        print(f"   ... y {result['error_count'] - len(result['errors'])} errores más")
+    action = "válidas (dry-run, nada guardado)" if args.dry_run else "importadas"
+    print(f"Filas {action}: {result['imported']} | con errores: {result['error_count']} | {elapsed:.2f}s")
+
+
+if __name__ == "__main__":
+    main()
@@ -20,8 +20,8 @@ import os
 import sys
 from sqlalchemy import create_engine, text
 from sqlalchemy.orm import sessionmaker
-from passlib.context import CryptContext
 from dotenv import load_dotenv
+from app.hashing import hash_password_inline
 
 load_dotenv()
 
@@ -36,7 +36,12 @@ if DATABASE_URL.startswith("postgres://"):
 
 engine = create_engine(DATABASE_URL)
 SessionLocal = sessionmaker(bind=engine)
-pwd_context = CryptContext(schemes=["bcrypt"], deprecated="auto")
+
+# Los workers de la API guardan usuarios en caché; subir esta versión hace que la vacíen
+BUMP_USERS_VERSION = text(
+    "INSERT INTO cache_versions (name, version, updated_at) VALUES ('users', 1, CURRENT_TIMESTAMP) "
+    "ON CONFLICT (name) DO UPDATE SET version = cache_versions.version + 1, updated_at = CURRENT_TIMESTAMP"
+)
 
 
 def list_users():
@@ -68,8 +73,8 @@ def create_user(username, email, password, role="Admin"):
             print(f"Error: El usuario '{username}' ya existe")
             return False
         
-        # Hash de contraseña
-        hashed_password = pwd_context.hash(password)
+        # Hash de contraseña (mismo esquema y costo que la API)
+        hashed_password = hash_password_inline(password)
         
         # Insertar usuario
         db.execute(
@@ -104,6 +109,7 @@ def delete_user(username):
         
         # Eliminar usuario
         db.execute(text("DELETE FROM users WHERE username = :username"), {"username": username})
+        db.execute(BUMP_USERS_VERSION)
         db.commit()
         
         print(f"Usuario '{username}' eliminado exitosamente")
@@ -132,6 +138,7 @@ def promote_user(username):
             text("UPDATE users SET role = 'Admin' WHERE username = :username"),
             {"username": username}
         )
+        db.execute(BUMP_USERS_VERSION)
         db.commit()
         
         print(f"Usuario '{username}' promovido a Admin exitosamente")
@@ -0,0 +1,63 @@
+"""
+Script para pasar los adjuntos antiguos (uploads/{unix_time}_{nombre}) al
+almacenamiento por contenido (uploads/objects/ab/cd/<sha256>)
+
+Requiere la columna activity_files.sha256 (ver MIGRATION_ARCHIVOS_README.md).
+Cada lote se confirma antes de borrar los archivos antiguos, así que se puede
+interrumpir y volver a correr.
+
+Uso:
+    python migrate_uploads.py
+    python migrate_uploads.py --batch-size 100
+"""
+
+import argparse
+import os
+import sys
+from app.database import SessionLocal
+from app import models
+from app.storage import BASE_DIR, store_file
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Pasar adjuntos antiguos al almacenamiento por contenido")
+    parser.add_argument("--batch-size", type=int, default=200, help="Archivos por transacción")
+    args = parser.parse_args()
+
+    migrated = missing = 0
+    last_id = 0
+    with SessionLocal() as db:
+        while True:
+            files = db.query(models.ActivityFile).filter(
+                models.ActivityFile.sha256.is_(None),
+                models.ActivityFile.id > last_id
+            ).order_by(models.ActivityFile.id).limit(args.batch_size).all()
+            if not files:
+                break
+            last_id = files[-1].id
+            old_paths = []
+            for db_file in files:
+                old_path = BASE_DIR / db_file.file_path
+                if not old_path.exists():
+                    print(f"   falta en disco (id {db_file.id}): {db_file.file_path}")
+                    missing += 1
+                    continue
+                try:
+                    with open(old_path, "rb") as f:
+                        stored = store_file(f)
+                except OSError as e:
+                    print(f" Error: {e}")
+                    sys.exit(1)
+                db_file.sha256 = stored["sha256"]
+                db_file.file_path = stored["file_path"]
+                db_file.file_size = stored["file_size"]
+                old_paths.append(old_path)
+            db.commit()
+            for old_path in old_paths:
+                os.remove(old_path)
+            migrated += len(old_paths)
+    print(f"Archivos migrados: {migrated} | faltantes en disco: {missing}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,14 @@
+-- Migración: Archivos adjuntos guardados por contenido
+-- Fecha: 2026-10-17
+-- Descripción: Agregar el hash SHA-256 del contenido a activity_files
+
+-- 1. Columna con el hash (NULL en archivos subidos antes de esta versión)
+ALTER TABLE activity_files
+ADD COLUMN IF NOT EXISTS sha256 VARCHAR(64);
+
+-- 2. Índice para encontrar otras filas con el mismo contenido
+CREATE INDEX IF NOT EXISTS ix_activity_files_sha256
+    ON activity_files (sha256);
+
+-- Verificación (opcional):
+-- SELECT id, filename, file_path, sha256 FROM activity_files LIMIT 5;
@@ -0,0 +1,41 @@
+-- Migración: Índices para las consultas de acceso y alcance
+-- Fecha: 2026-10-17
+-- Descripción: Índices compuestos para has_activity_access / get_accessible_activity,
+--              _activity_scope_query, get_due_activities, get_activity_history y la
+--              paginación por cursor de /activities. Compatible con PostgreSQL y SQLite.
+-- Versión: 2 (la 1 es migration_indicadores.sql)
+
+-- 1. Eliminar accesos duplicados antes de crear el índice único
+DELETE FROM activity_access
+WHERE id NOT IN (
+    SELECT MIN(id) FROM activity_access GROUP BY activity_id, user_id
+);
+
+-- 2. activity_access: búsqueda por (actividad, usuario) y alcance por usuario
+CREATE UNIQUE INDEX IF NOT EXISTS uq_activity_access_activity_user
+    ON activity_access (activity_id, user_id);
+CREATE INDEX IF NOT EXISTS ix_activity_access_user_activity
+    ON activity_access (user_id, activity_id);
+
+-- 3. activities: dueño, vencimientos, filtros por estado y orden por fecha
+CREATE INDEX IF NOT EXISTS ix_activities_owner_id
+    ON activities (owner_id);
+CREATE INDEX IF NOT EXISTS ix_activities_due_date
+    ON activities (due_date);
+CREATE INDEX IF NOT EXISTS ix_activities_status_timestamp
+    ON activities (status, timestamp);
+CREATE INDEX IF NOT EXISTS ix_activities_timestamp_id
+    ON activities (timestamp, id);
+
+-- 4. activity_history: historial de una actividad ordenado por fecha
+CREATE INDEX IF NOT EXISTS ix_activity_history_activity_timestamp
+    ON activity_history (activity_id, timestamp);
+
+-- 5. Actualizar estadísticas del planificador
+ANALYZE activity_access;
+ANALYZE activities;
+ANALYZE activity_history;
+
+-- Verificación (PostgreSQL):
+-- SELECT indexname, indexdef FROM pg_indexes
+-- WHERE tablename IN ('activity_access', 'activities', 'activity_history');
@@ -0,0 +1,29 @@
+"""
+Script para recalcular la tabla de conteos `activity_rollups`
+
+Los rollups se mantienen solos al crear, editar, asignar o eliminar actividades
+desde la API. Ejecuta este script después de cargar actividades por SQL
+(p. ej. import_actividades_csv.sql) o si sospechas que los conteos se desfasaron.
+
+Uso:
+    python rebuild_rollups.py
+"""
+
+import sys
+from app.database import SessionLocal, Base, engine
+from app.rollups import rebuild_rollups
+
+
+def main():
+    Base.metadata.create_all(bind=engine)
+    with SessionLocal() as db:
+        try:
+            groups = rebuild_rollups(db)
+        except Exception as e:
+            print(f" Error: {e}")
+            sys.exit(1)
+    print(f"Rollups recalculados: {groups} grupos")
+
+
+if __name__ == "__main__":
+    main()
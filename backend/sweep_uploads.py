@@ -0,0 +1,36 @@
+"""
+Script para borrar del disco los adjuntos que ya ninguna actividad usa
+
+Al borrar un adjunto la API no borra el objeto (puede compartirlo con otras filas
+o con una subida en curso); este barrido borra los que no tienen referencias y
+no se usaron en las últimas STORAGE_SWEEP_GRACE_HOURS (o --grace-hours).
+Se puede correr con la API en marcha, p. ej. una vez al día desde cron.
+
+Uso:
+    python sweep_uploads.py
+    python sweep_uploads.py --grace-hours 48
+"""
+
+import argparse
+import sys
+from app.database import SessionLocal
+from app.storage import STORAGE_SWEEP_GRACE_HOURS, sweep_unreferenced_objects
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Borrar adjuntos sin referencias")
+    parser.add_argument("--grace-hours", type=float, default=STORAGE_SWEEP_GRACE_HOURS,
+                        help="Horas sin uso antes de borrar un objeto sin referencias")
+    args = parser.parse_args()
+
+    with SessionLocal() as db:
+        try:
+            removed = sweep_unreferenced_objects(db, grace_hours=args.grace_hours)
+        except Exception as e:
+            print(f" Error: {e}")
+            sys.exit(1)
+    print(f"Objetos sin referencias eliminados: {removed}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,40 @@
+"""Configuración común: base SQLite temporal, creada antes de importar la app."""
+import os
+import sys
+import tempfile
+from pathlib import Path
+
+import pytest
+
+_TMP_DIR = tempfile.mkdtemp(prefix="actividades-tests-")
+os.environ["DATABASE_URL"] = f"sqlite:///{_TMP_DIR}/tests.db"
+os.environ.pop("ASYNC_DATABASE_URL", None)
+os.environ.setdefault("EMAIL_TRANSPORT", "memory")
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+
+from app import catalog, models, storage  # noqa: E402
+from app.database import Base, SessionLocal, engine  # noqa: E402
+
+Base.metadata.create_all(bind=engine)
+catalog.ensure_cache_triggers()
+
+
+@pytest.fixture
+def db():
+    session = SessionLocal()
+    try:
+        yield session
+    finally:
+        session.close()
+
+
+@pytest.fixture
+def storage_dirs(tmp_path, monkeypatch):
+    """Carpetas de uploads en un directorio temporal."""
+    monkeypatch.setattr(storage, "BASE_DIR", tmp_path)
+    monkeypatch.setattr(storage, "UPLOADS_DIR", tmp_path / "uploads")
+    monkeypatch.setattr(storage, "OBJECTS_DIR", tmp_path / "uploads" / "objects")
+    monkeypatch.setattr(storage, "TMP_DIR", tmp_path / "uploads" / "tmp")
+    monkeypatch.setattr(storage, "TRASH_DIR", tmp_path / "uploads" / "trash")
+    return tmp_path
@@ -0,0 +1,73 @@
+"""La lista de actividades usa un número fijo de consultas, sin importar el tamaño de página."""
+from contextlib import contextmanager
+
+import pytest
+from sqlalchemy import event
+
+from app import crud, models, schemas
+from app.database import engine
+
+
+@contextmanager
+def count_statements():
+    statements = []
+
+    def _before(conn, cursor, statement, parameters, context, executemany):
+        statements.append(statement)
+
+    event.listen(engine, "before_cursor_execute", _before)
+    try:
+        yield statements
+    finally:
+        event.remove(engine, "before_cursor_execute", _before)
+
+
+@pytest.fixture(scope="module")
+def owners():
+    from app.database import SessionLocal
+    db = SessionLocal()
+    try:
+        admin = models.User(username="list-admin", hashed_password="x", role="Admin")
+        owner = models.User(username="list-owner", hashed_password="x", role="collaborator")
+        indicators = [models.Indicator(name=f"Lista {i}") for i in range(3)]
+        db.add_all([admin, owner, *indicators])
+        db.flush()
+        for i in range(60):
+            activity = models.Activity(title=f"Actividad {i}", owner_id=owner.id, indicator_id=indicators[i % 3].id)
+            db.add(activity)
+            db.flush()
+            db.add(models.SubActivity(activity_id=activity.id, title=f"Subtarea {i}"))
+            db.add(models.ActivityFile(activity_id=activity.id, filename=f"f{i}.txt", file_path=f"uploads/f{i}.txt"))
+        db.commit()
+        return admin.username, owner.username
+    finally:
+        db.close()
+
+
+def _list_and_serialize(db, user, per_page, cursor=None):
+    page = crud.list_activities(db, user, per_page=per_page, cursor=cursor)
+    assert len(page["items"]) == per_page
+    assert all(a.subtasks and a.files for a in page["items"])
+    schemas.PaginatedActivityOut.model_validate(page)
+    return page
+
+
+@pytest.mark.parametrize("role", ["admin", "owner"])
+@pytest.mark.parametrize("cursor_mode", [False, True])
+def test_query_count_does_not_grow_with_page_size(db, owners, role, cursor_mode):
+    username = owners[0] if role == "admin" else owners[1]
+    user = crud.get_user_by_username(db, username)
+    cursor = None
+    if cursor_mode:
+        cursor = crud.list_activities(db, user, per_page=1)["next_cursor"]
+    # Deja el catálogo de indicadores cargado, como en un worker ya en marcha
+    _list_and_serialize(db, user, per_page=5, cursor=cursor)
+
+    counts = {}
+    for per_page in (5, 50):
+        db.expire_all()
+        with count_statements() as statements:
+            _list_and_serialize(db, user, per_page=per_page, cursor=cursor)
+        counts[per_page] = len(statements)
+
+    assert counts[5] == counts[50]
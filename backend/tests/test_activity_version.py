@@ -0,0 +1,36 @@
+"""Versión de actividades para ETag: contador en cache_versions movido por triggers."""
+from app import crud, models
+
+
+def test_version_is_a_cache_versions_lookup():
+    stmt = crud._activities_version_statement(None)
+    assert [t.name for t in stmt.get_final_froms()] == ["cache_versions"]
+
+
+def test_writes_bump_the_version(db):
+    owner = models.User(username="version-owner", hashed_password="x", role="Admin")
+    other = models.User(username="version-guest", hashed_password="x")
+    indicator = models.Indicator(name="Versión")
+    db.add_all([owner, other, indicator])
+    db.commit()
+
+    versions = [crud.activities_version(db, owner)]
+
+    def bump(obj):
+        db.add(obj)
+        db.commit()
+        versions.append(crud.activities_version(db, owner))
+        assert versions[-1][1] > versions[-2][1]
+        assert versions[-1][0] is not None
+
+    activity = models.Activity(title="v", owner_id=owner.id, indicator_id=indicator.id)
+    bump(activity)
+    bump(models.SubActivity(activity_id=activity.id, title="sub"))
+    bump(models.ActivityFile(activity_id=activity.id, filename="a.txt", file_path="uploads/a.txt"))
+    bump(models.ActivityAccess(activity_id=activity.id, user_id=other.id))
+    activity.status = "Completada"
+    bump(activity)
+
+    db.delete(activity)
+    db.commit()
+    assert crud.activities_version(db, owner)[1] > versions[-1][1]
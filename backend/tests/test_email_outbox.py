@@ -0,0 +1,92 @@
+"""Reclamo de lotes del outbox: cada correo sale una sola vez aunque haya varios workers."""
+import datetime
+import threading
+
+import pytest
+
+from app import email_outbox, email_service, models
+from app.database import SessionLocal
+
+
+class _CountingTransport:
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.subjects = []
+
+    def send_batch(self, messages):
+        with self.lock:
+            self.subjects.extend(msg["Subject"] for msg in messages)
+        return [None] * len(messages)
+
+
+@pytest.fixture
+def transport():
+    previous = email_service.get_transport()
+    fake = _CountingTransport()
+    email_service.set_transport(fake)
+    try:
+        yield fake
+    finally:
+        email_service.set_transport(previous)
+
+
+@pytest.fixture
+def outbox(db):
+    db.query(models.EmailOutbox).delete()
+    db.commit()
+    yield
+    db.query(models.EmailOutbox).delete()
+    db.commit()
+
+
+def _enqueue(db, count, prefix):
+    for i in range(count):
+        email_service.enqueue_email(db, f"{prefix}{i}@example.com", f"{prefix}-{i}", "<p>hola</p>", commit=False)
+    db.commit()
+
+
+def test_second_claim_gets_nothing(db, outbox):
+    _enqueue(db, 5, "claim")
+    other = SessionLocal()
+    try:
+        first = email_outbox.claim_outbox_batch(db, batch_size=10)
+        second = email_outbox.claim_outbox_batch(other, batch_size=10)
+    finally:
+        other.close()
+
+    assert len(first) == 5
+    assert {e.status for e in first} == {"sending"}
+    assert second == []
+
+
+def test_concurrent_workers_send_each_email_once(db, outbox, transport):
+    _enqueue(db, 60, "worker")
+
+    def work():
+        session = SessionLocal()
+        try:
+            while email_outbox.process_outbox_batch(session, batch_size=7):
+                pass
+        finally:
+            session.close()
+
+    threads = [threading.Thread(target=work) for _ in range(4)]
+    for t in threads:
+        t.start()
+    for t in threads:
+        t.join()
+
+    assert sorted(transport.subjects) == sorted(f"worker-{i}" for i in range(60))
+    statuses = {row[0] for row in db.query(models.EmailOutbox.status).all()}
+    assert statuses == {"sent"}
+
+
+def test_stale_claim_is_taken_again(db, outbox, transport):
+    _enqueue(db, 1, "stale")
+    claimed = email_outbox.claim_outbox_batch(db)
+    # El worker que lo tomó murió: la toma vence
+    claimed[0].next_attempt_at = datetime.datetime.utcnow() - datetime.timedelta(seconds=1)
+    db.commit()
+
+    assert email_outbox.process_outbox_batch(db) == 1
+    assert transport.subjects == ["stale-0"]
@@ -0,0 +1,92 @@
+"""Caché de principales: un cambio de rol en otro worker vacía la caché de este."""
+from app import auth, models
+from app.database import SessionLocal
+
+
+def _current_user(db, token):
+    return auth.get_current_user(token=token, db=db)
+
+
+def test_role_change_from_other_worker_clears_cache(db, monkeypatch):
+    monkeypatch.setattr(auth, "PRINCIPAL_CACHE_CHECK_SECONDS", 0)
+    user = models.User(username="cached-principal", hashed_password="x", role="collaborator")
+    db.add(user)
+    db.commit()
+    token = auth.create_access_token({"sub": user.username})
+
+    assert _current_user(db, token).role == "collaborator"
+
+    # Otro worker: cambia el rol y sube la versión; la caché local no se toca
+    other = SessionLocal()
+    try:
+        other.query(models.User).filter(models.User.username == user.username).update({"role": "Admin"})
+        auth.bump_users_version(other)
+        other.commit()
+    finally:
+        other.close()
+
+    fresh = SessionLocal()
+    try:
+        assert _current_user(fresh, token).role == "Admin"
+    finally:
+        fresh.close()
+
+
+def test_cache_is_kept_while_version_is_unchanged(db, monkeypatch):
+    monkeypatch.setattr(auth, "PRINCIPAL_CACHE_CHECK_SECONDS", 0)
+    user = models.User(username="stable-principal", hashed_password="x", role="collaborator")
+    db.add(user)
+    db.commit()
+    token = auth.create_access_token({"sub": user.username})
+    _current_user(db, token)
+
+    # Cambio sin subir la versión (p. ej. a mano en la base): se sigue sirviendo la caché hasta el TTL
+    db.query(models.User).filter(models.User.username == user.username).update({"role": "Admin"})
+    db.commit()
+    fresh = SessionLocal()
+    try:
+        assert _current_user(fresh, token).role == "collaborator"
+    finally:
+        fresh.close()
+
+
+def test_dependency_runs_in_threadpool():
+    # Un `async def` con consultas síncronas bloquearía el event loop en cada request
+    import inspect
+    assert not inspect.iscoroutinefunction(auth.get_current_user)
+
+
+def test_concurrent_requests_check_the_version_once(monkeypatch):
+    import threading
+    from sqlalchemy import event
+    from app.database import engine
+
+    monkeypatch.setattr(auth, "PRINCIPAL_CACHE_CHECK_SECONDS", 60)
+    monkeypatch.setitem(auth._principal_state, "checked_at", None)
+    queries = []
+
+    def _before(conn, cursor, statement, parameters, context, executemany):
+        if "cache_versions" in statement:
+            queries.append(statement)
+
+    start = threading.Barrier(8)
+
+    def check():
+        session = SessionLocal()
+        try:
+            start.wait()
+            auth._sync_principal_cache(session)
+        finally:
+            session.close()
+
+    event.listen(engine, "before_cursor_execute", _before)
+    try:
+        threads = [threading.Thread(target=check) for _ in range(8)]
+        for t in threads:
+            t.start()
+        for t in threads:
+            t.join()
+    finally:
+        event.remove(engine, "before_cursor_execute", _before)
+
+    assert len(queries) == 1
@@ -0,0 +1,46 @@
+"""Recordatorios: los archivos se nombran sin adjuntarlos y los adjuntos tienen tope."""
+import datetime
+
+from app import email_service, models
+from app.reminders import run_reminder_job
+
+
+def test_digest_names_files_without_attaching_or_linking(db):
+    owner = models.User(username="reminder-owner", hashed_password="x", role="collaborator")
+    indicator = models.Indicator(name="Recordatorios")
+    db.add_all([owner, indicator])
+    db.flush()
+    activity = models.Activity(
+        title="Informe", owner_id=owner.id, indicator_id=indicator.id, assigned_email="persona@example.com",
+        due_date=datetime.datetime.utcnow() + datetime.timedelta(hours=2),
+    )
+    db.add(activity)
+    db.flush()
+    db.add(models.ActivityFile(
+        activity_id=activity.id, filename="informe <final>.pdf", file_path="uploads/objects/ab/cd/abcd",
+        sha256="abcd", file_size=3 * 1024 ** 3, file_type="application/pdf",
+    ))
+    job = models.ReminderJob(requested_by_id=owner.id, within_hours=24)
+    db.add(job)
+    db.commit()
+
+    run_reminder_job(job.id)
+
+    entry = db.query(models.EmailOutbox).filter(models.EmailOutbox.to_email == "persona@example.com").one()
+    assert entry.attachments == []
+    assert "informe &lt;final&gt;.pdf" in entry.html_content
+    # Sin tokens de descarga: el archivo se baja desde la aplicación, con sesión
+    assert "/files/download" not in entry.html_content
+
+
+def test_build_message_skips_attachments_over_the_cap(tmp_path, monkeypatch):
+    monkeypatch.setattr(email_service, "EMAIL_MAX_ATTACHMENT_BYTES", 1000)
+    small = tmp_path / "small.txt"
+    small.write_bytes(b"x" * 600)
+    big = tmp_path / "big.txt"
+    big.write_bytes(b"x" * 600)
+
+    msg = email_service.build_message("a@example.com", "s", "<p>h</p>", [str(small), [str(big), "grande.txt"]])
+
+    names = [part.get_filename() for part in msg.get_payload()[1:]]
+    assert names == ["small.txt"]
@@ -0,0 +1,22 @@
+"""Búsqueda con LIKE (sin índice): cubre los mismos campos que el documento indexado."""
+import time
+
+from app import crud, models, search
+
+
+def test_like_fallback_matches_subtask_titles(db, monkeypatch):
+    monkeypatch.setitem(search._state, "available", False)
+    admin = models.User(username=f"search-{time.time_ns()}", hashed_password="x", role="Admin")
+    indicator = models.Indicator(name=f"search-{time.time_ns()}")
+    db.add_all([admin, indicator])
+    db.flush()
+    activity = models.Activity(title="Reunión", owner_id=admin.id, indicator_id=indicator.id)
+    other = models.Activity(title="Otra", owner_id=admin.id, indicator_id=indicator.id)
+    db.add_all([activity, other])
+    db.flush()
+    db.add(models.SubActivity(activity_id=activity.id, title="Revisar Presupuestoxyz"))
+    db.commit()
+
+    page = crud.search_activities(db, admin, "presupuestoXYZ")
+
+    assert [a.id for a in page["items"]] == [activity.id]
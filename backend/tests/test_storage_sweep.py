@@ -0,0 +1,77 @@
+"""Barrido de objetos sin referencias con período de gracia."""
+import io
+import os
+import time
+
+import pytest
+
+from app import models, storage
+
+OLD = time.time() - 48 * 3600
+
+
+@pytest.fixture
+def activity(db):
+    owner = models.User(username=f"sweep-{time.time_ns()}", hashed_password="x")
+    indicator = models.Indicator(name=f"sweep-{time.time_ns()}")
+    db.add_all([owner, indicator])
+    db.flush()
+    act = models.Activity(title="sweep", owner_id=owner.id, indicator_id=indicator.id)
+    db.add(act)
+    db.commit()
+    return act
+
+
+def _store(content: bytes, age: float = None) -> dict:
+    stored = storage.store_file(io.BytesIO(content))
+    if age is not None:
+        os.utime(storage.object_path(stored["sha256"]), (age, age))
+    return stored
+
+
+def _reference(db, activity, stored):
+    db.add(models.ActivityFile(activity_id=activity.id, filename="f.txt", **stored))
+    db.commit()
+
+
+def test_sweep_removes_only_stale_unreferenced(storage_dirs, db, activity):
+    kept = _store(b"referenced", age=OLD)
+    _reference(db, activity, kept)
+    orphan = _store(b"orphan", age=OLD)
+    fresh = _store(b"fresh orphan")
+
+    assert storage.sweep_unreferenced_objects(db, grace_hours=24) == 1
+    assert storage.object_path(kept["sha256"]).exists()
+    assert not storage.object_path(orphan["sha256"]).exists()
+    assert storage.object_path(fresh["sha256"]).exists()
+
+
+def test_reused_object_survives_sweep(storage_dirs, db):
+    first = _store(b"same content", age=OLD)
+    # Otra subida del mismo contenido, con su fila aún sin confirmar
+    again = _store(b"same content")
+
+    assert again["sha256"] == first["sha256"]
+    assert storage.sweep_unreferenced_objects(db, grace_hours=24) == 0
+    assert storage.object_path(first["sha256"]).exists()
+
+
+def test_release_keeps_content_addressed_objects(storage_dirs, db):
+    stored = _store(b"shared")
+    storage.release_object(db, stored["sha256"], stored["file_path"])
+    assert storage.object_path(stored["sha256"]).exists()
+
+    legacy = storage_dirs / "uploads" / "123_old.txt"
+    legacy.write_bytes(b"legacy")
+    storage.release_object(db, None, "uploads/123_old.txt")
+    assert not legacy.exists()
+
+
+def test_interrupted_sweep_is_restored(storage_dirs, db, activity):
+    stored = _store(b"in the trash", age=OLD)
+    _reference(db, activity, stored)
+    os.makedirs(storage.TRASH_DIR)
+    os.replace(storage.object_path(stored["sha256"]), storage.TRASH_DIR / stored["sha256"])
+
+    assert storage.sweep_unreferenced_objects(db, grace_hours=24) == 0
+    assert storage.object_path(stored["sha256"]).exists()
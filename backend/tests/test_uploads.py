@@ -0,0 +1,82 @@
+"""Subidas por partes: una parte solo se escribe y registra si la sesión sigue abierta."""
+import datetime
+import hashlib
+import time
+
+import pytest
+
+from app import models, storage, uploads
+
+
+@pytest.fixture
+def session_setup(db, storage_dirs, monkeypatch):
+    monkeypatch.setattr(uploads, "UPLOAD_CHUNK_SIZE", 4)
+    owner = models.User(username=f"upload-{time.time_ns()}", hashed_password="x", role="Admin")
+    indicator = models.Indicator(name=f"upload-{time.time_ns()}")
+    db.add_all([owner, indicator])
+    db.flush()
+    activity = models.Activity(title="subida", owner_id=owner.id, indicator_id=indicator.id)
+    db.add(activity)
+    db.commit()
+    upload = uploads.create_upload(db, activity.id, owner, "datos.bin", "application/octet-stream", 10)
+    return owner, upload
+
+
+def _send(db, upload, index, data):
+    part = storage.open_chunk_part(upload.id)
+    part.write(data)
+    part.close()
+    try:
+        uploads.record_chunk(db, upload, index, part.name, len(data))
+    finally:
+        storage.discard_chunk_part(part.name)
+
+
+def _assembled(upload):
+    return storage.upload_temp_path(upload.id).read_bytes()
+
+
+def test_chunks_assemble_and_retries_are_idempotent(db, session_setup):
+    owner, upload = session_setup
+    _send(db, upload, 2, b"ij")
+    _send(db, upload, 0, b"abcd")
+    _send(db, upload, 1, b"efgh")
+    _send(db, upload, 1, b"efgh")
+
+    assert uploads.received_chunks(db, upload.id) == [0, 1, 2]
+    db_file = uploads.complete_upload(db, upload, owner)
+    assert db_file.sha256 == hashlib.sha256(b"abcdefghij").hexdigest()
+
+
+def test_chunk_after_finalizing_is_rejected_and_not_written(db, session_setup):
+    owner, upload = session_setup
+    _send(db, upload, 0, b"abcd")
+    db.query(models.UploadSession).filter(models.UploadSession.id == upload.id).update({"status": "finalizing"})
+    db.commit()
+    before = _assembled(upload)
+
+    with pytest.raises(uploads.UploadClosed):
+        _send(db, upload, 0, b"XXXX")
+    assert _assembled(upload) == before
+
+
+def test_chunk_for_deleted_session_is_rejected(db, session_setup):
+    owner, upload = session_setup
+    session_id = upload.id
+    uploads.abort_upload(db, upload)
+
+    with pytest.raises(uploads.UploadClosed):
+        _send(db, upload, 0, b"abcd")
+    assert db.query(models.UploadChunk).filter(models.UploadChunk.upload_id == session_id).count() == 0
+
+
+def test_chunk_for_expired_session_is_rejected(db, session_setup):
+    owner, upload = session_setup
+    db.query(models.UploadSession).filter(models.UploadSession.id == upload.id).update(
+        {"expires_at": datetime.datetime.utcnow() - datetime.timedelta(minutes=1)}
+    )
+    db.commit()
+
+    with pytest.raises(uploads.UploadClosed):
+        _send(db, upload, 0, b"abcd")
+    assert uploads.received_chunks(db, upload.id) == []
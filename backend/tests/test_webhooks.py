@@ -0,0 +1,136 @@
+"""Entregas del WebhookDispatcher contra un servidor HTTP local."""
+import json
+import threading
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+import pytest
+
+from app import crud, models
+from app.webhooks import WebhookDispatcher
+
+
+class _Receiver(BaseHTTPRequestHandler):
+    """/ok responde 200, /flaky 500 la primera vez y luego 200, /down siempre 500."""
+
+    def do_POST(self):
+        body = json.loads(self.rfile.read(int(self.headers["Content-Length"])))
+        server = self.server
+        with server.lock:
+            server.hits[self.path] = server.hits.get(self.path, 0) + 1
+            hits = server.hits[self.path]
+            if self.path == "/down" or (self.path == "/flaky" and hits == 1):
+                status = 500
+            else:
+                status = 200
+                server.received.setdefault(self.path, []).append(body)
+        self.send_response(status)
+        self.send_header("Content-Length", "0")
+        self.end_headers()
+
+    def log_message(self, *args):
+        pass
+
+
+@pytest.fixture
+def receiver():
+    server = ThreadingHTTPServer(("127.0.0.1", 0), _Receiver)
+    server.lock = threading.Lock()
+    server.hits = {}
+    server.received = {}
+    thread = threading.Thread(target=server.serve_forever, daemon=True)
+    thread.start()
+    try:
+        yield server, f"http://127.0.0.1:{server.server_address[1]}"
+    finally:
+        server.shutdown()
+        server.server_close()
+
+
+@pytest.fixture
+def dispatcher():
+    d = WebhookDispatcher(max_concurrency=4, max_attempts=2, backoff_seconds=0.01, timeout=5)
+    yield d
+    d.stop(timeout=10)
+
+
+def test_same_webhook_delivers_in_order(receiver, dispatcher):
+    server, base_url = receiver
+    for seq in range(30):
+        dispatcher.enqueue(1, f"{base_url}/ok", {"event": "activity_updated", "seq": seq})
+    dispatcher.drain(timeout=10)
+
+    assert [body["seq"] for body in server.received["/ok"]] == list(range(30))
+
+
+def test_retries_on_server_error(receiver, dispatcher):
+    server, base_url = receiver
+    dispatcher.enqueue(2, f"{base_url}/flaky", {"event": "activity_created", "seq": 1})
+    dispatcher.drain(timeout=10)
+
+    assert server.hits["/flaky"] == 2
+    assert server.received["/flaky"] == [{"event": "activity_created", "seq": 1}]
+
+
+def test_exhausted_attempts_go_to_dead_letters(receiver, dispatcher, db):
+    server, base_url = receiver
+    url = f"{base_url}/down"
+    dispatcher.enqueue(3, url, {"event": "activity_deleted", "seq": 7})
+    dispatcher.drain(timeout=10)
+
+    assert server.hits["/down"] == dispatcher.max_attempts
+    dead = db.query(models.WebhookDeadLetter).filter(models.WebhookDeadLetter.url == url).one()
+    assert dead.webhook_id == 3
+    assert dead.event == "activity_deleted"
+    assert dead.payload == {"event": "activity_deleted", "seq": 7}
+    assert dead.attempts == dispatcher.max_attempts
+    assert dead.last_error == "HTTP 500"
+
+
+@pytest.mark.parametrize("url, payload", [
+    ("no es una url", {"event": "activity_updated", "seq": 1}),
+    ("ftp://127.0.0.1/hook", {"event": "activity_updated", "seq": 2}),
+    (None, {"event": "activity_updated", "seq": 3, "when": object()}),
+])
+def test_non_http_errors_are_dead_lettered(receiver, dispatcher, db, url, payload):
+    server, base_url = receiver
+    url = url or f"{base_url}/ok"
+    dispatcher.enqueue(5, url, payload)
+    dispatcher.drain(timeout=10)
+
+    dead = db.query(models.WebhookDeadLetter).filter(
+        models.WebhookDeadLetter.webhook_id == 5, models.WebhookDeadLetter.url == url
+    ).order_by(models.WebhookDeadLetter.id.desc()).first()
+    assert dead is not None
+    assert dead.attempts == dispatcher.max_attempts
+    assert "/ok" not in server.received
+
+
+def test_enqueue_from_many_threads_waits_for_loop(receiver, dispatcher):
+    server, base_url = receiver
+    threads = [
+        threading.Thread(target=dispatcher.enqueue, args=(4, f"{base_url}/ok", {"event": "x", "seq": i}))
+        for i in range(8)
+    ]
+    for t in threads:
+        t.start()
+    for t in threads:
+        t.join()
+    dispatcher.drain(timeout=10)
+
+    assert sorted(body["seq"] for body in server.received["/ok"]) == list(range(8))
+
+
+def test_bulk_events_reach_activity_updated_subscribers(db):
+    owner = models.User(username="webhook-owner", hashed_password="x")
+    db.add(owner)
+    db.flush()
+    for event in ("*", "activity_updated", "activity_created", "activities_bulk_assigned"):
+        db.add(models.Webhook(owner_id=owner.id, url=f"http://hooks.test/{event}", event=event, active=True))
+    db.commit()
+
+    def subscribed(event):
+        return sorted(w.event for w in crud.get_webhooks_for_event(db, owner.id, event))
+
+    assert subscribed("activity_updated") == ["*", "activity_updated"]
+    assert subscribed("activities_bulk_updated") == ["*", "activity_updated"]
+    assert subscribed("activities_bulk_assigned") == ["*", "activities_bulk_assigned", "activity_updated"]
@@ -102,11 +102,14 @@ export async function deleteActivity(token, activityId){
   return await res.json()
 }
 
-export async function getActivityHistory(token, activityId){
-  const res = await fetch(`${API_BASE}/activities/${activityId}/history`, {
+export async function getActivityHistory(token, activityId, cursor = null, perPage = 50){
+  const params = new URLSearchParams()
+  if(cursor) params.append('cursor', cursor)
+  params.append('per_page', perPage)
+  const res = await fetch(`${API_BASE}/activities/${activityId}/history?${params.toString()}`, {
     headers: { Authorization: `Bearer ${token}` }
   })
-  if(!res.ok) return []
+  if(!res.ok) return { items: [], has_more: false }
   return await res.json()
 }
 
@@ -173,7 +176,44 @@ export async function deleteWebhook(token, webhookId){
   return await res.json()
 }
 
+// Archivos grandes: subida reanudable por partes (ver backend/app/uploads.py)
+const RESUMABLE_UPLOAD_THRESHOLD = 8 * 1024 * 1024
+const PARALLEL_CHUNKS = 3
+const CHUNK_RETRIES = 3
+
+export async function uploadActivityFileResumable(token, activityId, file){
+  const auth = { Authorization: `Bearer ${token}` }
+  const res = await fetch(`${API_BASE}/activities/${activityId}/uploads`, {
+    method: 'POST', headers: { ...auth, 'Content-Type': 'application/json' },
+    body: JSON.stringify({ filename: file.name, file_type: file.type || null, total_size: file.size })
+  })
+  if(!res.ok) throw new Error('Upload failed')
+  const upload = await res.json()
+  const pending = [...Array(upload.total_chunks).keys()].filter(i => !upload.received.includes(i))
+
+  async function sendChunks(){
+    while(pending.length){
+      const index = pending.shift()
+      const start = index * upload.chunk_size
+      const body = file.slice(start, start + upload.chunk_size)
+      for(let attempt = 1; ; attempt++){
+        const r = await fetch(`${API_BASE}/uploads/${upload.upload_id}/chunks/${index}`, {
+          method: 'PUT', headers: auth, body
+        }).catch(() => null)
+        if(r && r.ok) break
+        if(attempt >= CHUNK_RETRIES) throw new Error('Upload failed')
+      }
+    }
+  }
+  await Promise.all([...Array(PARALLEL_CHUNKS)].map(sendChunks))
+
+  const done = await fetch(`${API_BASE}/uploads/${upload.upload_id}/complete`, { method: 'POST', headers: auth })
+  if(!done.ok) throw new Error('Upload failed')
+  return await done.json()
+}
+
 export async function createActivityFile(token, activityId, file){
+  if(file.size > RESUMABLE_UPLOAD_THRESHOLD) return uploadActivityFileResumable(token, activityId, file)
   const form = new FormData()
   form.append('file', file)
   const res = await fetch(`${API_BASE}/activities/${activityId}/files`, {
@@ -191,9 +231,14 @@ export async function listActivityFiles(token, activityId){
   return await res.json()
 }
 
-export function downloadActivityFile(token, activityId, fileId){
-  // return URL to be opened by frontend (auth via bearer header not supported in simple link)
-  return `${API_BASE}/activities/${activityId}/files/${fileId}`
+export async function downloadActivityFile(token, activityId, fileId){
+  // Enlace firmado de corta duración: el navegador descarga directo (con reanudación) sin header Authorization
+  const res = await fetch(`${API_BASE}/activities/${activityId}/files/${fileId}/link`, {
+    method: 'POST', headers: { Authorization: `Bearer ${token}` }
+  })
+  if(!res.ok) throw new Error('Download failed')
+  const data = await res.json()
+  return `${API_BASE}${data.url}`
 }
 
 export async function deleteActivityFile(token, activityId, fileId){
@@ -254,6 +299,14 @@ export async function sendDueReminders(token, hours = 24){
   return await res.json()
 }
 
+export async function getReminderJob(token, jobId){
+  const res = await fetch(`${API_BASE}/activities/due/reminder-jobs/${jobId}`, {
+    headers: { Authorization: `Bearer ${token}` }
+  })
+  if(!res.ok) throw new Error('Reminder job not found')
+  return await res.json()
+}
+
 export async function createInvitation(token, activityId, invitedEmail){
   const res = await fetch(`${API_BASE}/activities/${activityId}/invite`, {
     method: 'POST', headers: { 'Content-Type':'application/json', Authorization: `Bearer ${token}` },
@@ -20,6 +20,7 @@ export default function ActivityCard({ activity, indicators, token, onUpdate, on
   const [files, setFiles] = useState([])
   const [invitations, setInvitations] = useState([])
   const [history, setHistory] = useState([])
+  const [historyCursor, setHistoryCursor] = useState(null)
   const [newSubtask, setNewSubtask] = useState('')
   const [inviteEmail, setInviteEmail] = useState('')
   const [fileInput, setFileInput] = useState(null)
@@ -41,9 +42,10 @@ export default function ActivityCard({ activity, indicators, token, onUpdate, on
     setInvitations(data)
   }
 
-  async function loadHistory() {
-    const data = await getActivityHistory(token, activity.id)
-    setHistory(data)
+  async function loadHistory(cursor = null) {
+    const data = await getActivityHistory(token, activity.id, cursor)
+    setHistory(prev => cursor ? [...prev, ...data.items] : data.items)
+    setHistoryCursor(data.next_cursor || null)
   }
 
   async function handleExpand() {
@@ -90,20 +92,13 @@ export default function ActivityCard({ activity, indicators, token, onUpdate, on
     await loadFiles()
   }
 
-  function handleDownloadFile(fileId) {
-    const url = downloadActivityFile(token, activity.id, fileId)
-    fetch(url, { headers: { Authorization: `Bearer ${token}` } })
-      .then(r => r.blob())
-      .then(blob => {
-        const u = window.URL.createObjectURL(blob)
-        const a = document.createElement('a')
-        a.href = u
-        a.download = ''
-        document.body.appendChild(a)
-        a.click()
-        a.remove()
-        window.URL.revokeObjectURL(u)
-      })
+  async function handleDownloadFile(fileId) {
+    const url = await downloadActivityFile(token, activity.id, fileId)
+    const a = document.createElement('a')
+    a.href = url
+    document.body.appendChild(a)
+    a.click()
+    a.remove()
   }
 
   async function handleSendInvite() {
@@ -290,12 +285,19 @@ export default function ActivityCard({ activity, indicators, token, onUpdate, on
               )}
               {history.map(h => (
                 <div key={h.id} style={{ padding: '8px', marginBottom: 6, backgroundColor: 'white', borderRadius: 4, border: '1px solid var(--color-borde)', fontSize: '0.85rem' }}>
-                  <strong>{h.changed_by}</strong> cambio <strong>{h.changed_field}</strong> de "{h.old_value}" a "{h.new_value}"
+                  {h.changes.map(c => (
+                    <div key={c.field}>
+                      <strong>{h.changed_by}</strong> cambio <strong>{c.field}</strong> de "{c.old_value}" a "{c.new_value}"
+                    </div>
+                  ))}
                   <div style={{ fontSize: '0.75rem', color: 'var(--color-texto-claro)' }}>
                     {new Date(h.timestamp).toLocaleString('es-CO')}
                   </div>
                 </div>
               ))}
+              {historyCursor && (
+                <button className="btn btn-sm btn-secundario" onClick={() => loadHistory(historyCursor)}>Ver más</button>
+              )}
             </div>
           )}
         </div>
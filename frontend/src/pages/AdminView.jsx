@@ -4,7 +4,7 @@ import {
   exportActivityCSV, exportWeeklyCSV,
   createWebhook, listWebhooks, deleteWebhook,
   listCollaborators, getWeeklyDashboard,
-  sendDueReminders, updateUserRole, deleteUser, getIndicators
+  sendDueReminders, getReminderJob, updateUserRole, deleteUser, getIndicators
 } from '../api'
 import Navbar from '../components/Navbar'
 import DashboardSemaforo from '../components/DashboardSemaforo'
@@ -108,8 +108,13 @@ export default function AdminView({ token, currentUser, onLogout }) {
   }
 
   async function handleSendReminders() {
-    const res = await sendDueReminders(token, reminderHours)
-    setMsg(`Recordatorios enviados: ${res.count}`)
+    let job = await sendDueReminders(token, reminderHours)
+    setMsg('Enviando recordatorios...')
+    while (job.status === 'queued' || job.status === 'running') {
+      await new Promise(resolve => setTimeout(resolve, 1000))
+      job = await getReminderJob(token, job.job_id)
+    }
+    setMsg(job.status === 'done' ? `Recordatorios enviados: ${job.count}` : 'Error enviando recordatorios')
     setTimeout(() => setMsg(''), 4000)
   }
 